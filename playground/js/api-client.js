@@ -64,6 +64,8 @@ class QuranAPI {
      * Correct recitation — analyze audio for tajweed errors
      * @param {Blob} audioBlob - WAV audio blob
      * @param {Object} options - Optional tajweed parameters
+     * @param {Object|null} ayahTarget - { sura_idx, aya_idx } to skip the search
+     * @param {Object|null} positionHint - { sura_idx, aya_idx } of the last matched ayah to search near first
      * @returns {Promise<CorrectionResult>}
      *
      * Response shape:
@@ -91,7 +93,7 @@ class QuranAPI {
      *   }]
      * }
      */
-    async correctRecitation(audioBlob, options = {}, ayahTarget = null) {
+    async correctRecitation(audioBlob, options = {}, ayahTarget = null, positionHint = null) {
         const formData = new FormData();
         formData.append('file', audioBlob, 'recording.wav');
 
@@ -99,6 +101,10 @@ class QuranAPI {
         if (ayahTarget && ayahTarget.sura_idx && ayahTarget.aya_idx) {
             formData.append('sura_idx', String(ayahTarget.sura_idx));
             formData.append('aya_idx', String(ayahTarget.aya_idx));
+        } else if (positionHint && positionHint.sura_idx && positionHint.aya_idx) {
+            // Otherwise search around the last matched ayah first
+            formData.append('hint_sura_idx', String(positionHint.sura_idx));
+            formData.append('hint_aya_idx', String(positionHint.aya_idx));
         }
 
         // Append optional tajweed parameters
@@ -199,7 +199,7 @@ class ReciteController {
 
         try {
             const ayahTarget = this._getAyahTarget();
-            const result = await this.api.correctRecitation(blob, {}, ayahTarget);
+            const result = await this.api.correctRecitation(blob, {}, ayahTarget, this._getPositionHint());
             this.lastResult = result;
 
             // Navigate to the matched position if different
@@ -536,7 +536,16 @@ class ReciteController {
         return { sura_idx: surah, aya_idx: ayah };
     }
 
-    _showStatus(text, type = '') {
+    /**
+     * The last matched ayah, so consecutive recordings are searched near it first.
+     * Returns { sura_idx, aya_idx } or null.
+     */
+    _getPositionHint() {
+        if (!this.lastResult || !this.lastResult.end) return null;
+        return { sura_idx: this.lastResult.end.sura_idx, aya_idx: this.lastResult.end.aya_idx };
+    }
+
+        _showStatus(text, type = '') {
         if (!this.statusEl) return;
         this.statusEl.textContent = text;
         this.statusEl.className = 'toolbar-status';
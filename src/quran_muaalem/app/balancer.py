@@ -0,0 +1,105 @@
+import random
+import time
+from dataclasses import dataclass
+from typing import Callable, Literal
+
+
+@dataclass
+class EngineState:
+    """Load and health of a single engine as seen by this app process
+
+    Attributes:
+        url (str): the engine `/predict` url
+        outstanding (int): requests sent to the engine and not answered yet
+        latency (float): exponential moving average of the response time in seconds
+        failures (int): consecutive failed requests
+        down_until (float): the engine is not routed to before this time
+            (`clock` seconds) unless every engine is down
+    """
+
+    url: str
+    outstanding: int = 0
+    latency: float = 0.0
+    failures: int = 0
+    down_until: float = 0.0
+
+
+def engine_health_url(url: str) -> str:
+    return url.replace("/predict", "/health")
+
+
+class EngineBalancer:
+    """Routes engine requests over several engine replicas
+
+    Args:
+        urls (list[str]): the `/predict` url of every engine
+        routing (str): either:
+            * "least_outstanding": the engine with the fewest in flight requests
+            * "power_of_two": the better of two engines picked at random, which
+                avoids every app process routing to the same engine at once
+            Ties are broken by the lower average latency.
+        failure_threshold (int): consecutive failures (transport errors or 5xx)
+            after which an engine is marked down
+        cooldown (float): seconds an engine is marked down before it is tried again
+        latency_alpha (float): weight of the latest response time in the average
+        clock: source of time in seconds
+    """
+
+    def __init__(
+        self,
+        urls: list[str],
+        routing: Literal["least_outstanding", "power_of_two"] = "least_outstanding",
+        failure_threshold: int = 3,
+        cooldown: float = 10.0,
+        latency_alpha: float = 0.3,
+        clock: Callable[[], float] = time.monotonic,
+        rng: random.Random | None = None,
+    ):
+        if not urls:
+            raise ValueError("At least one engine url is required")
+        self.engines = [EngineState(url) for url in urls]
+        self.routing = routing
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.latency_alpha = latency_alpha
+        self.clock = clock
+        self.rng = rng or random.Random()
+
+    def healthy_engines(self) -> list[EngineState]:
+        now = self.clock()
+        return [engine for engine in self.engines if engine.down_until <= now]
+
+    def acquire(self) -> EngineState:
+        """Picks an engine for a request. Call `release` once it is answered"""
+        # route to every engine if all of them are down instead of failing
+        candidates = self.healthy_engines() or self.engines
+        if self.routing == "power_of_two" and len(candidates) > 2:
+            candidates = self.rng.sample(candidates, 2)
+        engine = min(candidates, key=lambda e: (e.outstanding, e.latency))
+        engine.outstanding += 1
+        return engine
+
+    def release(self, engine: EngineState):
+        engine.outstanding -= 1
+
+    def record_success(self, engine: EngineState, latency: float):
+        if engine.latency == 0.0:
+            engine.latency = latency
+        else:
+            engine.latency += self.latency_alpha * (latency - engine.latency)
+        engine.failures = 0
+        engine.down_until = 0.0
+
+    def record_failure(self, engine: EngineState):
+        engine.failures += 1
+        if engine.failures >= self.failure_threshold:
+            engine.down_until = self.clock() + self.cooldown
+
+    def record_health(self, engine: EngineState, healthy: bool):
+        """Result of an active `/health` check"""
+        if healthy:
+            engine.failures = 0
+            engine.down_until = 0.0
+        else:
+            engine.failures = max(engine.failures, self.failure_threshold)
+            engine.down_until = self.clock() + self.cooldown
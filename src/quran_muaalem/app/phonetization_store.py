@@ -0,0 +1,182 @@
+"""Precomputed `quran_phonetizer` outputs of every aya for a MoshafAttributes profile
+
+A store is a directory of:
+    meta.json: the moshaf attributes and the `quran-transcript` version
+    index.npy: int64 array of (sura_idx, aya_idx, start, end) of every aya
+    data.bin: the pickled `quran_phonetizer` output of every aya at [start, end)
+    uthmani.json: the Uthmani text of every aya
+
+`index.npy` and `data.bin` are memory mapped so opening a store is fast and only
+the pages of the looked up ayat are read from disk.
+
+Build a store with:
+    quran-muaalem-phonetization-store OUT_DIR --moshaf moshaf.json --num-workers 8
+"""
+
+import argparse
+import json
+import logging
+import mmap
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+from importlib.metadata import version
+from pathlib import Path
+
+import numpy as np
+from quran_transcript import Aya, quran_phonetizer
+from quran_transcript.phonetics.moshaf_attributes import MoshafAttributes
+
+from .types import DEFAULT_MOSHAF
+
+
+FORMAT_VERSION = 1
+
+
+def moshaf_key(moshaf: MoshafAttributes) -> tuple:
+    return tuple(sorted(moshaf.model_dump().items()))
+
+
+def _phonetize_ayat(args: tuple[list[tuple[int, int]], dict]) -> list[tuple]:
+    ayat, moshaf_dict = args
+    moshaf = MoshafAttributes(**moshaf_dict)
+    outs = []
+    for sura_idx, aya_idx in ayat:
+        uthmani = Aya(sura_idx, aya_idx).get().uthmani
+        phonetization = quran_phonetizer(uthmani, moshaf, remove_spaces=True)
+        outs.append((sura_idx, aya_idx, uthmani, pickle.dumps(phonetization)))
+    return outs
+
+
+def build_phonetization_store(
+    out_dir: str | Path,
+    moshaf: MoshafAttributes = DEFAULT_MOSHAF,
+    num_workers: int = 1,
+    chunk_size: int = 64,
+    ayat: list[tuple[int, int]] | None = None,
+):
+    """Phonetizes every aya of the Quran with `moshaf` and saves them to `out_dir`
+
+    Args:
+        ayat (list[tuple[int, int]] | None): (sura_idx, aya_idx) of the ayat to
+            store. Defaults to all the Quran
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    if ayat is None:
+        ayat = [(aya.sura_idx, aya.aya_idx) for aya in Aya(1, 1).get_ayat_after()]
+    chunks = [
+        (ayat[idx : idx + chunk_size], moshaf.model_dump())
+        for idx in range(0, len(ayat), chunk_size)
+    ]
+    index = np.zeros((len(ayat), 4), dtype=np.int64)
+    uthmani_texts = []
+    offset = 0
+    with open(out_dir / "data.bin", "wb") as data_file:
+        with ProcessPoolExecutor(num_workers) as executor:
+            for outs in executor.map(_phonetize_ayat, chunks):
+                for sura_idx, aya_idx, uthmani, data in outs:
+                    row = len(uthmani_texts)
+                    index[row] = (sura_idx, aya_idx, offset, offset + len(data))
+                    data_file.write(data)
+                    offset += len(data)
+                    uthmani_texts.append(uthmani)
+                logging.info(f"Phonetized {len(uthmani_texts)} / {len(ayat)} ayat")
+
+    np.save(out_dir / "index.npy", index)
+    with open(out_dir / "uthmani.json", "w", encoding="utf-8") as f:
+        json.dump(uthmani_texts, f, ensure_ascii=False)
+    with open(out_dir / "meta.json", "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "format_version": FORMAT_VERSION,
+                "quran_transcript_version": version("quran-transcript"),
+                "moshaf": moshaf.model_dump(),
+            },
+            f,
+            ensure_ascii=False,
+            indent=2,
+        )
+
+
+class PhonetizationStore:
+    """Read only view of a store built by `build_phonetization_store`
+
+    Lookups are thread safe.
+    """
+
+    def __init__(self, store_dir: str | Path):
+        self.store_dir = Path(store_dir)
+        with open(self.store_dir / "meta.json", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta["format_version"] != FORMAT_VERSION:
+            raise ValueError(
+                f"Unsupported phonetization store format: {meta['format_version']}"
+            )
+        if meta["quran_transcript_version"] != version("quran-transcript"):
+            logging.warning(
+                f"The phonetization store: `{self.store_dir}` was built with "
+                f"quran-transcript=={meta['quran_transcript_version']}. Rebuild it "
+                "if the phonetizer output has changed"
+            )
+        self.moshaf = MoshafAttributes(**meta["moshaf"])
+        self.index = np.load(self.store_dir / "index.npy", mmap_mode="r")
+        with open(self.store_dir / "data.bin", "rb") as f:
+            self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._sura_aya_to_row = None
+        self._uthmani_to_row = None
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def _get_row(self, row: int):
+        _, _, start, end = self.index[row]
+        return pickle.loads(self._data[start:end])
+
+    def get(self, sura_idx: int, aya_idx: int):
+        """Returns the `quran_phonetizer` output of an aya or `None`"""
+        if self._sura_aya_to_row is None:
+            self._sura_aya_to_row = {
+                (int(sura), int(aya)): row
+                for row, (sura, aya) in enumerate(self.index[:, :2].tolist())
+            }
+        row = self._sura_aya_to_row.get((sura_idx, aya_idx))
+        return None if row is None else self._get_row(row)
+
+    def get_by_uthmani(self, uthmani_text: str):
+        """Returns the `quran_phonetizer` output of a whole aya text or `None`"""
+        if self._uthmani_to_row is None:
+            with open(self.store_dir / "uthmani.json", encoding="utf-8") as f:
+                self._uthmani_to_row = {
+                    text: row for row, text in enumerate(json.load(f))
+                }
+        row = self._uthmani_to_row.get(uthmani_text)
+        return None if row is None else self._get_row(row)
+
+    def close(self):
+        self._data.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Build a precomputed phonetization store of the whole Quran"
+    )
+    parser.add_argument("out_dir", help="Directory to save the store to")
+    parser.add_argument(
+        "--moshaf",
+        help="JSON file of MoshafAttributes fields (defaults to the app default moshaf)",
+    )
+    parser.add_argument("--num-workers", type=int, default=1)
+    args = parser.parse_args()
+
+    moshaf = DEFAULT_MOSHAF
+    if args.moshaf:
+        with open(args.moshaf, encoding="utf-8") as f:
+            moshaf = MoshafAttributes(**json.load(f))
+
+    logging.basicConfig(level=logging.INFO)
+    build_phonetization_store(args.out_dir, moshaf, num_workers=args.num_workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+"""Q-gram inverted index over the normalized Quran phonemes of `PhoneticSearch`
+
+By the q-gram lemma a substring of the reference within `k` edits of a query of
+length `m` shares at least `m - q + 1 - k * q` of the query q-grams, each shifted
+by at most `k` positions. Counting the index hits of the query q-grams per
+start position (`hit position - query offset`) leaves a handful of candidate
+windows, and the fuzzy matching runs only over them.
+
+The index is saved as `.npy` files and loaded memory mapped, so the app worker
+processes share a single copy in the page cache.
+
+The search relies on internals of `PhoneticSearch` (checked with
+quran-transcript 0.4.0 to 0.6.4). If they change it searches as `PhoneticSearch`.
+"""
+
+import json
+import logging
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+from fuzzysearch import find_near_matches
+from quran_transcript.phonetics.search import (
+    NoPhonemesSearchResult,
+    PhoneticSearch,
+    PhonmesSearhResult,
+)
+
+
+class QGramIndex:
+    """Positions of every q-gram of a text
+
+    Args:
+        alphabet (str): the characters of the text. A q-gram is identified by its
+            characters ids in `alphabet` as a number in base `len(alphabet)`
+        offsets (np.ndarray): the positions of q-gram `g` are
+            `positions[offsets[g]: offsets[g + 1]]`
+        positions (np.ndarray): start positions sorted by q-gram then position
+    """
+
+    def __init__(
+        self, q: int, alphabet: str, offsets: np.ndarray, positions: np.ndarray
+    ):
+        self.q = q
+        self.alphabet = alphabet
+        self.char_to_id = {c: idx for idx, c in enumerate(alphabet)}
+        self.offsets = offsets
+        self.positions = positions
+
+    @classmethod
+    def build(cls, text: str, q: int = 3) -> "QGramIndex":
+        alphabet = "".join(sorted(set(text)))
+        char_to_id = {c: idx for idx, c in enumerate(alphabet)}
+        ids = np.array([char_to_id[c] for c in text], dtype=np.int64)
+        grams = cls._gram_ids(ids, q, len(alphabet))
+        positions = np.argsort(grams, kind="stable").astype(np.int32)
+        counts = np.bincount(grams, minlength=len(alphabet) ** q)
+        offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        return cls(q, alphabet, offsets, positions)
+
+    @staticmethod
+    def _gram_ids(ids: np.ndarray, q: int, base: int) -> np.ndarray:
+        num_grams = max(len(ids) - q + 1, 0)
+        grams = np.zeros(num_grams, dtype=np.int64)
+        for idx in range(q):
+            grams = grams * base + ids[idx : idx + num_grams]
+        return grams
+
+    def save(self, index_dir: str | Path):
+        index_dir = Path(index_dir)
+        index_dir.mkdir(parents=True, exist_ok=True)
+        np.save(index_dir / "qgram_offsets.npy", self.offsets)
+        np.save(index_dir / "qgram_positions.npy", self.positions)
+        with open(index_dir / "qgram_meta.json", "w", encoding="utf-8") as f:
+            json.dump({"q": self.q, "alphabet": self.alphabet}, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, index_dir: str | Path) -> "QGramIndex":
+        index_dir = Path(index_dir)
+        with open(index_dir / "qgram_meta.json", encoding="utf-8") as f:
+            meta = json.load(f)
+        return cls(
+            meta["q"],
+            meta["alphabet"],
+            np.load(index_dir / "qgram_offsets.npy", mmap_mode="r"),
+            np.load(index_dir / "qgram_positions.npy", mmap_mode="r"),
+        )
+
+    def candidate_windows(
+        self, query: str, max_edits: int, text_len: int
+    ) -> Optional[list[tuple[int, int]]]:
+        """Returns the sorted disjoint [start, end) text windows that may contain a
+        match of `query` within `max_edits` edits, or `None` if the q-gram lemma
+        can not filter (short query or many edits)
+        """
+        m = len(query)
+        threshold = m - self.q + 1 - max_edits * self.q
+        if threshold < 1:
+            return None
+
+        # start position of the match implied by every q-gram hit
+        starts = []
+        for offset in range(m - self.q + 1):
+            gram = 0
+            for c in query[offset : offset + self.q]:
+                char_id = self.char_to_id.get(c)
+                if char_id is None:
+                    break
+                gram = gram * len(self.alphabet) + char_id
+            else:
+                hits = self.positions[self.offsets[gram] : self.offsets[gram + 1]]
+                starts.append(hits - offset)
+        if not starts:
+            return []
+        starts = np.sort(np.concatenate(starts))
+
+        # hits of a match at `s` are in [s - k, s + k]
+        window_ends = np.searchsorted(starts, starts + 2 * max_edits, side="right")
+        passing = starts[window_ends - np.arange(len(starts)) >= threshold]
+        windows = []
+        for start in passing.tolist():
+            win_start = max(start - max_edits, 0)
+            win_end = min(start + 3 * max_edits + m, text_len)
+            if windows and win_start <= windows[-1][1]:
+                windows[-1] = (windows[-1][0], max(windows[-1][1], win_end))
+            else:
+                windows.append((win_start, win_end))
+        return windows
+
+
+def has_search_internals(search: PhoneticSearch) -> bool:
+    """Whether `search` has the private attributes `IndexedPhoneticSearch` uses:
+    the normalized reference `ref_ph_norm`, its `index` of a row of at least 7
+    columns per character, `_normalize_query` and `_ref_idx_to_span`
+    """
+    ref_ph_norm = getattr(search, "ref_ph_norm", None)
+    index = getattr(search, "index", None)
+    return (
+        isinstance(ref_ph_norm, str)
+        and isinstance(index, np.ndarray)
+        and index.ndim == 2
+        and index.shape[1] >= 7
+        and len(index) == len(ref_ph_norm)
+        and callable(getattr(search, "_normalize_query", None))
+        and callable(getattr(search, "_ref_idx_to_span", None))
+    )
+
+
+class IndexedPhoneticSearch(PhoneticSearch):
+    """`PhoneticSearch` that runs the fuzzy matching only over the candidate
+    windows of a `QGramIndex` or over the neighbourhood of a known aya
+
+    Args:
+        data_dir: see `PhoneticSearch`
+        index_dir: directory of a saved `QGramIndex`. Built and saved there if
+            missing. `None` builds it in memory
+        q (int): q-gram length of a newly built index
+        use_qgram_index (bool): `False` searches the whole Quran as
+            `PhoneticSearch` does
+
+    Without the internals of `has_search_internals` (another quran-transcript
+    version) every search is a `PhoneticSearch` search of the whole Quran.
+    """
+
+    def __init__(
+        self,
+        data_dir: Optional[Path] = None,
+        index_dir: Optional[str | Path] = None,
+        q: int = 3,
+        use_qgram_index: bool = True,
+    ):
+        super().__init__(data_dir)
+        self.qgram_index = None
+        self._aya_keys = self._aya_starts = None
+        if not has_search_internals(self):
+            logging.warning(
+                "The installed quran-transcript `PhoneticSearch` is not supported "
+                "by the q-gram index, searching the whole Quran instead"
+            )
+            return
+
+        if not use_qgram_index:
+            pass
+        elif index_dir is not None and (Path(index_dir) / "qgram_meta.json").exists():
+            self.qgram_index = QGramIndex.load(index_dir)
+        else:
+            self.qgram_index = QGramIndex.build(self.ref_ph_norm, q=q)
+            if index_dir is not None:
+                self.qgram_index.save(index_dir)
+
+        # start of every aya in the reference phonemes (the index is in Quran order)
+        aya_keys = self.index[:, 0].astype(np.int64) * 1000 + self.index[:, 1]
+        self._aya_keys, self._aya_starts = np.unique(aya_keys, return_index=True)
+
+    def _search_windows(
+        self, norm_query: str, max_edits: int, windows: list[tuple[int, int]]
+    ) -> list[PhonmesSearhResult]:
+        results = []
+        for win_start, win_end in windows:
+            win_text = self.ref_ph_norm[win_start:win_end]
+            for out in find_near_matches(norm_query, win_text, max_l_dist=max_edits):
+                results.append(
+                    PhonmesSearhResult(
+                        start=self._ref_idx_to_span(win_start + out.start, end=False),
+                        end=self._ref_idx_to_span(win_start + out.end - 1, end=True),
+                    )
+                )
+        if not results:
+            raise NoPhonemesSearchResult(
+                "No Resulsts found!. to ensure to have resutls Please increate the error ratio"
+            )
+        return results
+
+    def search(
+        self,
+        query: str,
+        start: tuple[int, int, int] | None = None,
+        window: int | None = None,
+        error_ratio: float = 0.1,
+    ) -> list[PhonmesSearhResult]:
+        if not query:
+            raise ValueError("Query is longer then the Holy Quarn Text")
+        assert error_ratio >= 0 and error_ratio <= 1
+
+        if self.qgram_index is None:
+            return super().search(query, start, window, error_ratio)
+        norm_query = self._normalize_query(query)
+        max_edits = int(len(norm_query) * error_ratio)
+        windows = self.qgram_index.candidate_windows(
+            norm_query, max_edits, len(self.ref_ph_norm)
+        )
+        # the filter is weak for large error ratios (about 0.3 and above)
+        if windows is None or (
+            sum(end - start for start, end in windows) > len(self.ref_ph_norm) // 2
+        ):
+            return super().search(query, start, window, error_ratio)
+        return self._search_windows(norm_query, max_edits, windows)
+
+    def search_near(
+        self,
+        query: str,
+        sura_idx: int,
+        aya_idx: int,
+        num_ayat: int = 3,
+        error_ratio: float = 0.1,
+    ) -> list[PhonmesSearhResult]:
+        """Searches only the aya `sura_idx:aya_idx` and the `num_ayat` ayat after it
+        (the whole Quran without the `PhoneticSearch` internals)
+
+        Raises:
+            ValueError: if the query is empty or the aya does not exist
+            NoPhonemesSearchResult: if no matches are found
+        """
+        if not query:
+            raise ValueError("Query is longer then the Holy Quarn Text")
+        assert error_ratio >= 0 and error_ratio <= 1
+        if self._aya_keys is None:
+            return super().search(query, error_ratio=error_ratio)
+
+        aya_key = sura_idx * 1000 + aya_idx
+        aya_pos = int(np.searchsorted(self._aya_keys, aya_key))
+        if aya_pos >= len(self._aya_keys) or self._aya_keys[aya_pos] != aya_key:
+            raise ValueError(f"No aya: {sura_idx}:{aya_idx}")
+        win_start = int(self._aya_starts[aya_pos])
+        end_pos = aya_pos + num_ayat + 1
+        win_end = (
+            int(self._aya_starts[end_pos])
+            if end_pos < len(self._aya_starts)
+            else len(self.ref_ph_norm)
+        )
+
+        norm_query = self._normalize_query(query)
+        max_edits = int(len(norm_query) * error_ratio)
+        return self._search_windows(norm_query, max_edits, [(win_start, win_end)])
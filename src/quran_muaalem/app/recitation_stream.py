@@ -0,0 +1,155 @@
+"""Incremental transcription of a recitation streamed as raw PCM chunks
+
+Every `hop_seconds` of new audio the last `window_seconds` of the recording are
+transcribed by the engine and the predicted phonemes groups of the overlapping
+windows are merged with `quran_muaalem.streaming.merge_lists_with_overlap`. The
+phonemes of the last `right_context_seconds` of a window lack right context and
+may change with the next window, so they are not final yet.
+"""
+
+import io
+import math
+import wave
+
+import numpy as np
+from numpy.typing import NDArray
+from quran_transcript import chunck_phonemes
+
+from ..streaming import merge_lists_with_overlap
+
+
+SAMPLE_FORMATS = {"s16le": np.int16, "f32le": np.float32}
+
+# the engine needs at least a single fbank window (25 ms at 16 kHz)
+MIN_WINDOW_SECONDS = 0.025
+
+
+def pcm_to_wav(samples: NDArray, sampling_rate: int) -> bytes:
+    """Encodes a mono wave (int16 or float in [-1, 1]) as a 16 bit PCM WAV file"""
+    if samples.dtype != np.int16:
+        samples = (np.clip(samples, -1.0, 1.0) * 32767).astype(np.int16)
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(sampling_rate)
+        f.writeframes(samples.astype("<i2").tobytes())
+    return buffer.getvalue()
+
+
+class RecitationStream:
+    """Audio and predicted phonemes of a streamed recitation
+
+    Args:
+        sampling_rate (int): the sampling rate of the PCM chunks
+        window_seconds (float): the audio length transcribed every step. Shorter
+            at the start of the recording
+        hop_seconds (float): new audio between two consecutive windows
+        right_context_seconds (float): the phonemes of the end of a window that
+            are not final until the next window
+        sample_format (str): `s16le` (16 bit integers) or `f32le` (32 bit floats)
+            little endian mono PCM
+        max_seconds (float | None): maximum recording length
+    """
+
+    def __init__(
+        self,
+        sampling_rate: int = 16000,
+        window_seconds: float = 6.0,
+        hop_seconds: float = 2.0,
+        right_context_seconds: float = 1.0,
+        sample_format: str = "s16le",
+        max_seconds: float | None = None,
+    ):
+        if sample_format not in SAMPLE_FORMATS:
+            raise ValueError(
+                f"`sample_format` has to be one of {list(SAMPLE_FORMATS)} got: "
+                f"`{sample_format}`"
+            )
+        if not (0 < hop_seconds <= window_seconds):
+            raise ValueError(
+                f"`hop_seconds` has to be in (0, window_seconds] got: `{hop_seconds}`"
+            )
+        self.sampling_rate = sampling_rate
+        self.window_samples = int(window_seconds * sampling_rate)
+        self.hop_samples = int(hop_seconds * sampling_rate)
+        self.right_context_seconds = right_context_seconds
+        self.dtype = np.dtype(SAMPLE_FORMATS[sample_format]).newbyteorder("<")
+        self.max_samples = (
+            None if max_seconds is None else int(max_seconds * sampling_rate)
+        )
+
+        # only the audio that is still needed by the next windows is kept
+        self._buffer = np.zeros(0, dtype=self.dtype)
+        self._buffer_start = 0
+        self._remainder = b""
+        self.num_samples = 0
+        self.processed_samples = 0
+
+        self.phonemes_groups: list[str] = []
+        self.num_stable_groups = 0
+
+    def add_chunk(self, data: bytes) -> list[NDArray]:
+        """Adds a PCM chunk and returns the windows to transcribe in order
+
+        Raises:
+            ValueError: if the recording is longer than `max_seconds`
+        """
+        data = self._remainder + data
+        usable = len(data) - len(data) % self.dtype.itemsize
+        self._remainder = data[usable:]
+        samples = np.frombuffer(data[:usable], dtype=self.dtype)
+        if self.max_samples is not None and (
+            self.num_samples + len(samples) > self.max_samples
+        ):
+            max_seconds = self.max_samples / self.sampling_rate
+            raise ValueError(f"The recording is longer than {max_seconds} seconds")
+        self._buffer = np.concatenate([self._buffer, samples])
+        self.num_samples += len(samples)
+
+        windows = []
+        while self.num_samples - self.processed_samples >= self.hop_samples:
+            end = self.processed_samples + self.hop_samples
+            windows.append(self._take_window(end))
+        return windows
+
+    def flush(self) -> NDArray | None:
+        """Returns the window of the audio that is not transcribed yet or `None`"""
+        if self.num_samples - self.processed_samples < (
+            MIN_WINDOW_SECONDS * self.sampling_rate
+        ):
+            return None
+        return self._take_window(self.num_samples)
+
+    def _take_window(self, end: int) -> NDArray:
+        start = max(end - self.window_samples, 0)
+        window = self._buffer[start - self._buffer_start : end - self._buffer_start]
+        self.processed_samples = end
+
+        # the next window (or the flushed one) ends after `end`
+        keep_from = max(end - self.window_samples, 0)
+        if keep_from > self._buffer_start:
+            self._buffer = self._buffer[keep_from - self._buffer_start :]
+            self._buffer_start = keep_from
+        return window.copy()
+
+    def add_phonemes(self, phonemes: str, window_samples: int):
+        """Merges the predicted phonemes of a window of `window_samples` samples"""
+        groups = chunck_phonemes(phonemes)
+        merge_lists_with_overlap(self.phonemes_groups, groups, inplace=True)
+        window_seconds = window_samples / self.sampling_rate
+        if window_seconds > 0:
+            context = min(self.right_context_seconds, window_seconds)
+            num_unstable = math.ceil(len(groups) * context / window_seconds)
+        else:
+            num_unstable = len(groups)
+        self.num_stable_groups = max(len(self.phonemes_groups) - num_unstable, 0)
+
+    @property
+    def phonemes(self) -> str:
+        return "".join(self.phonemes_groups)
+
+    @property
+    def stable_phonemes(self) -> str:
+        """The predicted phonemes that the next windows will not change"""
+        return "".join(self.phonemes_groups[: self.num_stable_groups])
@@ -1,29 +1,65 @@
 import asyncio
-from concurrent.futures import ThreadPoolExecutor
+import io
+import json
+import time
+import zipfile
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import asynccontextmanager, suppress
 from typing import (
     Optional,
     Annotated,
 )
 
 import httpx
-from fastapi import FastAPI, UploadFile, File, Query, Body, Form, Depends
+from fastapi import (
+    FastAPI,
+    UploadFile,
+    File,
+    Query,
+    Body,
+    Form,
+    Depends,
+    WebSocket,
+    WebSocketDisconnect,
+)
 from fastapi.exceptions import HTTPException
-from pydantic import Json
+from fastapi.responses import StreamingResponse
+from pydantic import Json, TypeAdapter, ValidationError
 
 
-from quran_transcript import Aya, quran_phonetizer, explain_error
+from quran_transcript import (
+    Aya,
+    quran_phonetizer,
+    explain_error,
+    SifaOutput,
+    chunck_phonemes,
+)
 from quran_transcript.phonetics.moshaf_attributes import MoshafAttributes
 from quran_transcript.phonetics.search import (
     PhoneticSearch,
+    PhonmesSearhResult,
     NoPhonemesSearchResult,
+    normalize_phonetic_groups,
 )
 
+from ..engine.wire import MSGPACK_MEDIA_TYPE, pack_prediction, unpack_prediction
+from .balancer import EngineBalancer, EngineState, engine_health_url
+from .cache import CacheBackend, DirectoryCacheBackend, LRUCache
+from .phonetization_store import PhonetizationStore, moshaf_key
+from .qgram_index import IndexedPhoneticSearch
+from .recitation_stream import RecitationStream, pcm_to_wav
 from .settings import AppSettings
 from .types import (
+    DEFAULT_MOSHAF,
+    BatchItem,
+    BatchItemResponse,
     SearchResponse,
     SearchResultResponse,
     CorrectRecitationResponse,
     ReciterErrorResponse,
+    StreamCorrectionResponse,
+    StreamStartMessage,
     PhonemesSearchSpanApp,
     TajweedRuleApp,
     TajweedRuleNameApp,
@@ -41,6 +77,122 @@ from .types import (
 
 app_settings = AppSettings()
 
+# Engine responses worth retrying: the engine is restarting or overloaded
+RETRY_STATUS_CODES = {502, 503, 504}
+
+_engine_client: Optional[httpx.AsyncClient] = None
+_engine_balancer: Optional[EngineBalancer] = None
+
+
+def get_engine_client() -> httpx.AsyncClient:
+    """Shared client so connections to the engine are kept alive between calls"""
+    global _engine_client
+    if _engine_client is None:
+        _engine_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(
+                app_settings.engine_timeout,
+                connect=app_settings.engine_connect_timeout,
+            ),
+            limits=httpx.Limits(
+                max_connections=app_settings.engine_max_connections,
+                max_keepalive_connections=app_settings.engine_max_keepalive_connections,
+                keepalive_expiry=app_settings.engine_keepalive_expiry,
+            ),
+            http2=app_settings.engine_http2,
+        )
+    return _engine_client
+
+
+def get_engine_balancer() -> EngineBalancer:
+    global _engine_balancer
+    if _engine_balancer is None:
+        _engine_balancer = EngineBalancer(
+            app_settings.engine_urls or [app_settings.engine_url],
+            routing=app_settings.engine_routing,
+            failure_threshold=app_settings.engine_failure_threshold,
+            cooldown=app_settings.engine_cooldown,
+        )
+    return _engine_balancer
+
+
+async def check_engines_health() -> dict[str, bool]:
+    """Checks the `/health` of every engine and updates the balancer with it"""
+    balancer = get_engine_balancer()
+
+    async def check(engine: EngineState) -> bool:
+        try:
+            response = await get_engine_client().get(
+                engine_health_url(engine.url),
+                timeout=app_settings.engine_health_timeout,
+            )
+            healthy = response.status_code == 200
+        except Exception:
+            healthy = False
+        balancer.record_health(engine, healthy)
+        return healthy
+
+    statuses = await asyncio.gather(*(check(e) for e in balancer.engines))
+    return {engine.url: healthy for engine, healthy in zip(balancer.engines, statuses)}
+
+
+async def run_health_checks(interval: float):
+    while True:
+        await asyncio.sleep(interval)
+        await check_engines_health()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global _engine_client
+    get_engine_client()
+    get_phonetization_stores()
+    # builds and saves the search index once before the worker processes load it
+    get_phonetic_search()
+    await start_executors()
+    health_checks = None
+    if app_settings.engine_health_check_interval > 0:
+        health_checks = asyncio.create_task(
+            run_health_checks(app_settings.engine_health_check_interval)
+        )
+    yield
+    if health_checks is not None:
+        health_checks.cancel()
+        with suppress(asyncio.CancelledError):
+            await health_checks
+    if _engine_client is not None:
+        await _engine_client.aclose()
+        _engine_client = None
+    shutdown_executors()
+
+
+async def request_engine(method: str, **kwargs) -> httpx.Response:
+    """Sends a request to the engine picked by the balancer retrying connection
+    errors, timeouts and `RETRY_STATUS_CODES` with exponential backoff
+    (transcription is idempotent)
+    """
+    client = get_engine_client()
+    balancer = get_engine_balancer()
+    for attempt in range(app_settings.engine_retries + 1):
+        is_last = attempt == app_settings.engine_retries
+        engine = balancer.acquire()
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, engine.url, **kwargs)
+        except httpx.TransportError:
+            balancer.record_failure(engine)
+            if is_last:
+                raise
+        else:
+            if response.status_code >= 500:
+                balancer.record_failure(engine)
+            else:
+                balancer.record_success(engine, time.perf_counter() - start)
+            if response.status_code not in RETRY_STATUS_CODES or is_last:
+                return response
+        finally:
+            balancer.release(engine)
+        await asyncio.sleep(app_settings.engine_retry_backoff * 2**attempt)
+
 
 app = FastAPI(
     title="Quran Muaalem Search API",
@@ -106,38 +258,111 @@ These attributes define the recitation rules for the Hafs recitation (حفص).
 | meem_mokhfah | هل الميم مخفاة أو مدغمة | `meem` (ميم), `ikhfaa` (إخفاء) | `ikhfaa` | Whether Meem is hidden or merged in Ikhfaa |
 """,
     version="0.0.3",
+    lifespan=lifespan,
     docs_url="/docs",
     redoc_url="/redoc",
     openapi_url="/openapi.json",
 )
 
-_search_executor: Optional[ThreadPoolExecutor] = None
-_phonetic_search: Optional[PhoneticSearch] = None
-_phonetization_executor: Optional[ThreadPoolExecutor] = None
+_search_executor: Optional[Executor] = None
+_phonetic_search: Optional[IndexedPhoneticSearch] = None
+_phonetization_executor: Optional[Executor] = None
+# Shared by the phonetization executor threads. Most traffic is a few ayat
+# (Al-Fatiha, short surahs) with the default moshaf
+_phonetization_cache = LRUCache(
+    max_size=app_settings.phonetization_cache_size,
+    ttl=app_settings.phonetization_cache_ttl,
+)
+_phonetization_stores: Optional[dict[tuple, PhonetizationStore]] = None
+# Many users search the same short recitations (Al-Fatiha, Al-Ikhlas)
+_search_cache = LRUCache(
+    max_size=app_settings.search_cache_size,
+    ttl=app_settings.search_cache_ttl,
+)
+_search_cache_backend: Optional[CacheBackend] = (
+    DirectoryCacheBackend(
+        app_settings.search_cache_shared_dir, ttl=app_settings.search_cache_ttl
+    )
+    if app_settings.search_cache_shared_dir
+    else None
+)
+
+
+def warm_worker():
+    """Loads the search index and the phonetization stores once per worker"""
+    get_phonetic_search()
+    get_phonetization_stores()
 
 
-def get_search_executor() -> ThreadPoolExecutor:
+def make_executor(max_workers: int) -> Executor:
+    if app_settings.executor_backend == "process":
+        # spawn instead of fork: the app process runs an event loop and threads
+        return ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=warm_worker,
+        )
+    return ThreadPoolExecutor(max_workers=max_workers)
+
+
+def get_search_executor() -> Executor:
     global _search_executor
     if _search_executor is None:
-        _search_executor = ThreadPoolExecutor(
-            max_workers=app_settings.max_workers_phonetic_search
-        )
+        _search_executor = make_executor(app_settings.max_workers_phonetic_search)
     return _search_executor
 
 
-def get_phonetization_executor() -> ThreadPoolExecutor:
+def get_phonetization_executor() -> Executor:
     global _phonetization_executor
     if _phonetization_executor is None:
-        _phonetization_executor = ThreadPoolExecutor(
-            max_workers=app_settings.max_workers_phonetization
+        _phonetization_executor = make_executor(
+            app_settings.max_workers_phonetization
         )
     return _phonetization_executor
 
 
-def get_phonetic_search() -> PhoneticSearch:
+async def start_executors():
+    """Starts the worker processes before the first request"""
+    if app_settings.executor_backend != "process":
+        return
+    loop = asyncio.get_running_loop()
+    warmups = []
+    for executor, max_workers in [
+        (get_search_executor(), app_settings.max_workers_phonetic_search),
+        (get_phonetization_executor(), app_settings.max_workers_phonetization),
+    ]:
+        warmups += [
+            loop.run_in_executor(executor, warm_worker) for _ in range(max_workers)
+        ]
+    await asyncio.gather(*warmups)
+
+
+def shutdown_executors():
+    global _search_executor, _phonetization_executor
+    for executor in [_search_executor, _phonetization_executor]:
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+    _search_executor = None
+    _phonetization_executor = None
+
+
+def get_phonetization_stores() -> dict[tuple, PhonetizationStore]:
+    global _phonetization_stores
+    if _phonetization_stores is None:
+        _phonetization_stores = {}
+        for store_dir in app_settings.phonetization_store_dirs:
+            store = PhonetizationStore(store_dir)
+            _phonetization_stores[moshaf_key(store.moshaf)] = store
+    return _phonetization_stores
+
+
+def get_phonetic_search() -> IndexedPhoneticSearch:
     global _phonetic_search
     if _phonetic_search is None:
-        _phonetic_search = PhoneticSearch()
+        _phonetic_search = IndexedPhoneticSearch(
+            index_dir=app_settings.phonetic_search_index_dir,
+            use_qgram_index=app_settings.phonetic_search_index,
+        )
     return _phonetic_search
 
 
@@ -150,25 +375,46 @@ def tajweed_rule_to_app(rule) -> TajweedRuleApp:
     )
 
 
-async def call_engine_predict(audio_file: UploadFile) -> str:
-    audio_bytes = await audio_file.read()
-    async with httpx.AsyncClient(timeout=30.0) as client:
-        files = {"request": ("audio.wav", audio_bytes, "audio/wav")}
-        response = await client.post(app_settings.engine_url, files=files)
-        response.raise_for_status()
-        data = response.json()
-        return data["phonemes"]
+async def call_engine_predict(audio_file: UploadFile) -> dict:
+    """Returns the engine output (see `quran_muaalem.engine.wire.unpack_prediction`)"""
+    return await predict_audio_bytes(await audio_file.read())
 
 
-def run_phonetic_search(
-    phonemes: str, error_ratio: float
-) -> tuple[list[SearchResultResponse], str | None]:
-    ph_search = get_phonetic_search()
-    try:
-        results = ph_search.search(phonemes, error_ratio=error_ratio)
-    except NoPhonemesSearchResult:
-        return [], "No results found. Try increasing error_ratio."
+async def predict_audio_bytes(audio_bytes: bytes) -> dict:
+    files = {"request": ("audio.wav", audio_bytes, "audio/wav")}
+    response = await request_engine(
+        "POST",
+        files=files,
+        headers={"Accept": f"{MSGPACK_MEDIA_TYPE}, application/json;q=0.5"},
+    )
+    response.raise_for_status()
+    if response.headers.get("content-type", "").startswith(MSGPACK_MEDIA_TYPE):
+        return unpack_prediction(response.content)
+    # an engine that does not support msgpack
+    return unpack_prediction(pack_prediction(response.json()))
+
+
+def engine_sifat_to_app(sifat: dict) -> list[SifaOutput] | None:
+    """Returns `None` if a sifa of a phonemes group was not predicted"""
+    levels = {k: v for k, v in sifat.items() if k != "phonemes_groups"}
+    if any((column["ids"] < 0).any() for column in levels.values()):
+        return None
+    level_to_texts = {
+        level: [column["vocab"][label] for label in column["ids"].tolist()]
+        for level, column in levels.items()
+    }
+    return [
+        SifaOutput(
+            phonemes=group,
+            **{level: texts[idx] for level, texts in level_to_texts.items()},
+        )
+        for idx, group in enumerate(sifat["phonemes_groups"])
+    ]
+
 
+def search_results_to_app(
+    ph_search: PhoneticSearch, results: list[PhonmesSearhResult]
+) -> list[SearchResultResponse]:
     response_results = []
     for r in results:
         uthmani_text = ph_search.get_uthmani_from_result(r)
@@ -191,15 +437,131 @@ def run_phonetic_search(
                 uthmani_text=uthmani_text,
             )
         )
-    return response_results, None
+    return response_results
+
+
+def run_phonetic_search(
+    phonemes: str, error_ratio: float
+) -> tuple[list[SearchResultResponse], str | None]:
+    ph_search = get_phonetic_search()
+    try:
+        results = ph_search.search(phonemes, error_ratio=error_ratio)
+    except NoPhonemesSearchResult:
+        return [], "No results found. Try increasing error_ratio."
+    return search_results_to_app(ph_search, results), None
+
+
+def run_phonetic_search_near(
+    phonemes: str, error_ratio: float, sura_idx: int, aya_idx: int, num_ayat: int
+) -> list[SearchResultResponse]:
+    """Searches the neighbourhood of an aya. Returns no results for an invalid aya"""
+    ph_search = get_phonetic_search()
+    try:
+        results = ph_search.search_near(
+            phonemes, sura_idx, aya_idx, num_ayat=num_ayat, error_ratio=error_ratio
+        )
+    except (NoPhonemesSearchResult, ValueError):
+        return []
+    return search_results_to_app(ph_search, results)
+
+
+async def cached_phonetic_search(
+    phonemes: str, error_ratio: float
+) -> tuple[list[SearchResultResponse], str | None]:
+    """`run_phonetic_search` in the search executor with its results cached
+
+    The search depends only on the normalized phonemes (the first phoneme of
+    every phonemes group) so they are the cache key.
+    """
+    key = (normalize_phonetic_groups(chunck_phonemes(phonemes)), error_ratio)
+    out = _search_cache.get(key)
+    if out is not None:
+        return out
+
+    shared_key = json.dumps(key, ensure_ascii=False)
+    if _search_cache_backend is not None:
+        data = await asyncio.to_thread(_search_cache_backend.get, shared_key)
+        if data is not None:
+            data = json.loads(data)
+            out = (
+                [SearchResultResponse.model_validate(r) for r in data["results"]],
+                data["message"],
+            )
+            _search_cache.set(key, out)
+            return out
+
+    loop = asyncio.get_running_loop()
+    out = await loop.run_in_executor(
+        get_search_executor(), run_phonetic_search, phonemes, error_ratio
+    )
+    _search_cache.set(key, out)
+    if _search_cache_backend is not None:
+        results, message = out
+        data = json.dumps(
+            {"results": [r.model_dump() for r in results], "message": message},
+            ensure_ascii=False,
+        )
+        await asyncio.to_thread(_search_cache_backend.set, shared_key, data.encode())
+    return out
+
+
+async def phonetic_search_with_hint(
+    phonemes: str,
+    error_ratio: float,
+    hint_sura_idx: Optional[int] = None,
+    hint_aya_idx: Optional[int] = None,
+    hint_window: Optional[int] = None,
+) -> tuple[list[SearchResultResponse], str | None]:
+    """Searches the hint aya and the `hint_window` ayat after it first (consecutive
+    recordings of a recitation session) and the whole Quran only if the phonemes
+    are not found there within `error_ratio`
+    """
+    if hint_sura_idx is not None and hint_aya_idx is not None:
+        if hint_window is None:
+            hint_window = app_settings.search_hint_window
+        loop = asyncio.get_running_loop()
+        results = await loop.run_in_executor(
+            get_search_executor(),
+            run_phonetic_search_near,
+            phonemes,
+            error_ratio,
+            hint_sura_idx,
+            hint_aya_idx,
+            hint_window,
+        )
+        if results:
+            return results, None
+    return await cached_phonetic_search(phonemes, error_ratio)
+
+
+def cached_quran_phonetizer(uthmani_text: str, moshaf: MoshafAttributes):
+    key = moshaf_key(moshaf)
+
+    def compute():
+        # a whole aya of a precomputed moshaf profile is read from its store
+        store = get_phonetization_stores().get(key)
+        if store is not None:
+            phonetization = store.get_by_uthmani(uthmani_text)
+            if phonetization is not None:
+                return phonetization
+        return quran_phonetizer(uthmani_text, moshaf, remove_spaces=True)
+
+    return _phonetization_cache.get_or_compute((uthmani_text, key), compute)
 
 
 def run_phonetization_and_error(
     uthmani_text: str,
     moshaf: MoshafAttributes,
     predicted_phonemes: str,
+    ref_phonetization=None,
 ) -> tuple[str, list[ReciterErrorResponse]]:
-    ref_phonetization = quran_phonetizer(uthmani_text, moshaf, remove_spaces=True)
+    """
+    Args:
+        ref_phonetization: the `quran_phonetizer` output of `uthmani_text` if it
+            is already computed
+    """
+    if ref_phonetization is None:
+        ref_phonetization = cached_quran_phonetizer(uthmani_text, moshaf)
 
     errors = explain_error(
         uthmani_text=uthmani_text,
@@ -246,6 +608,93 @@ def run_phonetization_and_error(
     return ref_phonetization.phonemes, error_responses
 
 
+async def correct_phonemes(
+    predicted_phonemes: str,
+    moshaf: MoshafAttributes,
+    error_ratio: float,
+    sura_idx: Optional[int] = None,
+    aya_idx: Optional[int] = None,
+    hint_sura_idx: Optional[int] = None,
+    hint_aya_idx: Optional[int] = None,
+    hint_window: Optional[int] = None,
+    phonetizations: Optional[dict[str, asyncio.Future]] = None,
+) -> CorrectRecitationResponse:
+    """Matches the predicted phonemes to the Quran (or to `sura_idx:aya_idx`) and
+    explains their errors
+
+    Args:
+        phonetizations: reference phonetizations by Uthmani text shared by the
+            calls of a batch (with the same moshaf) so every distinct reference is
+            phonetized once even by concurrent calls
+
+    Raises:
+        ValueError: if no match is found within `error_ratio`
+    """
+    loop = asyncio.get_running_loop()
+
+    if sura_idx is not None and aya_idx is not None:
+        # Skip search — use the specified ayah directly
+        aya = Aya(sura_idx, aya_idx).get()
+        uthmani_text = aya.uthmani
+        num_words = len(aya.uthmani_words)
+        best_result = SearchResultResponse(
+            start=PhonemesSearchSpanApp(
+                sura_idx=sura_idx,
+                aya_idx=aya_idx,
+                uthmani_word_idx=0,
+                uthmani_char_idx=0,
+                phonemes_idx=0,
+            ),
+            end=PhonemesSearchSpanApp(
+                sura_idx=sura_idx,
+                aya_idx=aya_idx,
+                uthmani_word_idx=num_words,
+                uthmani_char_idx=0,
+                phonemes_idx=0,
+            ),
+            uthmani_text=uthmani_text,
+        )
+    else:
+        # No ayah specified — search as before
+        search_results, message = await phonetic_search_with_hint(
+            predicted_phonemes, error_ratio, hint_sura_idx, hint_aya_idx, hint_window
+        )
+
+        if not search_results:
+            raise ValueError(message or "No results found. Try increasing error_ratio.")
+
+        best_result = search_results[0]
+
+    ref_phonetization = None
+    if phonetizations is not None:
+        if best_result.uthmani_text not in phonetizations:
+            phonetizations[best_result.uthmani_text] = loop.run_in_executor(
+                get_phonetization_executor(),
+                cached_quran_phonetizer,
+                best_result.uthmani_text,
+                moshaf,
+            )
+        ref_phonetization = await phonetizations[best_result.uthmani_text]
+
+    reference_phonemes, errors = await loop.run_in_executor(
+        get_phonetization_executor(),
+        run_phonetization_and_error,
+        best_result.uthmani_text,
+        moshaf,
+        predicted_phonemes,
+        ref_phonetization,
+    )
+
+    return CorrectRecitationResponse(
+        start=best_result.start,
+        end=best_result.end,
+        predicted_phonemes=predicted_phonemes,
+        reference_phonemes=reference_phonemes,
+        uthmani_text=best_result.uthmani_text,
+        errors=errors,
+    )
+
+
 @app.get(
     "/health",
     tags=["Health"],
@@ -254,34 +703,53 @@ def run_phonetization_and_error(
 
 Returns:
 - **status**: "healthy" if app is running, "unhealthy" if there are issues
-- **engine_connected**: Whether the engine is reachable at the configured URL
+- **engine_status**: "connected" if at least one engine is reachable
+- **engines**: The status of every configured engine
 
-The endpoint performs a connection check to the engine if it's configured.
+The endpoint performs a connection check to every engine. Unreachable engines are
+not routed to until they recover.
 """,
 )
 async def health():
     """Health check endpoint."""
-    import httpx
-
-    engine_status = "unknown"
-    try:
-        async with httpx.AsyncClient(timeout=5.0) as client:
-            response = await client.get(
-                app_settings.engine_url.replace("/predict", "/health")
-            )
-            if response.status_code == 200:
-                engine_status = "connected"
-            else:
-                engine_status = "disconnected"
-    except Exception:
-        engine_status = "disconnected"
-
+    engines = await check_engines_health()
     return {
         "status": "healthy",
-        "engine_status": engine_status,
+        "engine_status": "connected" if any(engines.values()) else "disconnected",
+        "engines": {
+            url: "connected" if healthy else "disconnected"
+            for url, healthy in engines.items()
+        },
     }
 
 
+@app.get(
+    "/cache-stats",
+    tags=["Health"],
+    summary="Cache Statistics",
+    description="""Hit and miss counts of the app caches.
+
+Returns for every cache:
+- **size** / **max_size**: Number of cached items and the cache capacity
+- **hits** / **misses** / **hit_ratio**: Lookups served from the cache or computed
+- **evictions**: Items dropped because the cache was full
+
+`search_shared` (hits and misses only) is reported if `search_cache_shared_dir` is set.
+
+With `executor_backend="process"` every worker process has its own phonetization
+cache, which is not counted here.
+""",
+)
+async def cache_stats():
+    stats = {
+        "phonetization": _phonetization_cache.stats().to_dict(),
+        "search": _search_cache.stats().to_dict(),
+    }
+    if _search_cache_backend is not None:
+        stats["search_shared"] = _search_cache_backend.stats()
+    return stats
+
+
 @app.post(
     "/search",
     response_model=SearchResponse,
@@ -297,6 +765,7 @@ for matching locations using fuzzy string matching.
 - **file**: Audio file (WAV recommended) - will be transcribed to phonemes via the engine
 - **phonetic_text**: Direct phonetic text input (skip audio transcription)
 - **error_ratio**: Maximum allowed Levenshtein distance as a fraction of query length (0.0-1.0)
+- **hint_sura_idx/hint_aya_idx**: Last matched aya of a recitation session. The aya and the `hint_window` ayat after it are searched first and the whole Quran only if nothing matches there
 
 ## Response
 
@@ -328,12 +797,25 @@ async def search(
         default=app_settings.error_ratio,
         description="Maximum allowed error ratio (0.0-1.0), defaults to app setting",
     ),
+    hint_sura_idx: Optional[int] = Query(
+        default=None,
+        description="Sura of the last matched aya. Its neighbourhood is searched first",
+    ),
+    hint_aya_idx: Optional[int] = Query(
+        default=None,
+        description="Last matched aya within `hint_sura_idx`",
+    ),
+    hint_window: Optional[int] = Query(
+        default=None,
+        ge=0,
+        description="Number of ayat after the hint aya to search first",
+    ),
 ):
     if error_ratio is None:
         error_ratio = app_settings.error_ratio
 
     if file:
-        phonemes = await call_engine_predict(file)
+        phonemes = (await call_engine_predict(file))["phonemes"]
     elif phonetic_text:
         phonemes = phonetic_text
     else:
@@ -341,12 +823,8 @@ async def search(
             status_code=422, detail="Either 'file' or 'phonetic_text' must be provided"
         )
 
-    loop = asyncio.get_event_loop()
-    results, message = await loop.run_in_executor(
-        get_search_executor(),
-        run_phonetic_search,
-        phonemes,
-        error_ratio,
+    results, message = await phonetic_search_with_hint(
+        phonemes, error_ratio, hint_sura_idx, hint_aya_idx, hint_window
     )
 
     return SearchResponse(phonemes=phonemes, results=results, message=message)
@@ -371,6 +849,7 @@ This endpoint:
 - **phonetic_text**: Direct phonetic text input (alternative to audio)
 - **moshaf**: MoshafAttributes form fields defining recitation rules (see API docs for full list)
 - **error_ratio**: Maximum allowed error ratio for search (0.0-1.0)
+- **hint_sura_idx/hint_aya_idx/hint_window**: Last matched aya (without `sura_idx`/`aya_idx`). Its neighbourhood is searched before the whole Quran
 
 ## MoshafAttributes (Recitation Rules)
 
@@ -455,11 +934,23 @@ async def correct_recitation(
     aya_idx: Optional[int] = Form(
         default=None, description="Aya number within the sura. If provided with sura_idx, skips search."
     ),
+    hint_sura_idx: Optional[int] = Form(
+        default=None,
+        description="Sura of the last matched aya. Its neighbourhood is searched first.",
+    ),
+    hint_aya_idx: Optional[int] = Form(
+        default=None, description="Last matched aya within `hint_sura_idx`."
+    ),
+    hint_window: Optional[int] = Form(
+        default=None,
+        ge=0,
+        description="Number of ayat after the hint aya to search first.",
+    ),
     moshaf: MoshafAttributes = Depends(correct_recitation_form_dependency()),
     error_ratio: Annotated[float, Form(ge=0.0, le=1)] = app_settings.error_ratio,
 ):
     if file and file.size:
-        predicted_phonemes = await call_engine_predict(file)
+        predicted_phonemes = (await call_engine_predict(file))["phonemes"]
     elif phonetic_text:
         predicted_phonemes = phonetic_text
     else:
@@ -467,60 +958,287 @@ async def correct_recitation(
             status_code=422, detail="Either 'file' or 'phonetic_text' must be provided"
         )
 
-    loop = asyncio.get_event_loop()
+    return await correct_phonemes(
+        predicted_phonemes,
+        moshaf,
+        error_ratio,
+        sura_idx=sura_idx,
+        aya_idx=aya_idx,
+        hint_sura_idx=hint_sura_idx,
+        hint_aya_idx=hint_aya_idx,
+        hint_window=hint_window,
+    )
 
-    if sura_idx is not None and aya_idx is not None:
-        # Skip search — use the specified ayah directly
-        aya = Aya(sura_idx, aya_idx).get()
-        uthmani_text = aya.uthmani
-        num_words = len(aya.uthmani_words)
-        best_result = SearchResultResponse(
-            start=PhonemesSearchSpanApp(
-                sura_idx=sura_idx,
-                aya_idx=aya_idx,
-                uthmani_word_idx=0,
-                uthmani_char_idx=0,
-                phonemes_idx=0,
-            ),
-            end=PhonemesSearchSpanApp(
-                sura_idx=sura_idx,
-                aya_idx=aya_idx,
-                uthmani_word_idx=num_words,
-                uthmani_char_idx=0,
-                phonemes_idx=0,
-            ),
-            uthmani_text=uthmani_text,
+
+def read_batch_archive(archive_bytes: bytes) -> list[tuple[str, bytes]]:
+    """Returns the (name, bytes) of every file of a zip archive sorted by name"""
+    with zipfile.ZipFile(io.BytesIO(archive_bytes)) as archive:
+        return [
+            (info.filename, archive.read(info))
+            for info in sorted(archive.infolist(), key=lambda info: info.filename)
+            if not info.is_dir()
+        ]
+
+
+@app.post(
+    "/correct-recitation/batch",
+    tags=["Recitation"],
+    summary="Correct Many Recitations",
+    response_class=StreamingResponse,
+    responses={
+        200: {
+            "content": {"application/x-ndjson": {}},
+            "description": "A `BatchItemResponse` JSON line for every recording",
+        }
+    },
+    description="""Analyze many recordings in a single request (offline grading).
+
+The recordings are transcribed by the engine concurrently (at most
+`batch_max_concurrency` at a time) then corrected as in `/correct-recitation`.
+Every distinct reference text is phonetized once for the whole batch.
+
+## Input Parameters
+
+- **files**: Audio files (WAV recommended)
+- **archive**: A zip archive of audio files (alternative to `files`)
+- **items**: JSON list of `{"name", "sura_idx", "aya_idx"}`. Matched to the recordings
+  by `name` if every item has one, otherwise by position
+- **moshaf** / **error_ratio**: as in `/correct-recitation`, for all the recordings
+
+## Response
+
+Newline delimited JSON streamed as the recordings finish (not in input order).
+Every line has `index` and `name` of the recording and either `result` (a
+`/correct-recitation` response) or `error`.
+
+## Example
+
+```bash
+curl -N -X POST "http://localhost:8001/correct-recitation/batch" \\
+    -F "files=@student1.wav" \\
+    -F "files=@student2.wav" \\
+    -F 'items=[{"sura_idx": 1, "aya_idx": 1}, {}]'
+```
+""",
+)
+async def correct_recitation_batch(
+    files: Annotated[
+        Optional[list[UploadFile]],
+        File(description="Audio files (WAV recommended) to analyze"),
+    ] = None,
+    archive: Annotated[
+        Optional[UploadFile], File(description="Zip archive of audio files")
+    ] = None,
+    items: Optional[str] = Form(
+        default=None,
+        description='JSON list of `{"name", "sura_idx", "aya_idx"}` per recording',
+    ),
+    moshaf: MoshafAttributes = Depends(correct_recitation_form_dependency()),
+    error_ratio: Annotated[float, Form(ge=0.0, le=1)] = app_settings.error_ratio,
+):
+    recordings = [(f.filename or "", await f.read()) for f in files or []]
+    if archive is not None:
+        try:
+            recordings += read_batch_archive(await archive.read())
+        except zipfile.BadZipFile as e:
+            raise HTTPException(status_code=422, detail=f"Invalid archive: {e}")
+    if not recordings:
+        raise HTTPException(
+            status_code=422, detail="Either 'files' or 'archive' must be provided"
         )
-    else:
-        # No ayah specified — search as before
-        search_results, message = await loop.run_in_executor(
-            get_search_executor(),
-            run_phonetic_search,
-            predicted_phonemes,
-            error_ratio,
+    if len(recordings) > app_settings.batch_max_items:
+        raise HTTPException(
+            status_code=413,
+            detail=f"A batch has at most {app_settings.batch_max_items} recordings",
         )
 
-        if not search_results:
-            raise ValueError(message or "No results found. Try increasing error_ratio.")
+    try:
+        items = TypeAdapter(list[BatchItem]).validate_json(items) if items else []
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=f"Invalid 'items': {e}")
+    if items and all(item.name is not None for item in items):
+        name_to_item = {item.name: item for item in items}
+        recording_items = [name_to_item.get(name) for name, _ in recordings]
+    elif len(items) in (0, len(recordings)):
+        recording_items = items or [None] * len(recordings)
+    else:
+        raise HTTPException(
+            status_code=422,
+            detail=(
+                "'items' has to have a `name` for every item or an item per recording"
+            ),
+        )
 
-        best_result = search_results[0]
+    engine_slots = asyncio.Semaphore(app_settings.batch_max_concurrency)
+    phonetizations: dict[str, asyncio.Future] = {}
 
-    reference_phonemes, errors = await loop.run_in_executor(
-        get_phonetization_executor(),
-        run_phonetization_and_error,
-        best_result.uthmani_text,
-        moshaf,
-        predicted_phonemes,
+    async def correct_item(index: int) -> BatchItemResponse:
+        name, audio_bytes = recordings[index]
+        item = recording_items[index] or BatchItem()
+        try:
+            async with engine_slots:
+                predicted_phonemes = (await predict_audio_bytes(audio_bytes))[
+                    "phonemes"
+                ]
+            result = await correct_phonemes(
+                predicted_phonemes,
+                moshaf,
+                error_ratio,
+                sura_idx=item.sura_idx,
+                aya_idx=item.aya_idx,
+                phonetizations=phonetizations,
+            )
+        except Exception as e:
+            # a failed recording is reported without stopping the batch
+            return BatchItemResponse(index=index, name=name, error=repr(e))
+        return BatchItemResponse(index=index, name=name, result=result)
+
+    async def stream_results():
+        tasks = [
+            asyncio.create_task(correct_item(idx)) for idx in range(len(recordings))
+        ]
+        try:
+            for task in asyncio.as_completed(tasks):
+                yield (await task).model_dump_json() + "\n"
+        finally:
+            # stops the remaining recordings if the client disconnects
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
+
+def finalized_correction(
+    correction: CorrectRecitationResponse,
+) -> tuple[int, list[ReciterErrorResponse]]:
+    """Returns the length of the words of the match but the last one, which may
+    be cut at the end of the stable phonemes, and their errors
+    """
+    finalized_len = max(correction.uthmani_text.rfind(" "), 0)
+    errors = [err for err in correction.errors if err.uthmani_pos[1] <= finalized_len]
+    return finalized_len, errors
+
+
+@app.websocket("/correct-recitation/stream")
+async def correct_recitation_stream(websocket: WebSocket):
+    """Streaming version of `/correct-recitation`
+
+    Protocol:
+    1. The client sends a `StreamStartMessage` as JSON text
+    2. The client sends the recording as binary PCM chunks of any length
+    3. Every `stream_hop_seconds` of new audio the server transcribes the last
+       `stream_window_seconds` on the engine, merges the phonemes and sends a
+       `partial` `StreamCorrectionResponse` once more words are final
+    4. The client sends `{"type": "end"}` and the server sends the `final`
+       `StreamCorrectionResponse` of the whole recording and closes
+
+    Failures are sent as `{"type": "error", "detail": ...}` before closing.
+    """
+    await websocket.accept()
+    try:
+        start = StreamStartMessage.model_validate_json(await websocket.receive_text())
+        moshaf = MoshafAttributes(**{**DEFAULT_MOSHAF.model_dump(), **start.moshaf})
+        stream = RecitationStream(
+            sampling_rate=start.sampling_rate,
+            window_seconds=app_settings.stream_window_seconds,
+            hop_seconds=app_settings.stream_hop_seconds,
+            right_context_seconds=app_settings.stream_right_context_seconds,
+            sample_format=start.sample_format,
+            max_seconds=app_settings.stream_max_seconds,
+        )
+    except WebSocketDisconnect:
+        return
+    except (ValidationError, ValueError) as e:
+        await websocket.send_json({"type": "error", "detail": str(e)})
+        await websocket.close(code=1007)
+        return
+
+    error_ratio = (
+        app_settings.error_ratio if start.error_ratio is None else start.error_ratio
     )
+    hint = (start.hint_sura_idx, start.hint_aya_idx)
+    last_finalized = None
+
+    async def correct(phonemes: str) -> Optional[CorrectRecitationResponse]:
+        nonlocal hint
+        try:
+            correction = await correct_phonemes(
+                phonemes,
+                moshaf,
+                error_ratio,
+                sura_idx=start.sura_idx,
+                aya_idx=start.aya_idx,
+                hint_sura_idx=hint[0],
+                hint_aya_idx=hint[1],
+            )
+        except ValueError:
+            return None
+        # the next updates extend this match so they are searched near it first
+        hint = (correction.start.sura_idx, correction.start.aya_idx)
+        return correction
 
-    return CorrectRecitationResponse(
-        start=best_result.start,
-        end=best_result.end,
-        predicted_phonemes=predicted_phonemes,
-        reference_phonemes=reference_phonemes,
-        uthmani_text=best_result.uthmani_text,
-        errors=errors,
-    )
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+            is_end = message.get("bytes") is None
+            if is_end:
+                control = json.loads(message.get("text") or "{}")
+                if not isinstance(control, dict) or control.get("type") != "end":
+                    raise ValueError('Expected PCM bytes or {"type": "end"}')
+                window = stream.flush()
+                windows = [] if window is None else [window]
+            else:
+                windows = stream.add_chunk(message["bytes"])
+
+            for window in windows:
+                wav_bytes = pcm_to_wav(window, stream.sampling_rate)
+                out = await predict_audio_bytes(wav_bytes)
+                stream.add_phonemes(out["phonemes"], len(window))
+
+            if is_end:
+                correction = await correct(stream.phonemes)
+                if correction is None:
+                    await websocket.send_json(
+                        {
+                            "type": "error",
+                            "detail": "No results found. Try increasing error_ratio.",
+                        }
+                    )
+                else:
+                    response = StreamCorrectionResponse(
+                        **correction.model_dump(),
+                        type="final",
+                        finalized_uthmani_len=len(correction.uthmani_text),
+                    )
+                    await websocket.send_text(response.model_dump_json())
+                await websocket.close()
+                return
+
+            if not windows or not stream.stable_phonemes:
+                continue
+            correction = await correct(stream.stable_phonemes)
+            if correction is None:
+                continue
+            finalized_len, errors = finalized_correction(correction)
+            finalized = (correction.start, correction.uthmani_text[:finalized_len])
+            if finalized == last_finalized:
+                continue
+            last_finalized = finalized
+            response = StreamCorrectionResponse(
+                **correction.model_dump(exclude={"errors"}),
+                errors=errors,
+                type="partial",
+                finalized_uthmani_len=finalized_len,
+                pending_phonemes=stream.phonemes[len(stream.stable_phonemes) :],
+            )
+            await websocket.send_text(response.model_dump_json())
+    except WebSocketDisconnect:
+        return
+    except (ValueError, httpx.HTTPError) as e:
+        await websocket.send_json({"type": "error", "detail": str(e)})
+        await websocket.close(code=1011 if isinstance(e, httpx.HTTPError) else 1007)
 
 
 @app.post(
@@ -542,7 +1260,9 @@ without search or error analysis.
 
 Returns:
 - **phonemes**: Phonetic transcription of the audio
-- **sifat**: Currently always null (attributes not implemented)
+- **phonemes_probs**: Confidence of every predicted phoneme
+- **sifat**: Attributes (sifat) of every phonemes group. Null if the model
+  did not predict every attribute of every group
 
 ## Example
 
@@ -558,8 +1278,12 @@ async def transcript(
     ),
 ):
     """Transcribe audio to phonetic script (proxy to engine)."""
-    phonemes = await call_engine_predict(file)
-    return TranscriptResponse(phonemes=phonemes, sifat=None)
+    engine_out = await call_engine_predict(file)
+    return TranscriptResponse(
+        phonemes=engine_out["phonemes"],
+        phonemes_probs=engine_out["phonemes_probs"].tolist(),
+        sifat=engine_sifat_to_app(engine_out["sifat"]),
+    )
 
 
 # Serve the playground UI if the directory exists in the current working directory.
@@ -1,4 +1,5 @@
 import os
+from typing import Literal
 
 from pydantic import Field
 from pydantic_settings import BaseSettings
@@ -9,6 +10,35 @@ class AppSettings(BaseSettings):
         default="http://0.0.0.0:8000/predict",
         description="URL of the Quran Muaalem engine predict endpoint.",
     )
+    engine_urls: list[str] = Field(
+        default=[],
+        description=(
+            "URLs of the predict endpoints of several engine replicas to balance "
+            "the load over. `engine_url` is used if empty."
+        ),
+    )
+    engine_routing: Literal["least_outstanding", "power_of_two"] = Field(
+        default="least_outstanding",
+        description=(
+            "How to pick an engine: the one with the fewest in flight requests "
+            "or the better of two engines picked at random."
+        ),
+    )
+    engine_failure_threshold: int = Field(
+        default=3,
+        description="Consecutive failed calls after which an engine is marked down.",
+        ge=1,
+    )
+    engine_cooldown: float = Field(
+        default=10.0,
+        description="Seconds an engine is marked down before it is tried again.",
+        ge=0.0,
+    )
+    engine_health_check_interval: float = Field(
+        default=10.0,
+        description="Seconds between active health checks of the engines (0 disables).",
+        ge=0.0,
+    )
     host: str = Field(
         default="0.0.0.0",
         description="Bind address for the server.",
@@ -25,13 +55,160 @@ class AppSettings(BaseSettings):
         ge=0.0,
         le=1.0,
     )
+    search_hint_window: int = Field(
+        default=3,
+        description=(
+            "Number of ayat after a position hint aya searched before the whole "
+            "Quran (default of the `hint_window` request parameter)."
+        ),
+        ge=0,
+    )
+    stream_window_seconds: float = Field(
+        default=6.0,
+        description=(
+            "Seconds of audio transcribed at every step of /correct-recitation/stream "
+            "(at most the engine `max_audio_seconds`)."
+        ),
+        gt=0.0,
+    )
+    stream_hop_seconds: float = Field(
+        default=2.0,
+        description="Seconds of new streamed audio between two transcriptions.",
+        gt=0.0,
+    )
+    stream_right_context_seconds: float = Field(
+        default=1.0,
+        description=(
+            "Seconds at the end of a streamed window whose phonemes are not final "
+            "until the next window."
+        ),
+        ge=0.0,
+    )
+    stream_max_seconds: float = Field(
+        default=300.0,
+        description="Maximum length of a streamed recording in seconds.",
+        gt=0.0,
+    )
+    batch_max_items: int = Field(
+        default=1000,
+        description="Maximum number of recordings of a /correct-recitation/batch call.",
+        ge=1,
+    )
+    batch_max_concurrency: int = Field(
+        default=8,
+        description="Recordings of a batch transcribed by the engine at the same time.",
+        ge=1,
+    )
+    phonetic_search_index: bool = Field(
+        default=True,
+        description=(
+            "Restrict the phonetic search fuzzy matching to the candidates of a "
+            "q-gram index of the Quran phonemes."
+        ),
+    )
+    phonetic_search_index_dir: str | None = Field(
+        default=None,
+        description=(
+            "Directory to load the q-gram index from (memory mapped and shared by "
+            "the worker processes). Built and saved there if missing."
+        ),
+    )
+    executor_backend: Literal["thread", "process"] = Field(
+        default="thread",
+        description=(
+            "Executor of phonetic search and error explanation. Both are pure "
+            "Python work holding the GIL, so use `process` to scale over CPU cores "
+            "(`thread` scales only on a free-threaded Python build)."
+        ),
+    )
     max_workers_phonetic_search: int = Field(
         default=max(1, (os.cpu_count() or 4) // 2),
-        description="Number of worker threads for phonetic search executor.",
+        description="Number of workers of the phonetic search executor.",
         ge=1,
     )
     max_workers_phonetization: int = Field(
         default=max(1, (os.cpu_count() or 4) // 2),
-        description="Number of worker threads for phonetization and error explanation executor.",
+        description="Number of workers of the phonetization and error explanation executor.",
+        ge=1,
+    )
+    engine_timeout: float = Field(
+        default=30.0,
+        description="Timeout in seconds of a transcription call to the engine.",
+        gt=0.0,
+    )
+    engine_connect_timeout: float = Field(
+        default=5.0,
+        description="Timeout in seconds to open a connection to the engine.",
+        gt=0.0,
+    )
+    engine_health_timeout: float = Field(
+        default=5.0,
+        description="Timeout in seconds of the engine health check.",
+        gt=0.0,
+    )
+    engine_max_connections: int = Field(
+        default=100,
+        description="Maximum number of open connections to the engine.",
         ge=1,
     )
+    engine_max_keepalive_connections: int = Field(
+        default=20,
+        description="Maximum number of idle connections kept alive to the engine.",
+        ge=0,
+    )
+    engine_keepalive_expiry: float = Field(
+        default=5.0,
+        description="Seconds an idle connection to the engine is kept alive.",
+        ge=0.0,
+    )
+    engine_http2: bool = Field(
+        default=False,
+        description="Use HTTP/2 to the engine (requires `httpx[http2]`).",
+    )
+    engine_retries: int = Field(
+        default=2,
+        description="Number of retries of a failed transcription call to the engine.",
+        ge=0,
+    )
+    engine_retry_backoff: float = Field(
+        default=0.1,
+        description="Seconds to wait before the first retry, doubled on every retry.",
+        ge=0.0,
+    )
+    phonetization_cache_size: int = Field(
+        default=1024,
+        description=(
+            "Maximum number of reference phonetizations cached for "
+            "/correct-recitation (0 disables the cache)."
+        ),
+        ge=0,
+    )
+    phonetization_cache_ttl: float | None = Field(
+        default=None,
+        description="Seconds a cached phonetization stays valid (None for no expiry).",
+        gt=0.0,
+    )
+    phonetization_store_dirs: list[str] = Field(
+        default=[],
+        description=(
+            "Directories of precomputed phonetization stores (one per moshaf "
+            "profile) built with `quran-muaalem-phonetization-store`."
+        ),
+    )
+    search_cache_size: int = Field(
+        default=4096,
+        description="Maximum number of cached /search results (0 disables the cache).",
+        ge=0,
+    )
+    search_cache_ttl: float | None = Field(
+        default=None,
+        description="Seconds a cached search result stays valid (None for no expiry).",
+        gt=0.0,
+    )
+    search_cache_shared_dir: str | None = Field(
+        default=None,
+        description=(
+            "Directory of a search result cache shared by several app replicas "
+            "(a stand-in for a shared cache service)."
+        ),
+    )
@@ -14,13 +14,7 @@ from inspect import Parameter, Signature
 from quran_transcript import SifaOutput
 from quran_transcript.phonetics.moshaf_attributes import MoshafAttributes
 
-DEFAULT_MOSHAF = MoshafAttributes(
-    rewaya="hafs",
-    madd_monfasel_len=4,
-    madd_mottasel_len=4,
-    madd_mottasel_waqf=4,
-    madd_aared_len=4,
-)
+from ..muaalem_typing import DEFAULT_MOSHAF
 
 
 class PhonemesSearchSpanApp(BaseModel):
@@ -77,9 +71,15 @@ class TranscriptResponse(BaseModel):
     """Response from the /transcript endpoint."""
 
     phonemes: str = Field(description="Phonetic transcription from audio")
+    phonemes_probs: list[float] | None = Field(
+        default=None, description="Confidence of every predicted phoneme"
+    )
     sifat: list[SifaOutput] | None = Field(
         default=None,
-        description="Sifa (attributes) - currently not implemented, always None",
+        description=(
+            "Sifa (attributes) of every phonemes group. "
+            "None if the model did not predict every sifa of every group"
+        ),
     )
 
 
@@ -135,6 +135,84 @@ class CorrectRecitationResponse(BaseModel):
     )
 
 
+class BatchItem(BaseModel):
+    """Options of a single recording of a correct-recitation batch."""
+
+    name: Optional[str] = Field(
+        default=None,
+        description="File name (or archive member) the options apply to",
+    )
+    sura_idx: Optional[int] = Field(
+        default=None, description="Sura number. If provided with aya_idx, skips search"
+    )
+    aya_idx: Optional[int] = Field(
+        default=None, description="Aya number. If provided with sura_idx, skips search"
+    )
+
+
+class BatchItemResponse(BaseModel):
+    """A line of the NDJSON response of the correct-recitation batch endpoint."""
+
+    index: int = Field(description="0-based index of the recording in the batch")
+    name: str = Field(description="File name (or archive member) of the recording")
+    result: Optional[CorrectRecitationResponse] = Field(
+        default=None, description="The correction of the recording"
+    )
+    error: Optional[str] = Field(
+        default=None, description="Why the recording could not be corrected"
+    )
+
+
+class StreamStartMessage(BaseModel):
+    """First (text) message of a correct-recitation stream."""
+
+    sampling_rate: int = Field(default=16000, description="Sampling rate of the audio")
+    sample_format: Literal["s16le", "f32le"] = Field(
+        default="s16le",
+        description="Mono little endian PCM of 16 bit integers or 32 bit floats",
+    )
+    error_ratio: Optional[float] = Field(
+        default=None, ge=0.0, le=1.0, description="Maximum allowed error ratio"
+    )
+    sura_idx: Optional[int] = Field(
+        default=None, description="Sura number. If provided with aya_idx, skips search"
+    )
+    aya_idx: Optional[int] = Field(
+        default=None, description="Aya number. If provided with sura_idx, skips search"
+    )
+    hint_sura_idx: Optional[int] = Field(
+        default=None, description="Sura of the last matched aya"
+    )
+    hint_aya_idx: Optional[int] = Field(
+        default=None, description="Last matched aya within `hint_sura_idx`"
+    )
+    moshaf: dict = Field(
+        default={},
+        description="MoshafAttributes fields that differ from the default moshaf",
+    )
+
+
+class StreamCorrectionResponse(CorrectRecitationResponse):
+    """Update message of a correct-recitation stream."""
+
+    type: Literal["partial", "final"] = Field(
+        description=(
+            "`partial`: the errors of the finalized words so far. "
+            "`final`: the errors of the whole recording"
+        )
+    )
+    finalized_uthmani_len: int = Field(
+        description=(
+            "Length of the prefix of `uthmani_text` whose words are final. "
+            "Only errors within it are reported in a partial update"
+        )
+    )
+    pending_phonemes: str = Field(
+        default="",
+        description="Predicted phonemes after `predicted_phonemes` that may change",
+    )
+
+
 def convert_form_value(value: str, field_type):
     """
     Convert a raw form string to the type expected by the model.
@@ -0,0 +1,230 @@
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import Executor, Future
+from typing import Callable
+
+import numpy as np
+from numpy.typing import NDArray
+
+
+def audio_key(
+    audio_bytes: bytes,
+    sampling_rate: int,
+    max_audio_seconds: float | None,
+    options: str = "",
+) -> str:
+    """Content address of a decoded audio file: the SHA-256 of the raw bytes and
+    the decoding options
+    """
+    digest = hashlib.sha256(audio_bytes).hexdigest()
+    key = f"{digest}-{sampling_rate}-{max_audio_seconds}"
+    if options:
+        key += "-" + hashlib.sha256(options.encode("utf-8")).hexdigest()[:16]
+    return key
+
+
+class AudioCache:
+    """Cache of decoded (resampled) waves keyed by the content of the audio file
+
+    Two tiers: an in memory least recently used tier and an optional directory of
+    `.npy` files that are memory mapped on read, so the worker processes of a host
+    share the decoded waves and they survive restarts. The returned waves are
+    shared by every hit so they must not be modified in place.
+
+    Args:
+        max_size (int): maximum number of waves in memory. `0` disables the
+            memory tier
+        directory (str | None): directory of the disk tier. `None` disables it
+        max_disk_bytes (int | None): the least recently used files are deleted
+            when the disk tier grows over this size. `None` for no limit
+        options (str): the decoding options other than the sampling rate and the
+            duration (ex: the resampler), part of every key so caches with other
+            options can share the directory
+    """
+
+    def __init__(
+        self,
+        max_size: int = 128,
+        directory: str | None = None,
+        max_disk_bytes: int | None = None,
+        options: str = "",
+    ):
+        self.max_size = max_size
+        self.options = options
+        self.directory = directory
+        self.max_disk_bytes = max_disk_bytes
+        self._items: OrderedDict[str, NDArray] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._disk_bytes = 0
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+            self._disk_bytes = sum(size for _, size, _ in self._disk_files())
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.npy")
+
+    def _disk_files(self) -> list[tuple[float, int, str]]:
+        """(mtime, size, path) of the files of the disk tier"""
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".npy"):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        return files
+
+    def _remember(self, key: str, wave: NDArray):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._items[key] = wave
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def get(self, key: str) -> NDArray | None:
+        """Returns the cached wave of `key` or `None`"""
+        with self._lock:
+            wave = self._items.get(key)
+            if wave is not None:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return wave
+
+        if self.directory is not None:
+            path = self._path(key)
+            try:
+                # copy on write so torch can wrap it without a copy or a warning
+                wave = np.load(path, mmap_mode="c")
+                # the modification time orders the files for the eviction
+                os.utime(path)
+            except (FileNotFoundError, ValueError, OSError):
+                wave = None
+            if wave is not None:
+                with self._lock:
+                    self.disk_hits += 1
+                self._remember(key, wave)
+                return wave
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key: str, wave: NDArray):
+        wave = np.asarray(wave, dtype=np.float32)
+        self._remember(key, wave)
+        if self.directory is None:
+            return
+
+        # written to a temporary file then renamed so readers never see partial files
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=".tmp-")
+        with os.fdopen(fd, "wb") as f:
+            np.save(f, wave)
+        path = self._path(key)
+        with self._lock:
+            # a replaced file is not counted twice
+            try:
+                self._disk_bytes -= os.path.getsize(path)
+            except FileNotFoundError:
+                pass
+            os.replace(tmp_path, path)
+            self._disk_bytes += os.path.getsize(path)
+            over_limit = (
+                self.max_disk_bytes is not None
+                and self._disk_bytes > self.max_disk_bytes
+            )
+        if over_limit:
+            self._evict_disk()
+
+    def _evict_disk(self):
+        files = sorted(self._disk_files())
+        total = sum(size for _, size, _ in files)
+        # down to 90% of the limit to not evict on every write
+        target = int(self.max_disk_bytes * 0.9)
+        for _, size, path in files:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        with self._lock:
+            self._disk_bytes = total
+
+    def get_or_load(
+        self,
+        audio_bytes: bytes,
+        load: Callable[[bytes, int, float | None], NDArray],
+        sampling_rate: int,
+        max_audio_seconds: float | None,
+    ) -> NDArray:
+        """Returns the cached wave of `audio_bytes` or caches
+        `load(audio_bytes, sampling_rate, max_audio_seconds)`
+        """
+        key = audio_key(audio_bytes, sampling_rate, max_audio_seconds, self.options)
+        wave = self.get(key)
+        if wave is None:
+            wave = load(audio_bytes, sampling_rate, max_audio_seconds)
+            self.set(key, wave)
+        return wave
+
+    def submit(
+        self,
+        executor: Executor,
+        audio_bytes: bytes,
+        load: Callable[[bytes, int, float | None], NDArray],
+        sampling_rate: int,
+        max_audio_seconds: float | None,
+    ) -> Future:
+        """Like `get_or_load` but decodes a missing wave in `executor`
+
+        Returns a future of the wave that is already done on a cache hit.
+        """
+        key = audio_key(audio_bytes, sampling_rate, max_audio_seconds, self.options)
+        wave = self.get(key)
+        if wave is not None:
+            future = Future()
+            future.set_result(wave)
+            return future
+
+        # the wave is cached before the returned future is done
+        future = Future()
+
+        def cache_result(decoded: Future):
+            try:
+                wave = decoded.result()
+            except BaseException as e:
+                future.set_exception(e)
+                return
+            try:
+                self.set(key, wave)
+            finally:
+                # a failing disk tier does not fail the request
+                future.set_result(wave)
+
+        executor.submit(
+            load, audio_bytes, sampling_rate, max_audio_seconds
+        ).add_done_callback(cache_result)
+        return future
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.disk_hits + self.misses
+            return {
+                "size": len(self._items),
+                "max_size": self.max_size,
+                "disk_bytes": self._disk_bytes,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_ratio": (self.hits + self.disk_hits) / total if total else 0.0,
+            }
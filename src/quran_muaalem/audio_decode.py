@@ -0,0 +1,172 @@
+"""Decoding uploaded audio files into mono float32 waves
+
+Most uploads are already 16 kHz mono PCM WAV (what the recorders of the apps
+produce), so the WAV header is parsed here and the samples are read from a view
+of the uploaded bytes without librosa. Other containers go through `soundfile`
+and only the files it cannot read fall back to `librosa.load`. Every path reads
+only the frames within `max_audio_seconds` and resamples only if the rates
+differ.
+"""
+
+import io
+import struct
+from typing import Literal
+
+import numpy as np
+from numpy.typing import NDArray
+
+# `soxr` qualities (`quality` is the `soxr_hq` default of `librosa.load`)
+RESAMPLER_QUALITIES = {"fast": "LQ", "quality": "HQ"}
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+# (format, bits per sample) -> (numpy dtype, offset, scale) of the float conversion
+WAV_SAMPLE_TYPES = {
+    (WAVE_FORMAT_PCM, 8): ("u1", 128.0, 1 / 128),
+    (WAVE_FORMAT_PCM, 16): ("<i2", 0.0, 1 / 2**15),
+    (WAVE_FORMAT_PCM, 32): ("<i4", 0.0, 1 / 2**31),
+    (WAVE_FORMAT_IEEE_FLOAT, 32): ("<f4", 0.0, 1.0),
+    (WAVE_FORMAT_IEEE_FLOAT, 64): ("<f8", 0.0, 1.0),
+}
+
+
+def max_frames(sampling_rate: int, max_audio_seconds: float | None) -> int | None:
+    """Number of frames of `max_audio_seconds` (as `librosa.load(duration=...)`)"""
+    if max_audio_seconds is None:
+        return None
+    return int(max_audio_seconds * sampling_rate)
+
+
+def read_wav(
+    audio_bytes: bytes, max_audio_seconds: float | None = None
+) -> tuple[NDArray, int] | None:
+    """Reads the samples of a PCM or float WAV file
+
+    Returns:
+        (wave, sampling_rate) where wave is float32 of shape [frames, channels]
+        or `None` if the file is not a WAV file this parser supports (e.g.
+        24 bit samples) to fall back to a full decoder.
+    """
+    if audio_bytes[:4] != b"RIFF" or audio_bytes[8:12] != b"WAVE":
+        return None
+
+    fmt = None
+    pos = 12
+    while pos + 8 <= len(audio_bytes):
+        chunk_id = audio_bytes[pos : pos + 4]
+        (chunk_size,) = struct.unpack_from("<I", audio_bytes, pos + 4)
+        body = pos + 8
+        if chunk_id == b"fmt " and chunk_size >= 16:
+            fmt = struct.unpack_from("<HHIIHH", audio_bytes, body)
+            if fmt[0] == WAVE_FORMAT_EXTENSIBLE and chunk_size >= 40:
+                # the format tag is the start of the sub format GUID
+                (sub_format,) = struct.unpack_from("<H", audio_bytes, body + 24)
+                fmt = (sub_format, *fmt[1:])
+        elif chunk_id == b"data":
+            if fmt is None:
+                return None
+            format_tag, channels, sampling_rate, _, block_align, bits = fmt
+            sample_type = WAV_SAMPLE_TYPES.get((format_tag, bits))
+            if (
+                sample_type is None
+                or channels < 1
+                or block_align != channels * bits // 8
+            ):
+                return None
+            dtype, offset, scale = sample_type
+
+            # a streamed recording may have an unknown (or too large) data size
+            data_size = min(chunk_size, len(audio_bytes) - body)
+            num_frames = data_size // block_align
+            limit = max_frames(sampling_rate, max_audio_seconds)
+            if limit is not None:
+                num_frames = min(num_frames, limit)
+
+            # a view of the uploaded bytes: only the kept frames are converted
+            samples = np.frombuffer(
+                audio_bytes, dtype=dtype, count=num_frames * channels, offset=body
+            ).reshape(num_frames, channels)
+            if dtype == "<f4":
+                wave = samples.copy()
+            else:
+                wave = samples.astype(np.float32)
+                if offset:
+                    wave -= offset
+                if scale != 1.0:
+                    wave *= scale
+            return wave, sampling_rate
+        # chunks are padded to an even size
+        pos = body + chunk_size + (chunk_size & 1)
+    return None
+
+
+def read_soundfile(
+    audio_bytes: bytes, max_audio_seconds: float | None = None
+) -> tuple[NDArray, int] | None:
+    """Reads any container of `soundfile` (FLAC, OGG, ...) or `None` if it fails"""
+    import soundfile as sf
+
+    try:
+        with sf.SoundFile(io.BytesIO(audio_bytes)) as f:
+            frames = max_frames(f.samplerate, max_audio_seconds)
+            wave = f.read(frames=-1 if frames is None else frames, dtype="float32")
+            return wave.reshape(len(wave), -1), f.samplerate
+    except (sf.LibsndfileError, RuntimeError):
+        return None
+
+
+def resample(
+    wave: NDArray,
+    orig_sampling_rate: int,
+    sampling_rate: int,
+    resampler: Literal["fast", "quality"] = "quality",
+) -> NDArray:
+    if orig_sampling_rate == sampling_rate:
+        return wave
+    import soxr
+
+    out = soxr.resample(
+        wave, orig_sampling_rate, sampling_rate, quality=RESAMPLER_QUALITIES[resampler]
+    )
+    # the length `librosa.resample` fixes the output to
+    num_samples = int(np.ceil(len(wave) * sampling_rate / orig_sampling_rate))
+    out = np.pad(out[:num_samples], (0, max(0, num_samples - len(out))))
+    return out.astype(np.float32, copy=False)
+
+
+def decode_audio(
+    audio_bytes: bytes,
+    sampling_rate: int = 16000,
+    max_audio_seconds: float | None = None,
+    resampler: Literal["fast", "quality"] = "quality",
+) -> NDArray:
+    """Decodes an audio file into a mono float32 wave at `sampling_rate`
+
+    Gives the same wave as `librosa.load(..., sr=sampling_rate, mono=True,
+    duration=max_audio_seconds)` with the `quality` resampler.
+
+    Args:
+        audio_bytes (bytes): the content of the audio file
+        sampling_rate (int): the output sampling rate
+        max_audio_seconds (float | None): only this duration of the start of the
+            audio is decoded. `None` decodes all of it
+        resampler (str): `fast` or `quality` (librosa's default) resampling used
+            only if the audio is at another sampling rate
+    """
+    decoded = read_wav(audio_bytes, max_audio_seconds)
+    if decoded is None:
+        decoded = read_soundfile(audio_bytes, max_audio_seconds)
+    if decoded is None:
+        # compressed formats libsndfile cannot read (e.g. m4a through audioread)
+        import librosa
+
+        wave, orig_sampling_rate = librosa.load(
+            io.BytesIO(audio_bytes), sr=None, mono=True, duration=max_audio_seconds
+        )
+    else:
+        wave, orig_sampling_rate = decoded
+        wave = wave[:, 0] if wave.shape[1] == 1 else wave.mean(axis=1)
+
+    return resample(wave, orig_sampling_rate, sampling_rate, resampler)
@@ -0,0 +1,476 @@
+"""Offline grading of many recordings with `Muaalem`
+
+The recordings are listed in a manifest (CSV or JSONL) with the columns:
+    path: the audio file (relative to the manifest directory)
+    sura_idx, aya_idx: the recited aya
+    start_word, num_words: the recited imlaey words of the aya (the whole aya
+        if empty)
+    moshaf: a profile name of `--moshaf-profiles` (the default moshaf if empty)
+    id: identifies the item in the results (optional, defaults to the path)
+
+or found in a directory where every file is named by its aya as `SSSAAA*.wav`
+(ex: `002282.mp3` or `002282_15.wav`).
+
+Audio decoding, phonetization and error explanation run in a process pool while
+the model runs the current chunk of recordings in the main process. Every chunk
+is appended to the output (JSONL file or a directory of Parquet parts) once it is
+done, so a crashed run continues from the last written chunk.
+
+Example:
+    quran-muaalem-batch manifest.csv results.jsonl --num-workers 8
+"""
+
+import argparse
+import csv
+import json
+import logging
+import os
+import re
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import asdict, dataclass, fields
+from pathlib import Path
+from typing import Any, Iterator
+
+import torch
+from quran_transcript import Aya, explain_error, quran_phonetizer
+from quran_transcript.phonetics.moshaf_attributes import MoshafAttributes
+
+from .audio_decode import decode_audio
+from .inference import Muaalem
+from .muaalem_typing import DEFAULT_MOSHAF
+
+
+SAMPLING_RATE = 16000
+AUDIO_SUFFIXES = {".wav", ".mp3", ".flac", ".ogg", ".opus", ".m4a"}
+
+
+@dataclass
+class GradingItem:
+    path: str
+    sura_idx: int
+    aya_idx: int
+    start_word: int | None = None
+    num_words: int | None = None
+    moshaf: str | None = None
+    id: str | None = None
+
+    @property
+    def key(self) -> str:
+        """Identifies the item in the results (the path if it has no `id`)"""
+        return self.path if self.id is None else self.id
+
+
+def _optional_int(value) -> int | None:
+    return None if value in (None, "") else int(value)
+
+
+def read_manifest(manifest: str | Path) -> list[GradingItem]:
+    """Reads a CSV or JSONL manifest. Relative paths are resolved against the
+    manifest directory
+    """
+    manifest = Path(manifest)
+    with open(manifest, encoding="utf-8") as f:
+        if manifest.suffix == ".jsonl":
+            rows = [json.loads(line) for line in f if line.strip()]
+        else:
+            rows = list(csv.DictReader(f))
+
+    items = []
+    for row in rows:
+        path = Path(row["path"])
+        if not path.is_absolute():
+            path = manifest.parent / path
+        items.append(
+            GradingItem(
+                path=str(path),
+                sura_idx=int(row["sura_idx"]),
+                aya_idx=int(row["aya_idx"]),
+                start_word=_optional_int(row.get("start_word")),
+                num_words=_optional_int(row.get("num_words")),
+                moshaf=row.get("moshaf") or None,
+                id=row.get("id") or None,
+            )
+        )
+    return items
+
+
+def scan_directory(directory: str | Path) -> list[GradingItem]:
+    """Lists the audio files of a directory named by their aya (`SSSAAA*`)"""
+    items = []
+    for path in sorted(Path(directory).rglob("*")):
+        if path.suffix.lower() not in AUDIO_SUFFIXES:
+            continue
+        match = re.match(r"(\d{3})(\d{3})", path.stem)
+        if match is None:
+            logging.warning(f"Skipping `{path}`: the name does not start with SSSAAA")
+            continue
+        items.append(
+            GradingItem(
+                path=str(path), sura_idx=int(match[1]), aya_idx=int(match[2])
+            )
+        )
+    return items
+
+
+def prepare_item(item: GradingItem, moshaf_fields: dict) -> dict:
+    """Decodes the audio and phonetizes the reference of an item (in a worker)"""
+    try:
+        aya = Aya(item.sura_idx, item.aya_idx)
+        if item.start_word is None and item.num_words is None:
+            uthmani = aya.get().uthmani
+        else:
+            start_word = item.start_word or 0
+            num_words = item.num_words
+            if num_words is None:
+                num_words = len(aya.get().imlaey_words) - start_word
+            uthmani = aya.get_by_imlaey_words(start_word, num_words).uthmani
+        ref = quran_phonetizer(
+            uthmani, MoshafAttributes(**moshaf_fields), remove_spaces=True
+        )
+        with open(item.path, "rb") as f:
+            wave = decode_audio(f.read(), SAMPLING_RATE)
+    except Exception as e:
+        return {"error": repr(e)}
+    return {"wave": wave, "uthmani": uthmani, "ref": ref}
+
+
+def explain_item(uthmani: str, ref, predicted_phonemes: str) -> list[dict]:
+    """The errors of a prediction as dicts (in a worker)"""
+    errors = []
+    for err in explain_error(
+        uthmani_text=uthmani,
+        ref_ph_text=ref.phonemes,
+        predicted_ph_text=predicted_phonemes,
+        mappings=ref.mappings,
+    ):
+        error = {field.name: getattr(err, field.name) for field in fields(err)}
+        for key in [
+            "ref_tajweed_rules",
+            "inserted_tajweed_rules",
+            "replaced_tajweed_rules",
+            "missing_tajweed_rules",
+        ]:
+            rules = getattr(err, key)
+            error[key] = (
+                [
+                    {
+                        "name": {"ar": rule.name.ar, "en": rule.name.en},
+                        "golden_len": rule.golden_len,
+                        "correctness_type": rule.correctness_type,
+                        "tag": rule.tag,
+                    }
+                    for rule in rules
+                ]
+                if rules
+                else None
+            )
+        errors.append(error)
+    return errors
+
+
+class JsonlResults:
+    """Results appended to a JSONL file, a line per item"""
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+    def done_keys(self) -> set[str]:
+        if not self.path.exists():
+            return set()
+        done = set()
+        valid_bytes = 0
+        with open(self.path, "rb") as f:
+            for line in f:
+                try:
+                    if not line.endswith(b"\n"):
+                        raise ValueError("Incomplete line")
+                    done.add(json.loads(line)["key"])
+                except (ValueError, KeyError):
+                    # a line cut by a crash
+                    break
+                valid_bytes += len(line)
+        with open(self.path, "r+b") as f:
+            f.truncate(valid_bytes)
+        return done
+
+    def write(self, rows: list[dict]):
+        with open(self.path, "a", encoding="utf-8") as f:
+            for row in rows:
+                f.write(json.dumps(row, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+
+class ParquetResults:
+    """Results written as a Parquet part file per chunk (requires `pyarrow`).
+    `errors` is stored as a JSON string
+    """
+
+    def __init__(self, directory: str | Path):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def _parts(self) -> list[Path]:
+        return sorted(self.directory.glob("part-*.parquet"))
+
+    def done_keys(self) -> set[str]:
+        import pyarrow.parquet as pq
+
+        done = set()
+        for part in self._parts():
+            done.update(pq.read_table(part, columns=["key"])["key"].to_pylist())
+        return done
+
+    @staticmethod
+    def schema():
+        """The schema of every part (inferring it from the rows of a part would
+        give null columns to a part where all the items failed)
+        """
+        import pyarrow as pa
+
+        return pa.schema(
+            [
+                ("key", pa.string()),
+                ("path", pa.string()),
+                ("sura_idx", pa.int64()),
+                ("aya_idx", pa.int64()),
+                ("start_word", pa.int64()),
+                ("num_words", pa.int64()),
+                ("moshaf", pa.string()),
+                ("id", pa.string()),
+                ("uthmani_text", pa.string()),
+                ("reference_phonemes", pa.string()),
+                ("predicted_phonemes", pa.string()),
+                ("phonemes_mean_prob", pa.float64()),
+                ("num_errors", pa.int64()),
+                ("errors", pa.string()),
+                ("error", pa.string()),
+            ]
+        )
+
+    def write(self, rows: list[dict]):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        rows = [
+            {**row, "errors": json.dumps(row["errors"], ensure_ascii=False)}
+            for row in rows
+        ]
+        part = self.directory / f"part-{len(self._parts()):05d}.parquet"
+        # renamed after writing so a crash never leaves a partial part
+        tmp_part = part.with_suffix(".tmp")
+        pq.write_table(pa.Table.from_pylist(rows, schema=self.schema()), tmp_part)
+        os.replace(tmp_part, part)
+
+
+def _chunks(items: list, chunk_size: int) -> Iterator[list]:
+    for idx in range(0, len(items), chunk_size):
+        yield items[idx : idx + chunk_size]
+
+
+def _result_row(item: GradingItem, prepared: dict) -> dict[str, Any]:
+    return {
+        "key": item.key,
+        **asdict(item),
+        "uthmani_text": prepared.get("uthmani"),
+        "reference_phonemes": prepared["ref"].phonemes if "ref" in prepared else None,
+        "predicted_phonemes": None,
+        "phonemes_mean_prob": None,
+        "num_errors": None,
+        "errors": None,
+        "error": prepared.get("error"),
+    }
+
+
+def grade(
+    items: list[GradingItem],
+    results: JsonlResults | ParquetResults,
+    model: Muaalem,
+    executor: ProcessPoolExecutor,
+    moshaf_profiles: dict[str, dict] | None = None,
+    chunk_size: int = 64,
+    max_padding_ratio: float = 0.2,
+    max_batch_seconds: float | None = None,
+) -> int:
+    """Grades the items that are not in `results` yet
+
+    While the model runs a chunk, the next chunk is decoded and the errors of
+    the previous chunk are explained in `executor`. An item that fails to
+    decode, transcribe or explain is written with its `error` so resuming does
+    not stop at it again.
+
+    Returns:
+        the number of graded items
+    """
+    moshaf_profiles = moshaf_profiles or {}
+    done = results.done_keys()
+    todo = [item for item in items if item.key not in done]
+    logging.info(f"{len(done)} items already graded, {len(todo)} to grade")
+
+    def submit_chunk(chunk: list[GradingItem]) -> list[Future]:
+        return [
+            executor.submit(
+                prepare_item,
+                item,
+                {
+                    **DEFAULT_MOSHAF.model_dump(),
+                    **moshaf_profiles.get(item.moshaf, {}),
+                },
+            )
+            for item in chunk
+        ]
+
+    def write_chunk(rows: list[dict], explanations: dict[int, Future]):
+        for idx, future in explanations.items():
+            try:
+                rows[idx]["errors"] = future.result()
+            except Exception as e:
+                # written with the error so a resume does not crash on it again
+                rows[idx]["error"] = repr(e)
+                continue
+            rows[idx]["num_errors"] = len(rows[idx]["errors"])
+        results.write(rows)
+
+    def run_model(prepared: list[dict]) -> list[Any]:
+        """Outputs of the model or the exception of every item"""
+        kwargs = dict(
+            sampling_rate=SAMPLING_RATE,
+            max_padding_ratio=max_padding_ratio,
+            max_batch_seconds=max_batch_seconds,
+        )
+        try:
+            waves = [p["wave"] for p in prepared]
+            return model(waves, [p["ref"] for p in prepared], **kwargs)
+        except Exception:
+            logging.exception("The model failed on a chunk, running its items alone")
+        outs = []
+        for p in prepared:
+            try:
+                outs.append(model([p["wave"]], [p["ref"]], **kwargs)[0])
+            except Exception as e:
+                outs.append(e)
+        return outs
+
+    chunks = list(_chunks(todo, chunk_size))
+    next_prepared = submit_chunk(chunks[0]) if chunks else []
+    pending_write = None
+    num_graded = 0
+    for chunk_idx, chunk in enumerate(chunks):
+        prepared = [future.result() for future in next_prepared]
+        if chunk_idx + 1 < len(chunks):
+            next_prepared = submit_chunk(chunks[chunk_idx + 1])
+
+        rows = [_result_row(item, p) for item, p in zip(chunk, prepared)]
+        valid = [idx for idx, p in enumerate(prepared) if "error" not in p]
+        outs = run_model([prepared[idx] for idx in valid]) if valid else []
+        explanations = {}
+        for idx, out in zip(valid, outs):
+            if isinstance(out, Exception):
+                rows[idx]["error"] = repr(out)
+                continue
+            rows[idx]["predicted_phonemes"] = out.phonemes.text
+            probs = torch.as_tensor(out.phonemes.probs, dtype=torch.float32)
+            rows[idx]["phonemes_mean_prob"] = (
+                probs.mean().item() if probs.numel() else None
+            )
+            explanations[idx] = executor.submit(
+                explain_item,
+                prepared[idx]["uthmani"],
+                prepared[idx]["ref"],
+                out.phonemes.text,
+            )
+
+        if pending_write is not None:
+            write_chunk(*pending_write)
+        pending_write = (rows, explanations)
+        num_graded += len(chunk)
+        logging.info(f"Graded {num_graded} / {len(todo)} items")
+
+    if pending_write is not None:
+        write_chunk(*pending_write)
+    return num_graded
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Grade many recitation recordings with the Muaalem model"
+    )
+    parser.add_argument(
+        "input",
+        help="A CSV or JSONL manifest or a directory of `SSSAAA*` named recordings",
+    )
+    parser.add_argument(
+        "output",
+        help="A `.jsonl` file or a directory of Parquet parts (any other path)",
+    )
+    parser.add_argument(
+        "--moshaf-profiles",
+        help="JSON file of profile name -> MoshafAttributes fields",
+    )
+    parser.add_argument("--model", default="obadx/muaalem-model-v3_2")
+    parser.add_argument(
+        "--device", default="cuda" if torch.cuda.is_available() else "cpu"
+    )
+    parser.add_argument(
+        "--dtype",
+        choices=["float32", "bfloat16", "float16"],
+        help="Defaults to float32 on the cpu and bfloat16 otherwise",
+    )
+    parser.add_argument(
+        "--num-workers",
+        type=int,
+        help="Processes decoding audio, phonetizing and explaining errors "
+        "(defaults to the cores left by `--torch-threads`)",
+    )
+    parser.add_argument(
+        "--torch-threads",
+        type=int,
+        help="Threads of the model on the cpu (defaults to half of the cores)",
+    )
+    parser.add_argument("--chunk-size", type=int, default=64)
+    parser.add_argument("--max-padding-ratio", type=float, default=0.2)
+    parser.add_argument("--max-batch-seconds", type=float, default=None)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if Path(args.input).is_dir():
+        items = scan_directory(args.input)
+    else:
+        items = read_manifest(args.input)
+    moshaf_profiles = {}
+    if args.moshaf_profiles:
+        with open(args.moshaf_profiles, encoding="utf-8") as f:
+            moshaf_profiles = json.load(f)
+    unknown = {item.moshaf for item in items} - set(moshaf_profiles) - {None}
+    if unknown:
+        parser.error(f"Unknown moshaf profiles: {sorted(unknown)}")
+
+    if args.output.endswith(".jsonl"):
+        results = JsonlResults(args.output)
+    else:
+        results = ParquetResults(args.output)
+
+    # the model and the workers run at the same time so they share the cores
+    num_cpus = os.cpu_count() or 1
+    torch_threads = args.torch_threads or max(num_cpus // 2, 1)
+    num_workers = args.num_workers or max(num_cpus - torch_threads, 1)
+
+    dtype = args.dtype or ("float32" if args.device == "cpu" else "bfloat16")
+    torch.set_num_threads(torch_threads)
+    model = Muaalem(args.model, device=args.device, dtype=getattr(torch, dtype))
+    with ProcessPoolExecutor(num_workers) as executor:
+        grade(
+            items,
+            results,
+            model,
+            executor,
+            moshaf_profiles=moshaf_profiles,
+            chunk_size=args.chunk_size,
+            max_padding_ratio=args.max_padding_ratio,
+            max_batch_seconds=args.max_batch_seconds,
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+from dataclasses import dataclass, field
+
+
+@dataclass
+class BucketStats:
+    """
+    Statistics of splitting a batch into length buckets:
+        bucket_sizes (list[int]): number of inputs in every bucket
+        bucket_max_lens (list[int]): the padded length (in samples) of every bucket
+        real_samples (int): total number of samples of the inputs
+        padded_samples (int): total number of samples after padding every bucket
+            to its longest input
+        unbucketed_padded_samples (int): total number of samples if the whole
+            batch was padded to the longest input
+    """
+
+    bucket_sizes: list[int] = field(default_factory=list)
+    bucket_max_lens: list[int] = field(default_factory=list)
+    real_samples: int = 0
+    padded_samples: int = 0
+    unbucketed_padded_samples: int = 0
+
+    @property
+    def num_buckets(self) -> int:
+        return len(self.bucket_sizes)
+
+    @property
+    def padding_ratio(self) -> float:
+        """Fraction of the computed samples that are padding"""
+        if self.padded_samples == 0:
+            return 0.0
+        return 1 - self.real_samples / self.padded_samples
+
+    @property
+    def unbucketed_padding_ratio(self) -> float:
+        """Fraction of padding if the batch was not bucketed"""
+        if self.unbucketed_padded_samples == 0:
+            return 0.0
+        return 1 - self.real_samples / self.unbucketed_padded_samples
+
+
+def bucket_by_length(
+    lengths: list[int],
+    max_padding_ratio: float = 0.2,
+    max_batch_samples: int | None = None,
+) -> tuple[list[list[int]], BucketStats]:
+    """Splits inputs into buckets of similar length
+
+    Inputs are sorted by length and greedily added to the current bucket as
+    long as padding the bucket to its longest input keeps the padding ratio
+    below `max_padding_ratio` and the padded bucket size below `max_batch_samples`.
+
+    Args:
+        lengths (list[int]): the length of every input
+        max_padding_ratio (float): maximum fraction of padding in a bucket (0.0-1.0)
+        max_batch_samples (int | None): maximum number of samples of a padded
+            bucket (`bucket_size * longest_length`). `None` means no limit. An input
+            longer than this limit is placed in its own bucket.
+
+    Returns:
+        tuple of:
+            list[list[int]]: indices of the inputs in every bucket
+            BucketStats: statistics to tune the bucketing parameters
+
+    Example:
+        >>> buckets, stats = bucket_by_length([16000, 480000, 17000, 15000])
+        >>> buckets
+        [[3, 0, 2], [1]]
+    """
+    if not (0.0 <= max_padding_ratio <= 1.0):
+        raise ValueError(
+            f"`max_padding_ratio` has to be between 0.0 and 1.0 got: `{max_padding_ratio}`"
+        )
+
+    sorted_indices = sorted(range(len(lengths)), key=lambda idx: lengths[idx])
+    buckets: list[list[int]] = []
+    bucket: list[int] = []
+    bucket_samples = 0
+    for idx in sorted_indices:
+        length = lengths[idx]
+        if bucket:
+            # inputs are sorted so `length` is the longest of the bucket
+            padded = length * (len(bucket) + 1)
+            real = bucket_samples + length
+            too_much_padding = padded > 0 and 1 - real / padded > max_padding_ratio
+            too_large = max_batch_samples is not None and padded > max_batch_samples
+            if too_much_padding or too_large:
+                buckets.append(bucket)
+                bucket = []
+                bucket_samples = 0
+        bucket.append(idx)
+        bucket_samples += length
+    if bucket:
+        buckets.append(bucket)
+
+    stats = BucketStats(
+        bucket_sizes=[len(b) for b in buckets],
+        bucket_max_lens=[lengths[b[-1]] for b in buckets],
+        real_samples=sum(lengths),
+        padded_samples=sum(lengths[b[-1]] * len(b) for b in buckets),
+        unbucketed_padded_samples=max(lengths, default=0) * len(lengths),
+    )
+    return buckets, stats
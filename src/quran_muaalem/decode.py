@@ -126,6 +126,97 @@ from .muaalem_typing import Unit
 #     return res_chars[::-1]
 
 
+# Alignment operations (the values of the original choice matrix)
+_SKIP_COLUMN = 1
+_SKIP_ROW = 2
+_DIAGONAL = 3
+
+
+def _as_list(seq: Sequence[Any] | torch.Tensor | NDArray) -> list[Any]:
+    if isinstance(seq, (torch.Tensor, np.ndarray)):
+        return seq.tolist()
+    return list(seq)
+
+
+def _match_masks(rows: list[Any], columns: list[Any]) -> list[int]:
+    """Bit mask for every row item with bit `j` set if it equals `columns[j]`"""
+    try:
+        item_to_mask = {}
+        for j, item in enumerate(columns):
+            item_to_mask[item] = item_to_mask.get(item, 0) | (1 << j)
+        return [item_to_mask.get(item, 0) for item in rows]
+    except TypeError:
+        # unhashable items
+        return [
+            sum(1 << j for j, col_item in enumerate(columns) if col_item == item)
+            for item in rows
+        ]
+
+
+def _alignment_ops(rows: list[Any], columns: list[Any]) -> list[int]:
+    """Backtracked operations of the alignment between `rows` and `columns`
+
+    The alignment minimizes the dynamic programming:
+        dp[0][j] = 0, dp[i][0] = i
+        dp[i][j] = min(
+            dp[i][j - 1],  # skipping a column item (free)
+            dp[i - 1][j] + 1,  # skipping a row item
+            dp[i - 1][j - 1] + (rows[i - 1] != columns[j - 1]),  # diagonal
+        )
+    As skipping a column is free and a mismatch costs as much as skipping a row
+    `dp[i][j] = i - LCS(rows[:i], columns[:j])`. So instead of filling the full
+    `(n + 1) x (m + 1)` matrix the rows of the LCS are computed with the
+    bit-parallel algorithm of Hyyrö (one big integer operation per row) and
+    `dp` values are recovered only for the cells on the backtracking path,
+    keeping the exact tie-breaking of the choice matrix:
+    diagonal first, then skipping a column, then skipping a row.
+
+    Returns:
+        list[int]: the operations from the end `(n, m)` to the start `(0, 0)`
+    """
+    n = len(rows)
+    m = len(columns)
+    full_mask = (1 << m) - 1
+
+    # bit `j` of `lcs_rows[i]` is zero if the LCS increases at column `j + 1`
+    lcs_rows = [full_mask]
+    v = full_mask
+    for match in _match_masks(rows, columns):
+        u = v & match
+        v = ((v + u) | (v - u)) & full_mask
+        lcs_rows.append(v)
+
+    def dp(i: int, j: int) -> int:
+        return i - j + (lcs_rows[i] & ((1 << j) - 1)).bit_count()
+
+    ops = []
+    i = n
+    j = m
+    while i > 0 or j > 0:
+        if i > 0 and j > 0:
+            option1 = dp(i, j - 1)
+            option2 = dp(i - 1, j) + 1
+            cost = 0 if rows[i - 1] == columns[j - 1] else 1
+            option3 = dp(i - 1, j - 1) + cost
+            if option3 <= option1 and option3 <= option2:
+                ops.append(_DIAGONAL)
+                i -= 1
+                j -= 1
+            elif option1 <= option2:
+                ops.append(_SKIP_COLUMN)
+                j -= 1
+            else:
+                ops.append(_SKIP_ROW)
+                i -= 1
+        elif i > 0:
+            ops.append(_SKIP_ROW)
+            i -= 1
+        else:
+            ops.append(_SKIP_COLUMN)
+            j -= 1
+    return ops
+
+
 def align_chunked_phonemes_sequence(
     ref: list[list[str]],
     predicted: list[list[str]],
@@ -155,65 +246,16 @@ def align_chunked_phonemes_sequence(
 
     """
 
-    n = len(predicted)
-    m = len(ref)
-
     if len(predicted) == len(ref):
         return [True] * len(predicted)
 
-    if m == 0:
+    if len(ref) == 0:
         raise ValueError("`ref` length must not be zero length")
 
-    dp = [[0] * (m + 1) for _ in range(n + 1)]
-    choice = [[0] * (m + 1) for _ in range(n + 1)]
-
-    for j in range(m + 1):
-        dp[0][j] = 0
-
-    for i in range(1, n + 1):
-        dp[i][0] = i
-
-    for i in range(1, n + 1):
-        for j in range(1, m + 1):
-            option1 = dp[i][j - 1]
-            option2 = dp[i - 1][j] + 1
-            cost = 0 if predicted[i - 1][0] == ref[j - 1][0] else 1
-            option3 = dp[i - 1][j - 1] + cost
-
-            if option3 <= option1 and option3 <= option2:
-                dp[i][j] = option3
-                choice[i][j] = 3
-            elif option1 <= option2:
-                dp[i][j] = option1
-                choice[i][j] = 1
-            else:
-                dp[i][j] = option2
-                choice[i][j] = 2
-
-    i = n
-    j = m
-    mask = []
-    # res_chars = []
-    while i > 0 or j > 0:
-        if i > 0 and j > 0:
-            if choice[i][j] == 3:
-                # res_chars.append(ref[j - 1])
-                mask.append(True)
-                i -= 1
-                j -= 1
-            elif choice[i][j] == 2:
-                # res_chars.append(missing_placeholder)
-                i -= 1
-            else:
-                j -= 1
-                mask.append(False)
-        elif i > 0:
-            # res_chars.append(missing_placeholder)
-            i -= 1
-        else:
-            j -= 1
-            mask.append(False)
+    # phonemes groups are compared by their first phoneme
+    ops = _alignment_ops([p[0] for p in predicted], [r[0] for r in ref])
 
+    mask = [op == _DIAGONAL for op in ops if op != _SKIP_ROW]
     return mask[::-1]
 
 
@@ -245,57 +287,23 @@ def align_predicted_sequence(
         return predicted, [True] * len(ref)
 
     if m == 0:
-        return [missing_placeholder] * n
-
-    dp = [[0] * (m + 1) for _ in range(n + 1)]
-    choice = [[0] * (m + 1) for _ in range(n + 1)]
-
-    for j in range(m + 1):
-        dp[0][j] = 0
+        return [missing_placeholder] * n, []
 
-    for i in range(1, n + 1):
-        dp[i][0] = i
+    ops = _alignment_ops(_as_list(ref), _as_list(predicted))
 
-    for i in range(1, n + 1):
-        for j in range(1, m + 1):
-            option1 = dp[i][j - 1]
-            option2 = dp[i - 1][j] + 1
-            cost = 0 if ref[i - 1] == predicted[j - 1] else 1
-            option3 = dp[i - 1][j - 1] + cost
-
-            if option3 <= option1 and option3 <= option2:
-                dp[i][j] = option3
-                choice[i][j] = 3
-            elif option1 <= option2:
-                dp[i][j] = option1
-                choice[i][j] = 1
-            else:
-                dp[i][j] = option2
-                choice[i][j] = 2
-
-    i = n
     j = m
     mask = []
     res_chars = []
-    while i > 0 or j > 0:
-        if i > 0 and j > 0:
-            if choice[i][j] == 3:
-                res_chars.append(predicted[j - 1])
-                mask.append(True)
-                i -= 1
-                j -= 1
-            elif choice[i][j] == 2:
-                res_chars.append(missing_placeholder)
-                i -= 1
-            else:
-                j -= 1
-                mask.append(False)
-        elif i > 0:
+    for op in ops:
+        if op == _DIAGONAL:
+            res_chars.append(predicted[j - 1])
+            mask.append(True)
+            j -= 1
+        elif op == _SKIP_ROW:
             res_chars.append(missing_placeholder)
-            i -= 1
         else:
-            j -= 1
             mask.append(False)
+            j -= 1
 
     return res_chars[::-1], mask[::-1]
 
@@ -310,76 +318,83 @@ class CTCDecodeOut:
     p: torch.FloatTensor
 
 
-# BUG: trailing zero id at the end
 def ctc_decode(
     batch_ids: torch.LongTensor,
     batch_probs: torch.FloatTensor,
     blank_id=PAD_TOKEN_IDX,
     collapse_consecutive=True,
 ) -> list[CTCDecodeOut]:
-    """
-    batch_ids (torch.LongTensor): batch on integer ids of shape: batch, sequecne_len
-    batch_probs (torch.LongTensor): batch on float32 ids of shape: batch, sequecne_len
+    """Greedy CTC decoding for a whole batch at once
 
-    Return:
-        list[tuple[list[int], float]]]:
+    Consecutive repeated ids are collapsed into a single token whose
+    probability is the mean of the frames probabilities of that run, then
+    runs of `blank_id` are dropped. The run boundaries and the per run sums
+    are computed for the whole batch in a single vectorized pass.
 
+    Args:
+        batch_ids (torch.LongTensor): batch on integer ids of shape: batch, sequecne_len
+        batch_probs (torch.FloatTensor): batch on float32 probs of shape: batch, sequecne_len
+        blank_id (int): the CTC blank token id
+        collapse_consecutive (bool): if `False` only the blank frames are removed
 
+    Return:
+        list[CTCDecodeOut]: one output for every sequence in the batch
     """
-    outs = []
+    batch_ids = torch.as_tensor(batch_ids)
+    batch_probs = torch.as_tensor(batch_probs)
     assert batch_ids.shape == batch_probs.shape, (
         f"Input Shape mismatch: `batch_ids.shape={batch_ids.shape}`, batch_probs.shape={batch_probs.shape}"
     )
-    for seq_idx, seq in enumerate(batch_ids):
-        if collapse_consecutive:
-            tokens = []
-            probs = []
-            start = 0
-            end = 0
-            if len(seq) == 1 and seq[0] != blank_id:
-                tokens.append(seq[0])
-                probs.append(batch_probs[seq_idx][0])
-
-            for idx in range(len(seq) - 1):
-                curr = seq[idx]
-                next = seq[idx + 1]
-                # Last Item
-                if idx == len(seq) - 2 and curr != blank_id:
-                    if curr == next:
-                        end = idx + 2
-                        tokens.append(curr)
-                        probs.append(
-                            batch_probs[seq_idx][start:end].sum() / (end - start)
-                        )
-                    elif curr != next:
-                        end = idx + 1
-                        tokens.append(curr)
-                        probs.append(
-                            batch_probs[seq_idx][start:end].sum() / (end - start)
-                        )
-                        tokens.append(next)
-                        probs.append(batch_probs[seq_idx][idx + 1])
-                # Normal Case
-                elif curr != next and curr != blank_id:
-                    end = idx + 1
-                    tokens.append(curr)
-                    probs.append(batch_probs[seq_idx][start:end].sum() / (end - start))
-                    start = end
-                elif curr == blank_id:
-                    start = idx + 1
-
+    batch_ids = batch_ids.to(device="cpu", dtype=torch.long)
+    batch_probs = batch_probs.to(device="cpu", dtype=torch.float32)
+    batch_size, seq_len = batch_ids.shape
+
+    if not collapse_consecutive:
+        outs = []
+        for seq_idx in range(batch_size):
+            mask = batch_ids[seq_idx] != blank_id
             outs.append(
                 CTCDecodeOut(
-                    ids=torch.LongTensor(tokens),
-                    p=torch.FloatTensor(probs),
+                    ids=batch_ids[seq_idx][mask],
+                    p=batch_probs[seq_idx][mask],
                 )
             )
-        else:
-            mask = seq != blank_id
-            tokens = seq[mask]
-            probs = batch_probs[seq_idx][mask]
-            outs.append(CTCDecodeOut(ids=tokens, p=probs))
-    return outs
+        return outs
+
+    if batch_size == 0:
+        return []
+    if seq_len == 0:
+        return [
+            CTCDecodeOut(ids=torch.LongTensor([]), p=torch.FloatTensor([]))
+            for _ in range(batch_size)
+        ]
+
+    # A new run starts at the first frame of every sequence and whenever the
+    # id differs from the previous frame
+    run_starts = torch.ones_like(batch_ids, dtype=torch.bool)
+    run_starts[:, 1:] = batch_ids[:, 1:] != batch_ids[:, :-1]
+    run_starts = run_starts.flatten()
+
+    frame_to_run = torch.cumsum(run_starts, dim=0) - 1
+    num_runs = int(frame_to_run[-1]) + 1
+    run_sums = torch.zeros(num_runs, dtype=torch.float32).index_add_(
+        0, frame_to_run, batch_probs.flatten()
+    )
+    run_lens = torch.bincount(frame_to_run, minlength=num_runs)
+    run_ids = batch_ids.flatten()[run_starts]
+    run_seq_idx = torch.nonzero(run_starts).squeeze(-1) // seq_len
+
+    keep = run_ids != blank_id
+    run_ids = run_ids[keep]
+    run_probs = run_sums[keep] / run_lens[keep]
+    seq_lens = torch.bincount(run_seq_idx[keep], minlength=batch_size).tolist()
+
+    return [
+        CTCDecodeOut(ids=ids, p=p)
+        for ids, p in zip(
+            torch.split(run_ids, seq_lens), torch.split(run_probs, seq_lens)
+        )
+    ]
 
 
 # def multilevel_greedy_decode(
@@ -433,6 +448,109 @@ def ctc_decode(
 #     return level_to_units
 
 
+def multilevel_ctc_decode(
+    level_to_ids: dict[str, torch.LongTensor],
+    level_to_probs: dict[str, torch.FloatTensor],
+    blank_id=PAD_TOKEN_IDX,
+) -> dict[str, list[CTCDecodeOut]]:
+    """CTC decodes all levels in a single vectorized pass
+
+    The greedy ids and their probabilities of every level are stacked into a
+    single tensor of shape: levels, batch, seq_len so the whole batch of every
+    level is collapsed by one `ctc_decode` call.
+
+    Args:
+        level_to_ids (dict[str, torch.LongTensor]): the argmax ids of every level
+            of shape: batch, seq_len
+        level_to_probs (dict[str, torch.FloatTensor]): the probability of the argmax
+            ids of every level of shape: batch, seq_len
+
+    Returns:
+        dict[str, list[CTCDecodeOut]]: the decoded outputs of every level
+    """
+    levels = list(level_to_ids)
+    if not levels:
+        return {}
+    stacked_ids = torch.stack([level_to_ids[level] for level in levels])
+    stacked_probs = torch.stack([level_to_probs[level] for level in levels])
+    num_levels, batch_size, seq_len = stacked_ids.shape
+
+    decode_outs = ctc_decode(
+        stacked_ids.reshape(num_levels * batch_size, seq_len),
+        stacked_probs.reshape(num_levels * batch_size, seq_len),
+        blank_id=blank_id,
+        collapse_consecutive=True,
+    )
+    return {
+        level: decode_outs[level_idx * batch_size : (level_idx + 1) * batch_size]
+        for level_idx, level in enumerate(levels)
+    }
+
+
+def greedy_ids_and_probs(
+    level_to_probs: dict[str, torch.FloatTensor],
+) -> tuple[dict[str, torch.LongTensor], dict[str, torch.FloatTensor]]:
+    """Gets the argmax ids and their probabilities for every level
+
+    Args:
+        level_to_probs (dict[str, torch.FloatTensor]): every level of shape:
+            batch, seq_len, num_classes
+
+    Returns:
+        tuple of (level_to_ids, level_to_probs) each of shape: batch, seq_len
+    """
+    level_to_ids = {}
+    level_to_max_probs = {}
+    for level, probs in level_to_probs.items():
+        level_to_max_probs[level], level_to_ids[level] = probs.max(dim=-1)
+    return level_to_ids, level_to_max_probs
+
+
+def greedy_ids_and_probs_from_logits(
+    level_to_logits: dict[str, torch.FloatTensor],
+) -> tuple[dict[str, torch.LongTensor], dict[str, torch.FloatTensor]]:
+    """Gets the argmax ids and their probabilities directly from the logits
+
+    The softmax over the full vocabulary is not needed: the probability of the
+    argmax id is `exp(max_logit - logsumexp(logits))`. Everything is computed
+    on the logits device and only two tensors of shape: batch, seq_len per level
+    are moved to the cpu.
+
+    Args:
+        level_to_logits (dict[str, torch.FloatTensor]): every level of shape:
+            batch, seq_len, num_classes
+
+    Returns:
+        tuple of (level_to_ids, level_to_probs) each of shape: batch, seq_len
+            on the cpu with `torch.long` and `torch.float32` dtypes
+    """
+    level_to_ids = {}
+    level_to_max_probs = {}
+    for level, logits in level_to_logits.items():
+        max_logits, ids = logits.max(dim=-1)
+        max_probs = torch.exp(
+            max_logits.to(torch.float32)
+            - torch.logsumexp(logits.to(torch.float32), dim=-1)
+        )
+        level_to_ids[level] = ids.cpu()
+        level_to_max_probs[level] = max_probs.cpu()
+    return level_to_ids, level_to_max_probs
+
+
+def decode_outs_to_units(
+    decode_outs: list[CTCDecodeOut],
+    id_to_vocab: dict[int, str],
+) -> list[Unit]:
+    return [
+        Unit(
+            text="".join(id_to_vocab[idx] for idx in decode_out.ids.tolist()),
+            probs=decode_out.p,
+            ids=decode_out.ids,
+        )
+        for decode_out in decode_outs
+    ]
+
+
 def phonemes_level_greedy_decode(
     probs: torch.FloatTensor,
     phonemes_level_vocab: dict[int, str],
@@ -444,27 +562,13 @@ def phonemes_level_greedy_decode(
         phonmes_level_vocab (dict[int, str]): mapping ids of phonemes to the
             acutial string represnetation
     """
-    batch_probs, batch_ids = probs.topk(1, dim=-1)
-    decode_outs = ctc_decode(
-        batch_ids.squeeze(-1), batch_probs.squeeze(-1), collapse_consecutive=True
-    )
-    units = []
-    for seq_idx, decode_out in enumerate(decode_outs):
-        text = ""
-        for idx in decode_out.ids:
-            text += phonemes_level_vocab[int(idx)]
-        units.append(
-            Unit(
-                text=text,
-                probs=decode_out.p,
-                ids=decode_out.ids,
-            ),
-        )
-    return units
+    batch_probs, batch_ids = probs.max(dim=-1)
+    decode_outs = ctc_decode(batch_ids, batch_probs, collapse_consecutive=True)
+    return decode_outs_to_units(decode_outs, phonemes_level_vocab)
 
 
 def multilevel_greedy_decode(
-    level_to_probs: dict[str, torch.FloatTensor],
+    level_to_probs: dict[str, torch.FloatTensor] | None,
     level_to_id_to_vocab: dict[str, dict[int, str]],
     level_to_ref_ids: dict[str, torch.LongTensor],
     chunked_phonemes_batch: list[list[str]],
@@ -472,24 +576,36 @@ def multilevel_greedy_decode(
     phonemes_units: list[Unit],
     missing_placeholder=-100,
     pad_idx=PAD_TOKEN_IDX,
+    level_to_decode_outs: dict[str, list[CTCDecodeOut]] | None = None,
 ) -> dict[str, list[Unit]]:
+    """Decodes the sifat levels and aligns them to the predicted phonemes
+
+    Args:
+        level_to_probs (dict[str, torch.FloatTensor] | None): probs of every level
+            of shape: batch, seq_len, num_classes. Could be `None` if
+            `level_to_decode_outs` is given
+        level_to_decode_outs (dict[str, list[CTCDecodeOut]] | None): already CTC
+            decoded levels (see `multilevel_ctc_decode`) to avoid decoding again
+    """
+    if level_to_decode_outs is None:
+        level_to_ids, level_to_max_probs = greedy_ids_and_probs(
+            {
+                level: probs
+                for level, probs in level_to_probs.items()
+                if level != "phonemes"
+            }
+        )
+        level_to_decode_outs = multilevel_ctc_decode(level_to_ids, level_to_max_probs)
+
+    # The phonemes mask depends only on the sequence not on the level
+    seq_to_phonemes_mask: dict[int, torch.BoolTensor] = {}
+
     level_to_units = {}
-    for level in level_to_probs:
+    for level, decode_outs in level_to_decode_outs.items():
         if level == "phonemes":
             continue
-        batch_probs, batch_ids = level_to_probs[level].topk(1, dim=-1)
-        decode_outs = ctc_decode(
-            batch_ids.squeeze(-1), batch_probs.squeeze(-1), collapse_consecutive=True
-        )
         level_to_units[level] = []
         for seq_idx, decode_out in enumerate(decode_outs):
-            # Trying to align Ids of the sifat levels
-            phonemes_mask = align_chunked_phonemes_sequence(
-                ref=ref_chuncked_phonemes_batch[seq_idx],
-                predicted=chunked_phonemes_batch[seq_idx],
-            )
-            phonemes_mask = torch.BoolTensor(phonemes_mask)
-
             # NOTE:
             # We want to align every level with predited phonme, but
             # in some cases the length of every sifa level is > or < the
@@ -502,6 +618,16 @@ def multilevel_greedy_decode(
                 <= len(ref_chuncked_phonemes_batch[seq_idx])
             ):
                 logging.info(f"Sequence: `{seq_idx}` has mismatch Level: {level}")
+                # Trying to align Ids of the sifat levels
+                if seq_idx not in seq_to_phonemes_mask:
+                    seq_to_phonemes_mask[seq_idx] = torch.BoolTensor(
+                        align_chunked_phonemes_sequence(
+                            ref=ref_chuncked_phonemes_batch[seq_idx],
+                            predicted=chunked_phonemes_batch[seq_idx],
+                        )
+                    )
+                phonemes_mask = seq_to_phonemes_mask[seq_idx]
+
                 # 1. Align sifa level to the reference sifa level
                 ref_aligned_ids, mask = align_predicted_sequence(
                     level_to_ref_ids[level][seq_idx],
@@ -527,12 +653,12 @@ def multilevel_greedy_decode(
                 aligned_ids = decode_out.ids
                 probs = decode_out.p
 
-            text = ""
-            for idx in aligned_ids:
-                text += level_to_id_to_vocab[level][int(idx)]
             level_to_units[level].append(
                 Unit(
-                    text=text,
+                    text="".join(
+                        level_to_id_to_vocab[level][idx]
+                        for idx in aligned_ids.tolist()
+                    ),
                     probs=probs,
                     ids=aligned_ids,
                 ),
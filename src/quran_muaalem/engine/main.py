@@ -2,6 +2,7 @@ import litserve as ls
 
 from .serve import QuranMuaalemAPI
 from .settings import EngineSettings
+from .wire import MsgpackNegotiationMiddleware
 
 
 def main():
@@ -12,6 +13,15 @@ def main():
         model_name_or_path=engine_settings.model_name_or_path,
         dtype=engine_settings.torch_dtype,
         max_audio_seconds=engine_settings.max_audio_seconds,
+        padding_buckets_seconds=engine_settings.padding_buckets_seconds,
+        decode_workers=engine_settings.decode_workers,
+        decode_pool=engine_settings.decode_pool,
+        audio_cache_size=engine_settings.audio_cache_size,
+        audio_cache_dir=engine_settings.audio_cache_dir,
+        audio_cache_max_disk_bytes=engine_settings.audio_cache_max_disk_bytes,
+        resampler=engine_settings.resampler,
+        vad=engine_settings.vad_config,
+        features_on_accelerator=engine_settings.features_on_accelerator,
         max_batch_size=engine_settings.max_batch_size,
         batch_timeout=engine_settings.batch_timeout,
     )
@@ -23,6 +33,7 @@ def main():
         devices=engine_settings.devices,
         timeout=engine_settings.timeout,
         workers_per_device=engine_settings.workers_per_device,
+        middlewares=[MsgpackNegotiationMiddleware],
     )
 
     # Run the server
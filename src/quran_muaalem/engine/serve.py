@@ -1,39 +1,127 @@
-import io
 import time
-from typing import Annotated
+from bisect import bisect_left
+from dataclasses import asdict
+from functools import partial
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Annotated, Literal
 
-import librosa
 import torch
 import litserve as ls
 from transformers import AutoFeatureExtractor
 import numpy as np
-from fastapi import File, UploadFile
+from numpy.typing import NDArray
+from fastapi import File, Response, UploadFile
+from fastapi.responses import JSONResponse
+from quran_transcript import chunck_phonemes
 
+from ..audio_cache import AudioCache
+from ..audio_decode import decode_audio
 from ..modeling.modeling_multi_level_ctc import Wav2Vec2BertForMultilevelCTC
 from ..modeling.multi_level_tokenizer import MultiLevelTokenizer
+from ..features import batch_fbank_features
+from ..decode import (
+    decode_outs_to_units,
+    greedy_ids_and_probs_from_logits,
+    multilevel_ctc_decode,
+)
+from ..inference import format_sifat
+from ..vad import VadConfig, detect_speech
+from .wire import MSGPACK_MEDIA_TYPE, pack_prediction
 
 
-def simple_ctc_decode(
-    batch_arr: list[list[int]], blank_id=0, collapse_consecutive=True
-) -> list[list[int]]:
-    decoded_list = []
-    for seq in batch_arr:
-        if collapse_consecutive:
-            tokens = []
-            prev = blank_id
-            for current in seq:
-                if current == blank_id:
-                    prev = blank_id
-                    continue
-                if current == prev:
-                    continue
-                tokens.append(current)
-                prev = current
-            decoded_list.append(tokens)
-        else:
-            tokens = seq[seq != blank_id]
-            decoded_list.append(tokens)
-    return decoded_list
+# Length of a single fbank window
+MIN_AUDIO_SAMPLES = 400
+
+
+def count_features(samples: int | float, sampling_rate=16000) -> int:
+    """Number of the model input frames of a wave (the processor stacks every 2 fbank frames)"""
+    return int(np.ceil((samples - 400) / (160 * 2)))
+
+
+def padded_length(length: int, bucket_lengths: list[int]) -> int:
+    """Rounds `length` up to the smallest bucket length that fits it
+
+    Args:
+        length (int): the longest input of the batch
+        bucket_lengths (list[int]): sorted bucket lengths. An empty list or a
+            `length` longer than the last bucket returns `length` unchanged.
+    """
+    pos = bisect_left(bucket_lengths, length)
+    if pos == len(bucket_lengths):
+        return length
+    return bucket_lengths[pos]
+
+
+def load_audio(
+    audio_bytes: bytes,
+    sampling_rate: int,
+    max_audio_seconds: float,
+    resampler: Literal["fast", "quality"] = "quality",
+    vad: VadConfig | None = None,
+) -> NDArray:
+    """Decodes an audio file into a mono wave resampled to `sampling_rate`
+
+    The silence is trimmed if `vad` is given. A module level function so it can
+    run in a process pool.
+    """
+    # Truncating input speech to max_audio_seconds
+    wave = decode_audio(audio_bytes, sampling_rate, max_audio_seconds, resampler)
+    if vad is not None:
+        wave = detect_speech(wave, sampling_rate, vad).apply(wave)
+    return wave
+
+
+def decode_batch(
+    level_to_ids: dict[str, torch.LongTensor],
+    level_to_max_probs: dict[str, torch.FloatTensor],
+    out_lengths: torch.LongTensor,
+    multi_level_tokenizer: MultiLevelTokenizer,
+) -> list[dict]:
+    """Decodes all levels of a padded batch as `Muaalem.__call__` (without a reference)
+
+    Args:
+        level_to_ids: level -> greedy ids of shape [batch, frames]
+        level_to_max_probs: level -> the probabilities of the greedy ids
+        out_lengths (torch.LongTensor): the true number of frames of every input
+        multi_level_tokenizer (MultiLevelTokenizer): the model tokenizer
+
+    Returns:
+        list of dicts (one for every input) of:
+            phonemes (str): the predicted phonemes
+            phonemes_probs (list[float]): the probability of every phoneme
+            sifat (list[dict]): `Sifa` of every phonemes group as a dict
+    """
+    # padded frames are set to blank so they are dropped by the ctc decoding
+    num_frames = level_to_ids["phonemes"].shape[1]
+    padding = torch.arange(num_frames)[None, :] >= out_lengths[:, None]
+    level_to_ids = {
+        level: ids.masked_fill(padding, 0) for level, ids in level_to_ids.items()
+    }
+
+    level_to_decode_outs = multilevel_ctc_decode(level_to_ids, level_to_max_probs)
+    level_to_units = {
+        level: decode_outs_to_units(
+            decode_outs, multi_level_tokenizer.id_to_vocab[level]
+        )
+        for level, decode_outs in level_to_decode_outs.items()
+    }
+    chunked_phonemes_batch = [
+        chunck_phonemes(unit.text) for unit in level_to_units["phonemes"]
+    ]
+    sifat_batch = format_sifat(
+        level_to_units, chunked_phonemes_batch, multi_level_tokenizer
+    )
+
+    outs = []
+    for phonemes_unit, sifat in zip(level_to_units["phonemes"], sifat_batch):
+        outs.append(
+            {
+                "phonemes": phonemes_unit.text,
+                "phonemes_probs": phonemes_unit.probs.tolist(),
+                "sifat": [asdict(sifa) for sifa in sifat],
+            }
+        )
+    return outs
 
 
 class QuranMuaalemAPI(ls.LitAPI):
@@ -42,6 +130,15 @@ class QuranMuaalemAPI(ls.LitAPI):
         model_name_or_path: str = "obadx/muaalem-model-v3_2",
         dtype: torch.dtype = torch.bfloat16,
         max_audio_seconds: float = 15,
+        padding_buckets_seconds: list[float] | None = None,
+        decode_workers: int = 4,
+        decode_pool: Literal["thread", "process"] = "thread",
+        audio_cache_size: int = 128,
+        audio_cache_dir: str | None = None,
+        audio_cache_max_disk_bytes: int | None = None,
+        resampler: Literal["fast", "quality"] = "quality",
+        vad: VadConfig | None = None,
+        features_on_accelerator: bool = False,
         *args,
         **kwargs,
     ):
@@ -50,9 +147,23 @@ class QuranMuaalemAPI(ls.LitAPI):
         self.dtype = dtype
         self.max_audio_seconds = max_audio_seconds
         self.sampling_rate = 16000
-        self.max_features = int(
-            np.ceil((self.sampling_rate * self.max_audio_seconds - 400) / (160 * 2))
+        self.max_features = count_features(
+            self.sampling_rate * self.max_audio_seconds, self.sampling_rate
+        )
+        # Batches are padded to the longest input rounded up to these lengths
+        # to limit the number of input shapes
+        self.padding_buckets = sorted(
+            min(count_features(self.sampling_rate * s), self.max_features)
+            for s in (padding_buckets_seconds or [])
         )
+        self.decode_workers = decode_workers
+        self.decode_pool_type = decode_pool
+        self.audio_cache_size = audio_cache_size
+        self.audio_cache_dir = audio_cache_dir
+        self.audio_cache_max_disk_bytes = audio_cache_max_disk_bytes
+        self.resampler = resampler
+        self.vad = vad
+        self.features_on_accelerator = features_on_accelerator
         self.multi_level_tokenizer = MultiLevelTokenizer(self.model_name_or_path)
 
     def setup(self, device):
@@ -64,82 +175,110 @@ class QuranMuaalemAPI(ls.LitAPI):
         self.model.to(device, dtype=self.dtype)
         self.model.eval()
 
-    def decode_request(self, request: Annotated[UploadFile, File()]):
+        # The audio files of a collected batch are decoded concurrently
+        if self.decode_pool_type == "process":
+            self.decode_pool = ProcessPoolExecutor(max_workers=self.decode_workers)
+        else:
+            self.decode_pool = ThreadPoolExecutor(max_workers=self.decode_workers)
+        # Re-submitted recordings (e.g. with other moshaf settings) skip decoding
+        self.audio_cache = AudioCache(
+            max_size=self.audio_cache_size,
+            directory=self.audio_cache_dir,
+            max_disk_bytes=self.audio_cache_max_disk_bytes,
+            options=repr((self.resampler, self.vad)),
+        )
+        self.features_device = device if self.features_on_accelerator else "cpu"
+
+    def decode_request(self, request: Annotated[UploadFile, File()]) -> Future:
         # audio_bytes = request  # directly use the bytes
         audio_bytes = request.file.read()
-
-        audio_array, sr = librosa.load(
-            io.BytesIO(audio_bytes),
-            sr=self.sampling_rate,
-            mono=True,
-            duration=self.max_audio_seconds,  # Truncating input speech to max_audio_seconds
+        return self.audio_cache.submit(
+            self.decode_pool,
+            audio_bytes,
+            partial(load_audio, resampler=self.resampler, vad=self.vad),
+            self.sampling_rate,
+            self.max_audio_seconds,
         )
 
-        features = self.processor(
-            audio_array,
-            sampling_rate=sr,
-            return_tensors="pt",
-            padding="max_length",
-            max_length=self.max_features,
+    def batch(self, inputs: list[Future]):
+        waves = []
+        errors: list[Exception | None] = []
+        for inp in inputs:
+            try:
+                wave = inp.result()
+                if len(wave) < MIN_AUDIO_SAMPLES:
+                    # gives no feature frames
+                    raise ValueError(
+                        f"The audio is too short: {len(wave)} samples at "
+                        f"{self.sampling_rate} Hz, at least {MIN_AUDIO_SAMPLES} needed"
+                    )
+                waves.append(wave)
+                errors.append(None)
+            except Exception as e:
+                # reported for this request only in `encode_response`
+                errors.append(e)
+
+        # Features of the whole batch at once padded to the longest input
+        features = batch_fbank_features(
+            waves, self.processor, device=self.features_device
         )
+        input_features = features["input_features"]
+        attention_mask = features["attention_mask"]
+        lengths = attention_mask.sum(-1).cpu()
 
-        return {
-            "input_features": features["input_features"],
-            "attention_mask": features["attention_mask"],
-        }
+        max_len = padded_length(input_features.shape[1], self.padding_buckets)
+        if max_len > input_features.shape[1]:
+            pad = max_len - input_features.shape[1]
+            input_features = torch.nn.functional.pad(input_features, (0, 0, 0, pad))
+            attention_mask = torch.nn.functional.pad(attention_mask, (0, pad))
 
-    def batch(self, inputs):
-        input_features = torch.cat([inp["input_features"] for inp in inputs]).to(
-            self.device, dtype=self.dtype
-        )
-        attention_mask = torch.cat([inp["attention_mask"] for inp in inputs]).to(
-            self.device, dtype=self.dtype
+        return (
+            input_features.to(self.device, dtype=self.dtype),
+            attention_mask.to(self.device, dtype=self.dtype),
+            lengths,
+            errors,
         )
-        return (input_features, attention_mask)
 
     def predict(self, x):
-        input_features, attention_mask = x
+        input_features, attention_mask, lengths, errors = x
+        if len(lengths) == 0:
+            return [], errors
         with torch.inference_mode():
             level_to_logits = self.model(
                 input_features, attention_mask, return_dict=False
             )[0]
+            # Only the greedy ids and their probabilities leave the device
+            level_to_ids, level_to_max_probs = greedy_ids_and_probs_from_logits(
+                level_to_logits
+            )
 
-        list_of_level_to_logits = []
-        for idx in range(level_to_logits["phonemes"].shape[0]):
-            d = {}
-            for level in level_to_logits:
-                d[level] = (
-                    level_to_logits[level][idx]
-                    .cpu()
-                    .to(dtype=torch.float32)
-                    .unsqueeze(0)
-                )
-            list_of_level_to_logits.append(d)
-
-        return list_of_level_to_logits
+        # the true number of output frames of every input
+        out_lengths = self.model._get_feat_extract_output_lengths(lengths)
+        return (
+            decode_batch(
+                level_to_ids,
+                level_to_max_probs,
+                out_lengths,
+                self.multi_level_tokenizer,
+            ),
+            errors,
+        )
 
     def unbatch(self, outputs):
-        return outputs
+        decoded_outs, errors = outputs
+        decoded_outs = iter(decoded_outs)
+        return [next(decoded_outs) if error is None else error for error in errors]
 
     def encode_response(self, output):
-        level_to_logits = output
-
-        level_to_probs = {}
-        for level, logits in level_to_logits.items():
-            probs = torch.nn.functional.softmax(logits, dim=-1)
-            level_to_probs[level] = probs
-
-        phonemes_probs = level_to_probs["phonemes"]
-        batch_probs, batch_ids = phonemes_probs.topk(1, dim=-1)
-
-        ph_decoded_ids = simple_ctc_decode(batch_ids)
-
-        # TODO: make it more abstract in  a function
-        phonemes_level = ""
-        for idx in ph_decoded_ids[0]:
-            if idx != 0:
-                phonemes_level += self.multi_level_tokenizer.id_to_vocab["phonemes"][
-                    int(idx)
-                ]
-
-        return {"phonemes": phonemes_level}
+        if isinstance(output, Exception):
+            # Not raised: LitServe sends an `HTTPException` raised for one
+            # response to every request of the batch
+            return JSONResponse(
+                status_code=400,
+                content={"detail": f"Could not decode the audio file: {output}"},
+            )
+        # converted to JSON by `MsgpackNegotiationMiddleware` for clients
+        # that do not accept msgpack
+        return Response(
+            content=pack_prediction(output), media_type=MSGPACK_MEDIA_TYPE
+        )
@@ -3,6 +3,8 @@ from pydantic import Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
 import torch
 
+from ..vad import VadConfig
+
 
 class EngineSettings(BaseSettings):
     """Configuration settings for the Quran Muaalem model server."""
@@ -21,6 +23,66 @@ class EngineSettings(BaseSettings):
         description="Maximum Input audio in seconds",
         gt=1.0,
     )
+    padding_buckets_seconds: list[float] = Field(
+        default=[],
+        description=(
+            "Every batch is padded to its longest input rounded up to the smallest of "
+            "these lengths (in seconds) to limit the number of input shapes. "
+            "Empty means padding to the longest input only."
+        ),
+    )
+
+    # Preprocessing configuration
+    decode_workers: int = Field(
+        default=4,
+        description="Number of workers decoding and resampling the uploaded audio files concurrently.",
+        ge=1,
+    )
+    decode_pool: Literal["thread", "process"] = Field(
+        default="thread",
+        description="Pool type of the audio decoding workers (thread or process).",
+    )
+    resampler: Literal["fast", "quality"] = Field(
+        default="quality",
+        description="Resampler of uploads that are not at 16 kHz: `fast` (soxr low quality) or `quality` (soxr high quality as librosa).",
+    )
+    vad: bool = Field(
+        default=False,
+        description="Trim the leading and trailing silence of every upload with an energy voice activity detection before the model.",
+    )
+    vad_top_db: float = Field(
+        default=40.0,
+        description="Frames quieter than the loudest frame of the upload by more than this (in dB) are silence.",
+        gt=0.0,
+    )
+    vad_padding_seconds: float = Field(
+        default=0.2,
+        description="Seconds of audio kept before and after the speech.",
+        ge=0.0,
+    )
+    vad_max_pause_seconds: float | None = Field(
+        default=None,
+        description="Pauses longer than this inside the speech are shortened to `2 * vad_padding_seconds` (None keeps them).",
+        gt=0.0,
+    )
+    audio_cache_size: int = Field(
+        default=128,
+        description="Number of decoded waves cached in memory by their content hash (0 disables it).",
+        ge=0,
+    )
+    audio_cache_dir: str | None = Field(
+        default=None,
+        description="Directory of decoded waves memory mapped on a cache hit and shared by the workers (None disables it).",
+    )
+    audio_cache_max_disk_bytes: int | None = Field(
+        default=None,
+        description="Least recently used waves are deleted when `audio_cache_dir` grows over this size (None for no limit).",
+        gt=0,
+    )
+    features_on_accelerator: bool = Field(
+        default=False,
+        description="Compute the log-mel filterbanks of every batch on the accelerator instead of the CPU.",
+    )
 
     # Batching configuration
     max_batch_size: int = Field(
@@ -67,6 +129,17 @@ class EngineSettings(BaseSettings):
         gt=0.0,
     )
 
+    @property
+    def vad_config(self) -> VadConfig | None:
+        """The voice activity detection options or `None` if it is disabled"""
+        if not self.vad:
+            return None
+        return VadConfig(
+            top_db=self.vad_top_db,
+            padding_seconds=self.vad_padding_seconds,
+            max_pause_seconds=self.vad_max_pause_seconds,
+        )
+
     @property
     def torch_dtype(self) -> torch.dtype:
         """Convert the string dtype to a PyTorch dtype."""
@@ -0,0 +1,173 @@
+"""Compact msgpack encoding of the engine `/predict` response
+
+The probabilities are packed as little-endian float32 bytes and the sifat as
+columns of int8 ids (`-1` for a missing sifa) so the app decodes them without
+copying into NumPy arrays. Clients that do not send
+`Accept: application/msgpack` get the same response as JSON through
+`MsgpackNegotiationMiddleware`.
+"""
+
+import json
+
+import msgpack
+import numpy as np
+
+
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+
+
+def pack_prediction(prediction: dict) -> bytes:
+    """Packs the output of `decode_batch` for a single input
+
+    Returns:
+        msgpack bytes of:
+            phonemes (str)
+            phonemes_probs (bytes): little-endian float32
+            sifat (dict):
+                phonemes_groups (list[str])
+                level -> dict of:
+                    ids (bytes): int8 label of every group (-1 if missing)
+                    probs (bytes): little-endian float32 (NaN if missing)
+                    vocab (dict[int, str]): label -> text
+    """
+    sifat = prediction["sifat"]
+    packed_sifat = {"phonemes_groups": [sifa["phonemes_group"] for sifa in sifat]}
+    levels = [level for level in sifat[0] if level != "phonemes_group"] if sifat else []
+    for level in levels:
+        ids = np.full(len(sifat), -1, dtype="<i1")
+        probs = np.full(len(sifat), np.nan, dtype="<f4")
+        vocab = {}
+        for idx, sifa in enumerate(sifat):
+            unit = sifa[level]
+            if unit is not None:
+                ids[idx] = unit["idx"]
+                probs[idx] = unit["prob"]
+                vocab[unit["idx"]] = unit["text"]
+        packed_sifat[level] = {
+            "ids": ids.tobytes(),
+            "probs": probs.tobytes(),
+            "vocab": vocab,
+        }
+
+    return msgpack.packb(
+        {
+            "phonemes": prediction["phonemes"],
+            "phonemes_probs": np.asarray(
+                prediction["phonemes_probs"], dtype="<f4"
+            ).tobytes(),
+            "sifat": packed_sifat,
+        }
+    )
+
+
+def unpack_prediction(content: bytes) -> dict:
+    """Decodes `pack_prediction` bytes with the arrays as read only NumPy views
+
+    Returns:
+        dict of:
+            phonemes (str)
+            phonemes_probs (np.ndarray): float32
+            sifat (dict):
+                phonemes_groups (list[str])
+                level -> dict of:
+                    ids (np.ndarray): int8 (-1 if missing)
+                    probs (np.ndarray): float32 (NaN if missing)
+                    vocab (dict[int, str])
+    """
+    data = msgpack.unpackb(content, strict_map_key=False)
+    data["phonemes_probs"] = np.frombuffer(data["phonemes_probs"], dtype="<f4")
+    for level, column in data["sifat"].items():
+        if level == "phonemes_groups":
+            continue
+        column["ids"] = np.frombuffer(column["ids"], dtype="<i1")
+        column["probs"] = np.frombuffer(column["probs"], dtype="<f4")
+    return data
+
+
+def prediction_to_dict(data: dict) -> dict:
+    """Converts `unpack_prediction` output to the JSON response of `/predict`"""
+    sifat_columns = data["sifat"]
+    levels = [level for level in sifat_columns if level != "phonemes_groups"]
+    sifat = []
+    for idx, group in enumerate(sifat_columns["phonemes_groups"]):
+        sifa = {"phonemes_group": group}
+        for level in levels:
+            label = int(sifat_columns[level]["ids"][idx])
+            sifa[level] = (
+                None
+                if label < 0
+                else {
+                    "text": sifat_columns[level]["vocab"][label],
+                    "prob": float(sifat_columns[level]["probs"][idx]),
+                    "idx": label,
+                }
+            )
+        sifat.append(sifa)
+    return {
+        "phonemes": data["phonemes"],
+        "phonemes_probs": data["phonemes_probs"].tolist(),
+        "sifat": sifat,
+    }
+
+
+def accepts_msgpack(accept_header: str) -> bool:
+    return any(
+        part.split(";")[0].strip() == MSGPACK_MEDIA_TYPE
+        for part in accept_header.split(",")
+    )
+
+
+class MsgpackNegotiationMiddleware:
+    """Converts msgpack responses to JSON if the client does not accept msgpack"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope["headers"])
+        if accepts_msgpack(headers.get(b"accept", b"").decode("latin-1")):
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        body = []
+
+        async def send_wrapper(message):
+            nonlocal start_message
+            if message["type"] == "http.response.start":
+                content_type = dict(message["headers"]).get(b"content-type", b"")
+                if content_type.decode("latin-1").startswith(MSGPACK_MEDIA_TYPE):
+                    # held back until the whole body is converted
+                    start_message = message
+                else:
+                    await send(message)
+                return
+            if start_message is None or message["type"] != "http.response.body":
+                # not a msgpack response: passed through chunk by chunk
+                await send(message)
+                return
+
+            body.append(message.get("body", b""))
+            if message.get("more_body", False):
+                return
+
+            content = json.dumps(
+                prediction_to_dict(unpack_prediction(b"".join(body))),
+                ensure_ascii=False,
+            ).encode("utf-8")
+            response_headers = [
+                (name, value)
+                for name, value in start_message["headers"]
+                if name not in (b"content-type", b"content-length")
+            ]
+            response_headers += [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(content)).encode("latin-1")),
+            ]
+            await send({**start_message, "headers": response_headers})
+            await send({"type": "http.response.body", "body": content})
+
+        await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,101 @@
+import numpy as np
+import torch
+from numpy.typing import NDArray
+from transformers import SeamlessM4TFeatureExtractor
+
+
+def batch_fbank_features(
+    waves: list[list[float] | torch.FloatTensor | NDArray],
+    processor: SeamlessM4TFeatureExtractor,
+    device: str | torch.device = "cpu",
+    frame_length=400,
+    hop_length=160,
+    fft_length=512,
+    preemphasis=0.97,
+    mel_floor=1.192092955078125e-07,
+) -> dict[str, torch.Tensor]:
+    """Computes the SeamlessM4T log-mel filterbanks of a whole batch at once
+
+    Gives the same output as `processor(waves, sampling_rate=16000,
+    return_tensors="pt")` but framing, fft, mel filters and normalization run
+    as a few batched torch ops (optionally on the accelerator) instead of a
+    python loop over the frames of every wave.
+
+    Args:
+        waves: list of 16000 Hz waves with different lengths
+        processor (SeamlessM4TFeatureExtractor): the model processor
+        device: the device to compute the features on
+
+    Returns:
+        dict of:
+            input_features (torch.FloatTensor): [batch, frames, num_mel_bins * stride]
+            attention_mask (torch.IntTensor): [batch, frames]
+    """
+    if not waves:
+        return {
+            "input_features": torch.zeros(
+                (0, 0, processor.num_mel_bins * processor.stride), device=device
+            ),
+            "attention_mask": torch.zeros((0, 0), dtype=torch.int32, device=device),
+        }
+    waves = [torch.as_tensor(np.asarray(w, dtype=np.float32)) for w in waves]
+    num_frames = [max(1 + (len(w) - frame_length) // hop_length, 0) for w in waves]
+
+    # Frames of all waves without padding: [total_frames, frame_length]
+    frames = torch.cat(
+        [
+            w[: frame_length + (n - 1) * hop_length].unfold(0, frame_length, hop_length)
+            if n > 0
+            else w.new_zeros((0, frame_length))
+            for w, n in zip(waves, num_frames)
+        ]
+    ).to(device)
+
+    # Kaldi compliance: 16-bit signed integers
+    frames = frames * (2**15)
+    frames = frames - frames.mean(dim=-1, keepdim=True)
+    frames = torch.cat(
+        [
+            frames[:, :1] * (1 - preemphasis),
+            frames[:, 1:] - preemphasis * frames[:, :-1],
+        ],
+        dim=-1,
+    )
+    window = torch.as_tensor(processor.window, dtype=torch.float32, device=device)
+    spectrogram = torch.view_as_real(torch.fft.rfft(frames * window, n=fft_length))
+    spectrogram = spectrogram.pow(2).sum(dim=-1)
+    mel_filters = torch.as_tensor(
+        processor.mel_filters, dtype=torch.float32, device=device
+    )
+    features = torch.clamp(spectrogram @ mel_filters, min=mel_floor).log()
+
+    # Normalizing every mel bin over the frames of every wave
+    features = list(torch.split(features, num_frames))
+    for idx, x in enumerate(features):
+        if len(x):
+            var = x.var(dim=0, keepdim=True) if len(x) > 1 else torch.zeros_like(x)
+            features[idx] = (x - x.mean(dim=0, keepdim=True)) / torch.sqrt(var + 1e-7)
+    max_frames = max(num_frames, default=0)
+    features = torch.nn.utils.rnn.pad_sequence(
+        features, batch_first=True, padding_value=processor.padding_value
+    )
+    frames_mask = (
+        torch.arange(max_frames, device=device)[None, :]
+        < torch.LongTensor(num_frames).to(device)[:, None]
+    )
+
+    # Padding to multiple of stride and stacking every `stride` frames
+    stride = processor.stride
+    remainder = max_frames % stride
+    if remainder:
+        features = torch.nn.functional.pad(
+            features, (0, 0, 0, stride - remainder), value=processor.padding_value
+        )
+        frames_mask = torch.nn.functional.pad(frames_mask, (0, stride - remainder))
+    batch_size, total_frames, num_mel_bins = features.shape
+    input_features = features.reshape(
+        batch_size, total_frames // stride, num_mel_bins * stride
+    )
+    attention_mask = frames_mask[:, stride - 1 :: stride].to(torch.int32)
+
+    return {"input_features": input_features, "attention_mask": attention_mask}
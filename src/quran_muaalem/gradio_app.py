@@ -9,11 +9,12 @@ from quran_transcript.phonetics.moshaf_attributes import (
     get_arabic_attributes,
     get_arabic_name,
 )
-from librosa.core import load
 from pydantic.fields import FieldInfo, PydanticUndefined
 import torch
 import gradio as gr
 
+from quran_muaalem.audio_cache import AudioCache
+from quran_muaalem.audio_decode import decode_audio
 from quran_muaalem.inference import Muaalem
 from quran_muaalem.muaalem_typing import MuaalemOutput
 from quran_muaalem.explain import explain_for_terminal
@@ -64,6 +65,9 @@ logging.basicConfig(level=logging.INFO)
 device = "cuda" if torch.cuda.is_available() else "cpu"
 muaalem = Muaalem(model_name_or_path=model_id, device=device)
 sampling_rate = 16000
+# the same recording is often re-checked with other moshaf settings
+audio_cache = AudioCache(max_size=32)
+
 
 # Load Sura information
 sura_idx_to_name = {}
@@ -192,7 +196,8 @@ def process_audio(audio, sura_idx, aya_idx, start_idx, num_words):
         )
 
         # Process audio
-        wave, _ = load(audio, sr=sampling_rate, mono=True)
+        with open(audio, "rb") as f:
+            wave = audio_cache.get_or_load(f.read(), decode_audio, sampling_rate, None)
         outs = muaalem(
             [wave],
             [phonetizer_out],
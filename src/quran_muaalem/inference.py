@@ -1,17 +1,33 @@
 import logging
+from typing import Iterable
 
 from quran_transcript import chunck_phonemes, QuranPhoneticScriptOutput
 from transformers import AutoFeatureExtractor
 import torch
+import numpy as np
 from numpy.typing import NDArray
 
 from .modeling.multi_level_tokenizer import MultiLevelTokenizer
 from .modeling.modeling_multi_level_ctc import Wav2Vec2BertForMultilevelCTC
 from .decode import (
+    decode_outs_to_units,
+    greedy_ids_and_probs,
+    greedy_ids_and_probs_from_logits,
+    multilevel_ctc_decode,
     multilevel_greedy_decode,
-    phonemes_level_greedy_decode,
 )
 from .muaalem_typing import Unit, SingleUnit, Sifa, MuaalemOutput
+from .batching import BucketStats, bucket_by_length
+from .vad import SpeechSegments, VadConfig, detect_speech
+from .streaming import (
+    FrameStitcher,
+    fix_chunk_length,
+    iter_windows,
+)
+
+
+# The hop length of the fbank features of the processor
+FBANK_HOP_SIZE = 160
 
 
 def format_sifat(
@@ -74,12 +90,19 @@ class Muaalem:
 
         self.model.to(device, dtype=dtype)
 
+        # Statistics of the length buckets of the last call
+        self.last_bucket_stats: BucketStats | None = None
+
     @torch.no_grad()
     def __call__(
         self,
         waves: list[list[float] | torch.FloatTensor | NDArray],
         ref_quran_phonetic_script_list: list[QuranPhoneticScriptOutput],
         sampling_rate: int,
+        return_level_to_probs: bool = False,
+        max_padding_ratio: float = 1.0,
+        max_batch_seconds: float | None = None,
+        vad: VadConfig | None = None,
     ) -> list[MuaalemOutput]:
         """Infrence Funcion for the Quran Muaalem Project
 
@@ -88,6 +111,23 @@ class Muaalem:
                     phonetized ouput of `quran_transcript.quran_phonetizer` with `remove_space=True`
 
                 sampleing_rate (int): has to be 16000
+                return_level_to_probs (bool): if `True` the full softmax distributions
+                    of every level are computed and returned in
+                    `MuaalemOutput.level_to_probs`. By default only the argmax ids
+                    and their probabilities are computed on the model device.
+                max_padding_ratio (float): inputs are sorted by length and split into
+                    buckets that are run separately. Every bucket has at most this
+                    fraction of padding (0.0-1.0). The default `1.0` runs all inputs
+                    as a single batch padded to the longest wave. Use a lower value
+                    (ex: `0.2`) for waves of very different durations.
+                max_batch_seconds (float | None): maximum seconds of padded audio
+                    (`bucket_size * longest_wave`) per bucket. `None` means no limit.
+                vad (VadConfig | None): if given the leading and trailing silence
+                    (and the long pauses if `vad.max_pause_seconds`) of every wave
+                    are dropped before the feature extraction. The kept parts are
+                    returned in `MuaalemOutput.speech_segments`.
+
+                The statistics of the buckets are stored in `self.last_bucket_stats`.
 
         Returns:
             list[MuaalemOutput]:
@@ -129,6 +169,231 @@ class Muaalem:
 
         # TODO: check input waves
 
+        segments: list[SpeechSegments | None] = [None] * len(waves)
+        if vad is not None:
+            segments = [detect_speech(wave, sampling_rate, vad) for wave in waves]
+            waves = [
+                seg.apply(np.asarray(wave, dtype=np.float32))
+                for seg, wave in zip(segments, waves)
+            ]
+
+        buckets, self.last_bucket_stats = bucket_by_length(
+            [len(wave) for wave in waves],
+            max_padding_ratio=max_padding_ratio,
+            max_batch_samples=int(max_batch_seconds * sampling_rate)
+            if max_batch_seconds is not None
+            else None,
+        )
+        outs: list[MuaalemOutput | None] = [None] * len(waves)
+        for bucket in buckets:
+            bucket_outs = self._infer_batch(
+                [waves[idx] for idx in bucket],
+                [ref_quran_phonetic_script_list[idx] for idx in bucket],
+                sampling_rate=sampling_rate,
+                return_level_to_probs=return_level_to_probs,
+            )
+            for idx, out in zip(bucket, bucket_outs):
+                out.speech_segments = segments[idx]
+                outs[idx] = out
+        return outs
+
+    @property
+    def frame_samples(self) -> int:
+        """Number of audio samples per output frame of the model"""
+        config = self.model.config
+        adapter_stride = 1
+        if config.add_adapter:
+            adapter_stride = config.adapter_stride**config.num_adapter_layers
+        return FBANK_HOP_SIZE * self.processor.stride * adapter_stride
+
+    @torch.no_grad()
+    def stream(
+        self,
+        wave_chunks: Iterable[list[float] | torch.FloatTensor | NDArray],
+        ref_quran_phonetic_script: QuranPhoneticScriptOutput,
+        sampling_rate: int,
+        window_seconds: float = 20.0,
+        hop_seconds: float = 15.0,
+        batch_size: int = 8,
+    ) -> MuaalemOutput:
+        """Inference on an arbitrarily long recording (ex: a full surah) read chunk by chunk
+
+        The wave is split into overlapping windows that are run through the model
+        `batch_size` windows at a time. The frames of every window are stitched
+        by keeping the center of the window and dropping half of the overlap at
+        each side, then the stitched frames of all levels are decoded at once.
+        So peak memory is bounded by `batch_size * window_seconds` instead of the
+        length of the recording.
+
+        The stitched frames are close to but not the same as a single pass over
+        the whole wave: the processor normalizes every window over its own frames
+        and the frames near the borders of a window see less context.
+
+        Args:
+            wave_chunks: consecutive chunks of the wave with any length
+            ref_quran_phonetic_script (QuranPhoneticScriptOutput): the phonetized
+                ouput of `quran_transcript.quran_phonetizer` with `remove_space=True`
+                for the whole recording
+            sampling_rate (int): has to be 16000
+            window_seconds (float): the length of every window. It is adjusted so
+                the processor does not pad the window with zeros.
+            hop_seconds (float): the distance between the start of two consecutive
+                windows. It is rounded to a whole number of model frames. The
+                overlap (`window_seconds - hop_seconds`) gives the frames near the
+                borders of the windows enough context.
+            batch_size (int): number of windows per forward pass
+
+        Returns:
+            MuaalemOutput: the output of the whole recording as `__call__`
+        """
+        if sampling_rate != 16000:
+            raise ValueError(f"`sampling_rate` has to be 16000 got: `{sampling_rate}`")
+
+        frame_samples = self.frame_samples
+        window_samples = round(
+            fix_chunk_length(
+                window_seconds * 1000,
+                sampling_rate=sampling_rate,
+                stride=self.processor.stride,
+            )
+            * sampling_rate
+            / 1000
+        )
+        hop_samples = max(round(hop_seconds * sampling_rate / frame_samples), 1)
+        hop_samples = min(hop_samples * frame_samples, window_samples)
+
+        stitched_ids = FrameStitcher(hop_samples // frame_samples)
+        stitched_probs = FrameStitcher(hop_samples // frame_samples)
+
+        # number of frames of a full window
+        window_frames: int | None = None
+
+        def _run(windows: list[NDArray], is_last: bool):
+            nonlocal window_frames
+            level_to_ids, level_to_max_probs, _ = self._forward(
+                windows, sampling_rate=sampling_rate
+            )
+            # the last window is shorter than a full window
+            if not is_last or window_frames is None:
+                window_frames = level_to_ids["phonemes"].shape[1]
+            for idx in range(len(windows)):
+                stitched_ids.add(
+                    {level: ids[idx] for level, ids in level_to_ids.items()},
+                    window_frames=window_frames,
+                    is_last=is_last,
+                )
+                stitched_probs.add(
+                    {level: p[idx] for level, p in level_to_max_probs.items()},
+                    window_frames=window_frames,
+                    is_last=is_last,
+                )
+
+        windows: list[NDArray] = []
+        for window, is_last in iter_windows(wave_chunks, window_samples, hop_samples):
+            if is_last:
+                if windows:
+                    _run(windows, is_last=False)
+                    windows = []
+                _run([window], is_last=True)
+            else:
+                windows.append(window)
+                if len(windows) == batch_size:
+                    _run(windows, is_last=False)
+                    windows = []
+        if windows:
+            _run(windows, is_last=False)
+
+        if stitched_ids.num_windows == 0:
+            raise ValueError("The wave is too short to be processed")
+
+        return self._decode(
+            {level: ids[None] for level, ids in stitched_ids.get().items()},
+            {level: p[None] for level, p in stitched_probs.get().items()},
+            [ref_quran_phonetic_script],
+        )[0]
+
+    def transcribe_long(
+        self,
+        wave: list[float] | torch.FloatTensor | NDArray,
+        ref_quran_phonetic_script: QuranPhoneticScriptOutput,
+        sampling_rate: int,
+        **kwargs,
+    ) -> MuaalemOutput:
+        """Inference on a single long wave (ex: a full surah)
+
+        See `Muaalem.stream` for the arguments
+        """
+        return self.stream(
+            [wave],
+            ref_quran_phonetic_script,
+            sampling_rate=sampling_rate,
+            **kwargs,
+        )
+
+    def _infer_batch(
+        self,
+        waves: list[list[float] | torch.FloatTensor | NDArray],
+        ref_quran_phonetic_script_list: list[QuranPhoneticScriptOutput],
+        sampling_rate: int,
+        return_level_to_probs: bool = False,
+    ) -> list[MuaalemOutput]:
+        """Runs the model and decoding on a single padded batch"""
+        level_to_ids, level_to_max_probs, probs = self._forward(
+            waves,
+            sampling_rate=sampling_rate,
+            return_level_to_probs=return_level_to_probs,
+        )
+        return self._decode(
+            level_to_ids,
+            level_to_max_probs,
+            ref_quran_phonetic_script_list,
+            level_to_probs=probs,
+        )
+
+    def _forward(
+        self,
+        waves: list[list[float] | torch.FloatTensor | NDArray],
+        sampling_rate: int,
+        return_level_to_probs: bool = False,
+    ) -> tuple[
+        dict[str, torch.LongTensor],
+        dict[str, torch.FloatTensor],
+        dict[str, torch.FloatTensor] | None,
+    ]:
+        """Runs the model on a single padded batch
+
+        Returns:
+            level -> greedy ids, level -> their probabilities and level -> the
+            full probabilities if `return_level_to_probs` (all on cpu)
+        """
+        features = self.processor(
+            waves, sampling_rate=sampling_rate, return_tensors="pt"
+        )
+        features = {k: v.to(self.device, dtype=self.dtype) for k, v in features.items()}
+        outs = self.model(**features, return_dict=False)[0]
+
+        probs = None
+        if return_level_to_probs:
+            probs = {}
+            for level in outs:
+                probs[level] = (
+                    torch.nn.functional.softmax(outs[level], dim=-1)
+                    .cpu()
+                    .to(torch.float32)
+                )
+            level_to_ids, level_to_max_probs = greedy_ids_and_probs(probs)
+        else:
+            level_to_ids, level_to_max_probs = greedy_ids_and_probs_from_logits(outs)
+        return level_to_ids, level_to_max_probs, probs
+
+    def _decode(
+        self,
+        level_to_ids: dict[str, torch.LongTensor],
+        level_to_max_probs: dict[str, torch.FloatTensor],
+        ref_quran_phonetic_script_list: list[QuranPhoneticScriptOutput],
+        level_to_probs: dict[str, torch.FloatTensor] | None = None,
+    ) -> list[MuaalemOutput]:
+        """Decodes the greedy ids of all levels against the references"""
         # Tokanizing Ref
         level_to_ref_ids = self.multi_level_tokenizer.tokenize(
             [r.phonemes for r in ref_quran_phonetic_script_list],
@@ -138,21 +403,11 @@ class Muaalem:
             padding="longest",
         )["input_ids"]
 
-        features = self.processor(
-            waves, sampling_rate=sampling_rate, return_tensors="pt"
-        )
-        features = {k: v.to(self.device, dtype=self.dtype) for k, v in features.items()}
-        outs = self.model(**features, return_dict=False)[0]
-
-        probs = {}
-        for level in outs:
-            probs[level] = (
-                torch.nn.functional.softmax(outs[level], dim=-1).cpu().to(torch.float32)
-            )
-
-        # Decoding only Phonemes Level
-        phonemes_units = phonemes_level_greedy_decode(
-            probs["phonemes"], self.multi_level_tokenizer.id_to_vocab["phonemes"]
+        # CTC decoding all levels at once
+        level_to_decode_outs = multilevel_ctc_decode(level_to_ids, level_to_max_probs)
+        phonemes_units = decode_outs_to_units(
+            level_to_decode_outs["phonemes"],
+            self.multi_level_tokenizer.id_to_vocab["phonemes"],
         )
 
         chunked_phonemes_batch: list[list[str]] = []
@@ -160,7 +415,7 @@ class Muaalem:
             chunked_phonemes_batch.append(chunck_phonemes(phonemes_unit.text))
 
         level_to_units = multilevel_greedy_decode(
-            level_to_probs=probs,
+            level_to_probs=None,
             level_to_id_to_vocab=self.multi_level_tokenizer.id_to_vocab,
             level_to_ref_ids=level_to_ref_ids,
             chunked_phonemes_batch=chunked_phonemes_batch,
@@ -168,6 +423,7 @@ class Muaalem:
                 [s.phonemes for s in r.sifat] for r in ref_quran_phonetic_script_list
             ],
             phonemes_units=phonemes_units,
+            level_to_decode_outs=level_to_decode_outs,
         )
 
         sifat_batch: list[list[Sifa]] = format_sifat(
@@ -183,6 +439,9 @@ class Muaalem:
                 MuaalemOutput(
                     phonemes=level_to_units["phonemes"][idx],
                     sifat=sifat_batch[idx],
+                    level_to_probs={level: p[idx] for level, p in level_to_probs.items()}
+                    if level_to_probs is not None
+                    else None,
                 )
             )
         return outs
@@ -1,5 +1,18 @@
 from dataclasses import dataclass
 import torch
+from quran_transcript.phonetics.moshaf_attributes import MoshafAttributes
+
+from .vad import SpeechSegments
+
+
+# The moshaf of the app requests and the batch grading items without one
+DEFAULT_MOSHAF = MoshafAttributes(
+    rewaya="hafs",
+    madd_monfasel_len=4,
+    madd_mottasel_len=4,
+    madd_mottasel_waqf=4,
+    madd_aared_len=4,
+)
 
 
 @dataclass
@@ -72,7 +85,15 @@ class MuaalemOutput:
     text (str): The feature's categorical label (e.g., "hams", "shidda").
     prob (float): Confidence probability for this feature.
     idx (int): Identifier for the feature class.
+    level_to_probs (dict[str, torch.FloatTensor] | None): the full softmax
+        distributions of every level of shape: seq_len, num_classes. Only
+        filled when `Muaalem.__call__` is called with `return_level_to_probs=True`
+    speech_segments (SpeechSegments | None): the parts of the input wave the
+        model was run on. Only filled when `Muaalem.__call__` is called with
+        `vad`. Use it to map the frames of `level_to_probs` back to the input wave
     """
 
     phonemes: Unit
     sifat: list[Sifa]
+    level_to_probs: dict[str, torch.FloatTensor] | None = None
+    speech_segments: SpeechSegments | None = None
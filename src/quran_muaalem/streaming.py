@@ -0,0 +1,278 @@
+from bisect import bisect_right
+from dataclasses import dataclass, field
+from typing import Iterable, Iterator
+
+import numpy as np
+import torch
+from numpy.typing import NDArray
+
+
+def count_frames(samples: int, window=400, hop_size=160, stride=2) -> float:
+    """Number of the model input frames (after stacking every `stride` fbank frames)"""
+    return (1 + (samples - window) / hop_size) / stride
+
+
+def count_sampels_from_frames(
+    num_frames: int, window=400, hop_size=160, stride=2
+) -> int:
+    """Number of samples that gives exactly `num_frames` model input frames"""
+    return int((num_frames * stride - 1) * hop_size + window)
+
+
+def fix_chunk_length(
+    chunk_ms: float, sampling_rate=16000, window=400, hop_size=160, stride=2
+) -> float:
+    """fix chunk length so the input of each frame to the model
+    is complete not padded with zeros by the preprossor
+
+    The number of fbank frames of the fixed chunk is a multiple of `stride` so
+    the processor does not pad the last stacked frame.
+    """
+    kwargs = dict(window=window, hop_size=hop_size, stride=stride)
+    num_frames = count_frames(int(chunk_ms * sampling_rate / 1000), **kwargs)
+    fixed_sampels = count_sampels_from_frames(max(np.ceil(num_frames), 1), **kwargs)
+    return fixed_sampels / sampling_rate * 1000
+
+
+def iter_windows(
+    wave_chunks: Iterable[list[float] | torch.FloatTensor | NDArray],
+    window_samples: int,
+    hop_samples: int,
+    min_samples: int = 400,
+) -> Iterator[tuple[NDArray, bool]]:
+    """Splits a stream of audio chunks into overlapping windows
+
+    Only the samples of the current window are kept in memory so the wave can
+    be read chunk by chunk (ex: from a file or a microphone).
+
+    Args:
+        wave_chunks: consecutive chunks of the wave with any length
+        window_samples (int): the length of every window
+        hop_samples (int): the distance between the start of two consecutive windows
+        min_samples (int): a last window shorter than this is dropped
+
+    Yields:
+        tuple of:
+            NDArray: the window (float32)
+            bool: `True` for the last window which is shorter than `window_samples`
+                and covers the rest of the wave
+    """
+    if not (0 < hop_samples <= window_samples):
+        raise ValueError(
+            f"`hop_samples` has to be in (0, window_samples] got: `{hop_samples}`"
+        )
+    buffer = np.zeros(0, dtype=np.float32)
+    for chunk in wave_chunks:
+        chunk = np.asarray(chunk, dtype=np.float32)
+        buffer = np.concatenate([buffer, chunk]) if len(buffer) else chunk
+        while len(buffer) >= window_samples:
+            yield buffer[:window_samples], False
+            buffer = buffer[hop_samples:]
+
+    if len(buffer) >= min_samples:
+        yield buffer, True
+
+
+@dataclass
+class FrameStitcher:
+    """Concatenates the frames of overlapping windows
+
+    Every window keeps the frames of its center and drops half of the overlap
+    with its neighbours at each side, as the frames near the window borders
+    lack context. The first window keeps its start and the last window keeps
+    its end so the stitched frames cover the whole wave.
+
+    Windows have to be added in order and start every `hop_frames` frames.
+
+    Args:
+        hop_frames (int): the distance in frames between two consecutive windows
+    """
+
+    hop_frames: int
+    level_to_frames: dict[str, list[torch.Tensor]] = field(default_factory=dict)
+    num_windows: int = 0
+
+    def add(
+        self,
+        level_to_window_frames: dict[str, torch.Tensor],
+        window_frames: int,
+        is_last: bool = False,
+    ):
+        """
+        Args:
+            level_to_window_frames (dict[str, torch.Tensor]): level -> frames of
+                the window with shape [frames, ...]
+            window_frames (int): the number of frames of a full window
+            is_last (bool): if `True` the window frames are kept to the end
+        """
+        overlap = max(window_frames - self.hop_frames, 0)
+        start = overlap // 2 if self.num_windows > 0 else 0
+        end = None if is_last else window_frames - (overlap - overlap // 2)
+        for level, frames in level_to_window_frames.items():
+            self.level_to_frames.setdefault(level, []).append(frames[start:end])
+        self.num_windows += 1
+
+    def get(self) -> dict[str, torch.Tensor]:
+        """Returns level -> the stitched frames"""
+        return {
+            level: torch.cat(frames, dim=0)
+            for level, frames in self.level_to_frames.items()
+        }
+
+
+_HASH_MOD = (1 << 61) - 1
+_HASH_BASE = 1_000_003
+
+
+def _prefix_hashes(ids: list[int]) -> list[int]:
+    hashes = [0]
+    for idx in ids:
+        hashes.append((hashes[-1] * _HASH_BASE + idx) % _HASH_MOD)
+    return hashes
+
+
+def _longest_match_of_length(
+    a_hashes: list[int],
+    b_hashes: list[int],
+    powers: list[int],
+    length: int,
+) -> tuple[int, int] | None:
+    """Finds a common sub list of `length` items that starts in A at `a_idx >= b_idx`
+
+    Returns:
+        the match with the smallest `(a_idx - b_idx, b_idx)` as
+        `(a_idx - b_idx, b_idx)` or `None`
+    """
+    power = powers[length]
+    b_starts: dict[int, list[int]] = {}
+    for b_idx, h in enumerate(
+        [
+            (b_hashes[b_idx + length] - b_hashes[b_idx] * power) % _HASH_MOD
+            for b_idx in range(len(b_hashes) - length)
+        ]
+    ):
+        b_starts.setdefault(h, []).append(b_idx)
+
+    best = None
+    for a_idx, h in enumerate(
+        [
+            (a_hashes[a_idx + length] - a_hashes[a_idx] * power) % _HASH_MOD
+            for a_idx in range(len(a_hashes) - length)
+        ]
+    ):
+        starts = b_starts.get(h)
+        if starts is None:
+            continue
+        # the closest start of B gives the smallest offset
+        pos = bisect_right(starts, a_idx) - 1
+        if pos < 0:
+            continue
+        match = (a_idx - starts[pos], starts[pos])
+        if best is None or match < best:
+            best = match
+    return best
+
+
+def _loop_longest_match(A: list, B: list) -> tuple[int, int, int] | None:
+    """Quadratic search of `_longest_match` used only on hash collisions"""
+    best = None
+    for offset in range(len(A)):
+        length = 0
+        for b_idx in range(min(len(B), len(A) - offset) + 1):
+            if b_idx < len(B) and b_idx + offset < len(A):
+                if A[b_idx + offset] == B[b_idx]:
+                    length += 1
+                    continue
+            if length and (best is None or length > best[0]):
+                best = (length, offset, b_idx - length)
+            length = 0
+    return best
+
+
+def _longest_match(A: list, B: list) -> tuple[int, int, int] | None:
+    """Longest common sub list of A and B that starts in A at `a_idx >= b_idx`
+
+    Ties are broken by the smallest offset (`a_idx - b_idx`) then by the
+    smallest `b_idx`. Uses a rolling hash and a binary search over the match
+    length i.e: O((len(A) + len(B)) * log(len(B))).
+
+    Returns:
+        `(length, a_idx - b_idx, b_idx)` or `None` if there is no match
+    """
+    item_to_id: dict = {}
+    a_ids = [item_to_id.setdefault(item, len(item_to_id) + 1) for item in A]
+    b_ids = [item_to_id.setdefault(item, len(item_to_id) + 1) for item in B]
+    a_hashes = _prefix_hashes(a_ids)
+    b_hashes = _prefix_hashes(b_ids)
+    powers = [1]
+    for _ in range(min(len(A), len(B))):
+        powers.append(powers[-1] * _HASH_BASE % _HASH_MOD)
+
+    # a sub list of a match is a match on the same offset so we can binary search
+    low, high = 0, min(len(A), len(B))
+    best = None
+    while low < high:
+        length = (low + high + 1) // 2
+        match = _longest_match_of_length(a_hashes, b_hashes, powers, length)
+        if match is None:
+            high = length - 1
+        else:
+            low = length
+            best = match
+
+    if best is None:
+        return None
+    offset, b_idx = best
+    if A[offset + b_idx : offset + b_idx + low] != B[b_idx : b_idx + low]:
+        # hash collision
+        return _loop_longest_match(A, B)
+    return low, offset, b_idx
+
+
+def merge_lists_with_overlap(A: list, B: list, max_B_offset=2, inplace=False) -> list:
+    """
+    Merge two lists by finding the maximum overlap between the end of A and beginning of B.
+
+    B is compared with the last `len(B) + max_B_offset` items of A only, so the
+    cost of a merge does not grow with the length of A. The longest common sub
+    list of both is found with a rolling hash in near linear time.
+
+    * If there is not common sub sequence: concatenate A and B
+
+    Args:
+        A: First list
+        B: Second list
+        max_B_offset: the starting point of comarison is shifted to the left by `max_B_offset`
+        EX: A = [0, 1, 2, 3, 4, 5, 6, 7, 8, 9], B = [5, 6, 7, 8]
+
+        if max_B_offset = 0 then start point:
+        A: [0, 1, 2, 3, 4, 5, 6, 7, 8, 9]
+        B:                   [5, 6, 7, 8]
+
+        if max_B_offset = 1 then start point:
+        A: [0, 1, 2, 3, 4, 5, 6, 7, 8, 9]
+        B:                [5, 6, 7, 8]
+
+        if max_B_offset = 2 then start point:
+        A: [0, 1, 2, 3, 4, 5, 6, 7, 8, 9]
+        B:             [5, 6, 7, 8]
+
+        Then shifting B to the right step by step unitl we find a match. The
+        longest match wins and B overwrites A from the start of the match.
+        inplace: if `True` A is updated and returned without copying it. Use it
+            when accumulating a long sequence chunk by chunk.
+
+    Returns:
+        Merged list with overlap handled optimally
+    """
+    a_orig_offset = max(len(A) - len(B) - max_B_offset, 0)
+    match = _longest_match(A[a_orig_offset:], B)
+
+    out = A if inplace else list(A)
+    if match is None:
+        out.extend(B)
+    else:
+        _, offset, b_idx = match
+        del out[a_orig_offset + offset + b_idx :]
+        out.extend(B[b_idx:])
+    return out
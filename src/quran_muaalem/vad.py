@@ -0,0 +1,145 @@
+from dataclasses import dataclass
+
+import numpy as np
+from numpy.typing import NDArray
+
+
+@dataclass
+class VadConfig:
+    """
+    Options of the energy voice activity detection:
+        top_db (float): frames quieter than the loudest frame of the wave by more
+            than this (in dB) are silence
+        frame_seconds (float): length of the frames the energy is computed on
+        hop_seconds (float): distance between two consecutive frames
+        padding_seconds (float): audio kept before and after every speech segment
+            so soft onsets and endings (ex: hams letters) are not cut
+        max_pause_seconds (float | None): pauses between speech segments longer
+            than this are cut down to `2 * padding_seconds`. `None` only trims the
+            leading and trailing silence
+    """
+
+    top_db: float = 40.0
+    frame_seconds: float = 0.025
+    hop_seconds: float = 0.010
+    padding_seconds: float = 0.2
+    max_pause_seconds: float | None = None
+
+
+@dataclass
+class SpeechSegments:
+    """
+    The parts of a wave kept by the voice activity detection:
+        spans (list[tuple[int, int]]): sorted [start, end) sample spans of the
+            original wave
+        num_samples (int): length of the original wave
+    """
+
+    spans: list[tuple[int, int]]
+    num_samples: int
+
+    @property
+    def num_kept_samples(self) -> int:
+        return sum(end - start for start, end in self.spans)
+
+    def apply(self, wave: NDArray) -> NDArray:
+        """The kept spans of `wave` concatenated"""
+        if len(self.spans) == 1:
+            start, end = self.spans[0]
+            return wave[start:end]
+        return np.concatenate([wave[start:end] for start, end in self.spans])
+
+    def to_original(self, sample_idx: int | NDArray) -> int | NDArray:
+        """Maps sample indices of the trimmed wave back to the original wave
+
+        For an output frame `idx` of the model use
+        `to_original(idx * Muaalem.frame_samples)`.
+        """
+        lengths = np.array([end - start for start, end in self.spans])
+        kept_starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+        span_idx = np.searchsorted(kept_starts, sample_idx, side="right") - 1
+        span_idx = np.clip(span_idx, 0, len(self.spans) - 1)
+        starts = np.array([start for start, _ in self.spans])
+        original = starts[span_idx] + (np.asarray(sample_idx) - kept_starts[span_idx])
+        if np.ndim(original) == 0:
+            return int(original)
+        return original
+
+
+def frame_energy_db(wave: NDArray, frame_length: int, hop_length: int) -> NDArray:
+    """Mean square energy (dB) of every frame of the wave"""
+    frames = np.lib.stride_tricks.sliding_window_view(wave, frame_length)[
+        ::hop_length
+    ]
+    energy = np.mean(np.square(frames, dtype=np.float64), axis=-1)
+    return 10 * np.log10(energy + 1e-10)
+
+
+def detect_speech(
+    wave: list[float] | NDArray,
+    sampling_rate: int,
+    config: VadConfig | None = None,
+) -> SpeechSegments:
+    """Finds the speech segments of a wave by comparing the energy of its frames
+    to the loudest frame
+
+    A wave shorter than a frame or without any silence is kept as a whole.
+    """
+    config = config or VadConfig()
+    wave = np.asarray(wave, dtype=np.float32)
+    num_samples = len(wave)
+    frame_length = max(int(config.frame_seconds * sampling_rate), 1)
+    hop_length = max(int(config.hop_seconds * sampling_rate), 1)
+    if num_samples < frame_length:
+        return SpeechSegments(spans=[(0, num_samples)], num_samples=num_samples)
+
+    energy_db = frame_energy_db(wave, frame_length, hop_length)
+    is_speech = energy_db > energy_db.max() - config.top_db
+
+    # [start, end) frame runs of speech
+    edges = np.flatnonzero(np.diff(is_speech.astype(np.int8), prepend=0, append=0))
+    runs = edges.reshape(-1, 2)
+    # sample spans of the runs
+    spans = np.stack(
+        [runs[:, 0] * hop_length, (runs[:, 1] - 1) * hop_length + frame_length], axis=1
+    )
+
+    if config.max_pause_seconds is None:
+        spans = np.array([[spans[0, 0], spans[-1, 1]]])
+    else:
+        # merging the segments separated by short pauses
+        max_pause = int(config.max_pause_seconds * sampling_rate)
+        merged = [list(spans[0])]
+        for start, end in spans[1:]:
+            if start - merged[-1][1] <= max_pause:
+                merged[-1][1] = end
+            else:
+                merged.append([start, end])
+        spans = np.array(merged)
+
+    padding = int(config.padding_seconds * sampling_rate)
+    padded: list[tuple[int, int]] = []
+    for start, end in spans:
+        start = max(int(start) - padding, 0)
+        end = min(int(end) + padding, num_samples)
+        if padded and start <= padded[-1][1]:
+            padded[-1] = (padded[-1][0], end)
+        else:
+            padded.append((start, end))
+    return SpeechSegments(spans=padded, num_samples=num_samples)
+
+
+def trim_silence(
+    wave: list[float] | NDArray,
+    sampling_rate: int,
+    config: VadConfig | None = None,
+) -> tuple[NDArray, SpeechSegments]:
+    """Drops the silence of a wave as `detect_speech`
+
+    Returns:
+        the trimmed wave and its `SpeechSegments` to map positions in it back
+        to the original wave
+    """
+    wave = np.asarray(wave, dtype=np.float32)
+    segments = detect_speech(wave, sampling_rate, config)
+    return segments.apply(wave), segments
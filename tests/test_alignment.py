@@ -0,0 +1,192 @@
+import random
+from time import perf_counter
+
+import pytest
+import torch
+
+from quran_muaalem.decode import (
+    align_chunked_phonemes_sequence,
+    align_predicted_sequence,
+)
+
+
+def loop_choice_matrix(rows, columns, key=lambda x: x):
+    """The original full dynamic programming choice matrix used as a reference"""
+    n = len(rows)
+    m = len(columns)
+    dp = [[0] * (m + 1) for _ in range(n + 1)]
+    choice = [[0] * (m + 1) for _ in range(n + 1)]
+    for i in range(1, n + 1):
+        dp[i][0] = i
+
+    for i in range(1, n + 1):
+        for j in range(1, m + 1):
+            option1 = dp[i][j - 1]
+            option2 = dp[i - 1][j] + 1
+            cost = 0 if key(rows[i - 1]) == key(columns[j - 1]) else 1
+            option3 = dp[i - 1][j - 1] + cost
+
+            if option3 <= option1 and option3 <= option2:
+                dp[i][j] = option3
+                choice[i][j] = 3
+            elif option1 <= option2:
+                dp[i][j] = option1
+                choice[i][j] = 1
+            else:
+                dp[i][j] = option2
+                choice[i][j] = 2
+    return choice
+
+
+def loop_align_predicted_sequence(ref, predicted, missing_placeholder=-100):
+    n = len(ref)
+    m = len(predicted)
+    choice = loop_choice_matrix(ref, predicted)
+    i = n
+    j = m
+    mask = []
+    res_chars = []
+    while i > 0 or j > 0:
+        if i > 0 and j > 0:
+            if choice[i][j] == 3:
+                res_chars.append(predicted[j - 1])
+                mask.append(True)
+                i -= 1
+                j -= 1
+            elif choice[i][j] == 2:
+                res_chars.append(missing_placeholder)
+                i -= 1
+            else:
+                j -= 1
+                mask.append(False)
+        elif i > 0:
+            res_chars.append(missing_placeholder)
+            i -= 1
+        else:
+            j -= 1
+            mask.append(False)
+    return res_chars[::-1], mask[::-1]
+
+
+def loop_align_chunked_phonemes_sequence(ref, predicted):
+    n = len(predicted)
+    m = len(ref)
+    choice = loop_choice_matrix(predicted, ref, key=lambda x: x[0])
+    i = n
+    j = m
+    mask = []
+    while i > 0 or j > 0:
+        if i > 0 and j > 0:
+            if choice[i][j] == 3:
+                mask.append(True)
+                i -= 1
+                j -= 1
+            elif choice[i][j] == 2:
+                i -= 1
+            else:
+                j -= 1
+                mask.append(False)
+        elif i > 0:
+            i -= 1
+        else:
+            j -= 1
+            mask.append(False)
+    return mask[::-1]
+
+
+def random_edit(seq: list, num_edits: int, vocab: list, rng: random.Random) -> list:
+    """Applies random insertions, deletions and replacements to `seq`"""
+    seq = list(seq)
+    for _ in range(num_edits):
+        op = rng.choice(["insert", "delete", "replace"])
+        pos = rng.randrange(len(seq) + 1)
+        if op == "insert":
+            seq.insert(pos, rng.choice(vocab))
+        elif seq and pos < len(seq):
+            if op == "delete":
+                del seq[pos]
+            else:
+                seq[pos] = rng.choice(vocab)
+    return seq
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_align_predicted_sequence_parity(seed):
+    rng = random.Random(seed)
+    vocab = list(range(1, rng.randint(2, 6)))
+    ref = [rng.choice(vocab) for _ in range(rng.randint(0, 25))]
+    predicted = random_edit(ref, rng.randint(0, 6), vocab, rng)
+    if len(ref) == len(predicted) or len(predicted) == 0:
+        return
+
+    out, mask = align_predicted_sequence(ref, predicted)
+    ex_out, ex_mask = loop_align_predicted_sequence(ref, predicted)
+    assert out == ex_out
+    assert mask == ex_mask
+
+    # tensors are aligned as the lists of their items
+    out, mask = align_predicted_sequence(
+        torch.LongTensor(ref), torch.LongTensor(predicted)
+    )
+    assert [int(i) for i in out] == ex_out
+    assert mask == ex_mask
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_align_chunked_phonemes_sequence_parity(seed):
+    rng = random.Random(seed)
+    vocab = ["a", "b", "cc", "dd", "e"][: rng.randint(2, 5)]
+    ref = [rng.choice(vocab) for _ in range(rng.randint(1, 25))]
+    predicted = random_edit(ref, rng.randint(0, 6), vocab, rng)
+
+    mask = align_chunked_phonemes_sequence(ref, predicted)
+    if len(ref) == len(predicted):
+        assert mask == [True] * len(ref)
+    else:
+        assert mask == loop_align_chunked_phonemes_sequence(ref, predicted)
+        assert len(mask) == len(ref)
+
+
+def test_align_predicted_sequence_empty_predicted():
+    out, mask = align_predicted_sequence([1, 2, 3], [])
+    assert out == [-100, -100, -100]
+    assert mask == []
+
+
+def test_align_chunked_phonemes_sequence_empty_ref():
+    with pytest.raises(ValueError):
+        align_chunked_phonemes_sequence([], ["a"])
+
+
+if __name__ == "__main__":
+    rng = random.Random(0)
+    vocab = list(range(1, 44))
+    # approximate number of phonemes
+    for name, length in [
+        ("aya", 100),
+        ("page", 1000),
+        ("hizb quarter", 2500),
+        ("hizb", 9000),
+    ]:
+        ref = [rng.choice(vocab) for _ in range(length)]
+        predicted = random_edit(ref, length // 20, vocab, rng)
+
+        start = perf_counter()
+        align_predicted_sequence(ref, predicted)
+        bit_parallel_time = perf_counter() - start
+
+        if length <= 2500:
+            start = perf_counter()
+            loop_align_predicted_sequence(ref, predicted)
+            loop_time = perf_counter() - start
+            loop_str = (
+                f"loop: {loop_time * 1000:10.2f} ms, "
+                f"speedup: {loop_time / bit_parallel_time:7.1f}x"
+            )
+        else:
+            loop_str = "loop: skipped (too slow)"
+
+        print(
+            f"{name:>12} ({length:>5} phonemes): "
+            f"bit-parallel: {bit_parallel_time * 1000:8.2f} ms, {loop_str}"
+        )
@@ -0,0 +1,114 @@
+import asyncio
+import io
+import json
+import zipfile
+
+import pytest
+from fastapi.testclient import TestClient
+from quran_transcript import Aya, quran_phonetizer
+
+from quran_muaalem.app import serve
+from quran_muaalem.app.cache import LRUCache
+from quran_muaalem.app.types import DEFAULT_MOSHAF
+
+
+def aya_phonemes(sura_idx: int, aya_idx: int) -> str:
+    uthmani = Aya(sura_idx, aya_idx).get().uthmani
+    return quran_phonetizer(uthmani, DEFAULT_MOSHAF, remove_spaces=True).phonemes
+
+
+@pytest.fixture
+def fake_engine(monkeypatch):
+    """The "audio" of a recording is its phonemes. Records the engine concurrency
+    and the reference phonetizations
+    """
+    stats = {"active": 0, "max_active": 0, "phonetized": []}
+
+    async def predict_audio_bytes(audio_bytes):
+        stats["active"] += 1
+        stats["max_active"] = max(stats["max_active"], stats["active"])
+        await asyncio.sleep(0.01)
+        stats["active"] -= 1
+        if not audio_bytes:
+            raise ValueError("Empty audio")
+        return {"phonemes": audio_bytes.decode()}
+
+    cached_quran_phonetizer = serve.cached_quran_phonetizer
+
+    def phonetizer(uthmani_text, moshaf):
+        stats["phonetized"].append(uthmani_text)
+        return cached_quran_phonetizer(uthmani_text, moshaf)
+
+    monkeypatch.setattr(serve, "predict_audio_bytes", predict_audio_bytes)
+    monkeypatch.setattr(serve, "cached_quran_phonetizer", phonetizer)
+    monkeypatch.setattr(serve, "_search_cache", LRUCache(max_size=8))
+    monkeypatch.setattr(serve, "_search_cache_backend", None)
+    monkeypatch.setattr(serve.app_settings, "executor_backend", "thread")
+    monkeypatch.setattr(serve.app_settings, "batch_max_concurrency", 2)
+    monkeypatch.setattr(serve, "_search_executor", None)
+    monkeypatch.setattr(serve, "_phonetization_executor", None)
+    return stats
+
+
+def post_batch(**kwargs) -> list[dict]:
+    response = TestClient(serve.app).post("/correct-recitation/batch", **kwargs)
+    assert response.status_code == 200, response.text
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    return sorted(lines, key=lambda line: line["index"])
+
+
+def test_batch_files(fake_engine):
+    fatiha_2 = aya_phonemes(1, 2)
+    files = [
+        ("files", (f"{idx}.wav", phonemes.encode(), "audio/wav"))
+        for idx, phonemes in enumerate(
+            [fatiha_2, fatiha_2, aya_phonemes(1, 5), fatiha_2, ""]
+        )
+    ]
+    items = [{}, {"sura_idx": 1, "aya_idx": 2}, {}, {}, {}]
+    lines = post_batch(files=files, data={"items": json.dumps(items)})
+
+    assert [line["name"] for line in lines] == [f"{idx}.wav" for idx in range(5)]
+    for line in lines[:4]:
+        assert line["error"] is None
+        assert line["result"]["errors"] == []
+    assert lines[2]["result"]["start"]["aya_idx"] == 5
+    assert lines[4]["result"] is None and "Empty audio" in lines[4]["error"]
+
+    assert fake_engine["max_active"] == 2
+    # every distinct reference is phonetized once
+    phonetized = fake_engine["phonetized"]
+    assert len(phonetized) == len(set(phonetized)) == 2
+
+
+def test_batch_archive(fake_engine):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        archive.writestr("b.wav", aya_phonemes(1, 3))
+        archive.writestr("a.wav", aya_phonemes(1, 2))
+        archive.writestr("dir/", "")
+    items = [{"name": "b.wav", "sura_idx": 1, "aya_idx": 4}, {"name": "a.wav"}]
+    lines = post_batch(
+        files={"archive": ("batch.zip", buffer.getvalue(), "application/zip")},
+        data={"items": json.dumps(items)},
+    )
+
+    assert [line["name"] for line in lines] == ["a.wav", "b.wav"]
+    assert lines[0]["result"]["errors"] == []
+    # compared to the given aya and not the searched one
+    assert lines[1]["result"]["start"]["aya_idx"] == 4
+    assert lines[1]["result"]["errors"]
+
+
+def test_batch_bad_requests(fake_engine):
+    client = TestClient(serve.app)
+    url = "/correct-recitation/batch"
+    assert client.post(url, data={}).status_code == 422
+
+    files = [("files", ("a.wav", b"x", "audio/wav"))] * 2
+    response = client.post(url, files=files, data={"items": json.dumps([{}])})
+    assert response.status_code == 422
+
+    response = client.post(url, files={"archive": ("a.zip", b"not a zip")})
+    assert response.status_code == 422
@@ -0,0 +1,99 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from quran_muaalem.app.cache import DirectoryCacheBackend, LRUCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_lru_eviction():
+    cache = LRUCache(max_size=2)
+    assert cache.get_or_compute("a", lambda: 1) == 1
+    assert cache.get_or_compute("b", lambda: 2) == 2
+    # "a" becomes the most recently used
+    assert cache.get_or_compute("a", lambda: -1) == 1
+    assert cache.get_or_compute("c", lambda: 3) == 3
+    assert cache.get_or_compute("b", lambda: -2) == -2
+
+    stats = cache.stats()
+    assert (stats.size, stats.hits, stats.misses, stats.evictions) == (2, 1, 4, 2)
+    assert stats.to_dict()["hit_ratio"] == 0.2
+
+
+def test_ttl():
+    clock = Clock()
+    cache = LRUCache(max_size=10, ttl=5.0, clock=clock)
+    assert cache.get_or_compute("a", lambda: 1) == 1
+    clock.now = 4.9
+    assert cache.get_or_compute("a", lambda: 2) == 1
+    clock.now = 5.0
+    assert cache.get_or_compute("a", lambda: 2) == 2
+    assert len(cache) == 1
+
+
+def test_disabled():
+    cache = LRUCache(max_size=0)
+    assert cache.get_or_compute("a", lambda: 1) == 1
+    assert cache.get_or_compute("a", lambda: 2) == 2
+    assert len(cache) == 0
+
+
+def test_threads():
+    cache = LRUCache(max_size=8)
+    with ThreadPoolExecutor(8) as executor:
+        results = list(
+            executor.map(
+                lambda idx: cache.get_or_compute(idx % 16, lambda: idx % 16),
+                range(2000),
+            )
+        )
+    assert results == [idx % 16 for idx in range(2000)]
+    stats = cache.stats()
+    assert stats.size == 8
+    assert stats.hits + stats.misses == 2000
+
+
+def test_directory_backend(tmp_path, monkeypatch):
+    backend = DirectoryCacheBackend(str(tmp_path), ttl=10.0)
+    assert backend.get("a") is None
+    backend.set("a", b"value")
+    # another replica sharing the directory
+    assert DirectoryCacheBackend(str(tmp_path)).get("a") == b"value"
+    assert backend.get("a") == b"value"
+    assert backend.stats() == {"hits": 1, "misses": 1, "hit_ratio": 0.5}
+
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 10.0)
+    assert backend.get("a") is None
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_cached_phonetic_search(tmp_path, monkeypatch):
+    from quran_muaalem.app import serve
+
+    monkeypatch.setattr(serve, "_search_cache", LRUCache(max_size=8))
+    monkeypatch.setattr(
+        serve, "_search_cache_backend", DirectoryCacheBackend(str(tmp_path))
+    )
+    monkeypatch.setattr(serve.app_settings, "executor_backend", "thread")
+    monkeypatch.setattr(serve, "_search_executor", None)
+    phonemes = "بِسمِللَاهِررَحمَاانِررَحِۦۦم"
+
+    out = asyncio.run(serve.cached_phonetic_search(phonemes, 0.1))
+    assert out == serve.run_phonetic_search(phonemes, 0.1)
+    assert asyncio.run(serve.cached_phonetic_search(phonemes, 0.1)) is out
+    stats = serve._search_cache.stats()
+    assert (stats.hits, stats.misses) == (1, 1)
+
+    # an app replica with an empty local cache reads the shared one
+    monkeypatch.setattr(serve, "_search_cache", LRUCache(max_size=8))
+    assert asyncio.run(serve.cached_phonetic_search(phonemes, 0.1)) == out
+    assert serve._search_cache_backend.stats()["hits"] == 1
+    serve.shutdown_executors()
@@ -0,0 +1,103 @@
+import asyncio
+
+import httpx
+import pytest
+
+from quran_muaalem.app import serve
+from quran_muaalem.app.balancer import EngineBalancer
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    """Replaces the engine client with a mock that returns the queued responses"""
+    responses = []
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        response = responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(serve, "_engine_client", client)
+    monkeypatch.setattr(
+        serve, "_engine_balancer", EngineBalancer(["http://engine/predict"])
+    )
+    monkeypatch.setattr(serve.app_settings, "engine_retries", 2)
+    monkeypatch.setattr(serve.app_settings, "engine_retry_backoff", 0.0)
+    return responses, requests
+
+
+def test_request_engine_retries(engine):
+    responses, requests = engine
+    responses += [
+        httpx.ConnectError("refused"),
+        httpx.Response(503),
+        httpx.Response(200, json={"ok": True}),
+    ]
+    response = asyncio.run(serve.request_engine("POST"))
+    assert response.json() == {"ok": True}
+    assert len(requests) == 3
+
+
+def test_request_engine_gives_up(engine):
+    responses, requests = engine
+    responses += [httpx.Response(503)] * 3
+    response = asyncio.run(serve.request_engine("POST"))
+    assert response.status_code == 503
+    assert len(requests) == 3
+
+    responses += [httpx.ReadTimeout("timeout")] * 3
+    with pytest.raises(httpx.ReadTimeout):
+        asyncio.run(serve.request_engine("POST"))
+
+
+def test_request_engine_does_not_retry_client_errors(engine):
+    responses, requests = engine
+    responses += [httpx.Response(400)]
+    response = asyncio.run(serve.request_engine("POST"))
+    assert response.status_code == 400
+    assert len(requests) == 1
+
+
+def test_request_engine_fails_over(monkeypatch):
+    def handler(request):
+        if request.url.host == "dead":
+            raise httpx.ConnectError("refused")
+        return httpx.Response(200)
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    balancer = EngineBalancer(
+        ["http://dead/predict", "http://alive/predict"], failure_threshold=1
+    )
+    monkeypatch.setattr(serve, "_engine_client", client)
+    monkeypatch.setattr(serve, "_engine_balancer", balancer)
+    monkeypatch.setattr(serve.app_settings, "engine_retry_backoff", 0.0)
+
+    for _ in range(3):
+        response = asyncio.run(serve.request_engine("POST"))
+        assert response.request.url.host == "alive"
+    dead, alive = balancer.engines
+    assert dead.failures == 1
+    assert dead.outstanding == alive.outstanding == 0
+
+    statuses = asyncio.run(serve.check_engines_health())
+    assert statuses == {"http://dead/predict": False, "http://alive/predict": True}
+
+
+def test_lifespan_closes_client(monkeypatch):
+    monkeypatch.setattr(serve, "_engine_client", None)
+    monkeypatch.setattr(serve.app_settings, "engine_health_check_interval", 0.01)
+
+    async def run():
+        async with serve.lifespan(serve.app):
+            client = serve.get_engine_client()
+            assert serve.get_engine_client() is client
+            await asyncio.sleep(0.05)
+        return client
+
+    client = asyncio.run(run())
+    assert client.is_closed
+    assert serve._engine_client is None
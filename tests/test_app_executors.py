@@ -0,0 +1,87 @@
+import asyncio
+import time
+from concurrent.futures import Executor
+
+import pytest
+from quran_transcript import Aya, quran_phonetizer
+
+from quran_muaalem.app import serve
+from quran_muaalem.app.types import DEFAULT_MOSHAF
+
+
+def make_queries(num_queries: int) -> list[str]:
+    queries = []
+    aya = Aya(2, 1)
+    for idx in range(num_queries):
+        phonemes = quran_phonetizer(
+            aya.get().uthmani, DEFAULT_MOSHAF, remove_spaces=True
+        ).phonemes
+        queries.append(phonemes[:60])
+        aya = aya.step(7)
+    return queries
+
+
+@pytest.fixture
+def process_backend(monkeypatch):
+    monkeypatch.setattr(serve.app_settings, "executor_backend", "process")
+    monkeypatch.setattr(serve.app_settings, "max_workers_phonetic_search", 2)
+    monkeypatch.setattr(serve.app_settings, "max_workers_phonetization", 1)
+    monkeypatch.setattr(serve, "_search_executor", None)
+    monkeypatch.setattr(serve, "_phonetization_executor", None)
+    yield
+    serve.shutdown_executors()
+
+
+@pytest.mark.slow
+def test_process_backend_matches_thread(process_backend):
+    queries = make_queries(3)
+    uthmani = Aya(1, 2).get().uthmani
+    predicted = queries[0][:-3]
+
+    async def run():
+        await serve.start_executors()
+        loop = asyncio.get_running_loop()
+        searches = [
+            loop.run_in_executor(
+                serve.get_search_executor(), serve.run_phonetic_search, query, 0.1
+            )
+            for query in queries
+        ]
+        explanation = loop.run_in_executor(
+            serve.get_phonetization_executor(),
+            serve.run_phonetization_and_error,
+            uthmani,
+            DEFAULT_MOSHAF,
+            predicted,
+        )
+        return await asyncio.gather(*searches), await explanation
+
+    search_outs, explanation = asyncio.run(run())
+    assert search_outs == [serve.run_phonetic_search(q, 0.1) for q in queries]
+    assert explanation == serve.run_phonetization_and_error(
+        uthmani, DEFAULT_MOSHAF, predicted
+    )
+
+
+def run_benchmark(executor: Executor, queries: list[str]) -> float:
+    start = time.perf_counter()
+    list(executor.map(serve.run_phonetic_search, queries, [0.1] * len(queries)))
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    import os
+
+    queries = make_queries(200)
+    for backend in ["thread", "process"]:
+        serve.app_settings.executor_backend = backend
+        for num_workers in sorted({1, 2, 4, os.cpu_count() or 1}):
+            executor = serve.make_executor(num_workers)
+            # start and warm the workers
+            run_benchmark(executor, queries[: num_workers * 2])
+            elapsed = run_benchmark(executor, queries)
+            executor.shutdown()
+            print(
+                f"{backend:8} workers={num_workers:2}: "
+                f"{len(queries) / elapsed:7.1f} searches/s"
+            )
@@ -0,0 +1,87 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from quran_muaalem.audio_cache import AudioCache, audio_key
+
+
+class CountingLoad:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, audio_bytes, sampling_rate, max_audio_seconds):
+        self.calls += 1
+        if not audio_bytes:
+            raise ValueError("Empty audio")
+        return np.frombuffer(audio_bytes, dtype=np.uint8).astype(np.float32)
+
+
+def test_memory_tier():
+    cache = AudioCache(max_size=2)
+    load = CountingLoad()
+    a = cache.get_or_load(b"a", load, 16000, 15)
+    assert cache.get_or_load(b"a", load, 16000, 15) is a
+    # other decoding options are another item
+    cache.get_or_load(b"a", load, 8000, 15)
+    assert load.calls == 2
+
+    cache.get_or_load(b"b", load, 16000, 15)
+    cache.get_or_load(b"a", load, 16000, 15)
+    assert load.calls == 4
+    assert cache.stats()["hits"] == 1
+
+
+def test_disk_tier(tmp_path):
+    load = CountingLoad()
+    AudioCache(max_size=0, directory=str(tmp_path)).get_or_load(
+        b"abc", load, 16000, 15
+    )
+    # another worker process or a restart
+    cache = AudioCache(max_size=4, directory=str(tmp_path))
+    wave = cache.get_or_load(b"abc", load, 16000, 15)
+    assert load.calls == 1
+    assert isinstance(wave, np.memmap)
+    np.testing.assert_array_equal(wave, [97, 98, 99])
+    assert cache.stats()["disk_hits"] == 1
+    assert not [name for name in os.listdir(tmp_path) if name.startswith(".tmp")]
+
+
+def test_disk_eviction(tmp_path):
+    cache = AudioCache(max_size=0, directory=str(tmp_path), max_disk_bytes=1000)
+    load = CountingLoad()
+    for idx in range(5):
+        cache.get_or_load(bytes([idx]) * 100, load, 16000, 15)
+        path = tmp_path / f"{audio_key(bytes([idx]) * 100, 16000, 15)}.npy"
+        os.utime(path, (idx, idx))
+    assert cache.stats()["disk_bytes"] <= 1000
+    # the most recent wave is kept
+    cache.get_or_load(bytes([4]) * 100, load, 16000, 15)
+    assert load.calls == 5
+
+
+def test_disk_bytes_of_replaced_files(tmp_path):
+    cache = AudioCache(max_size=0, directory=str(tmp_path))
+    cache.set("a", np.zeros(100))
+    cache.set("a", np.zeros(50))
+    cache.set("b", np.zeros(10))
+    ex_bytes = sum(os.path.getsize(tmp_path / f"{key}.npy") for key in "ab")
+    assert cache.stats()["disk_bytes"] == ex_bytes
+    # the count of a restarted cache
+    assert AudioCache(directory=str(tmp_path)).stats()["disk_bytes"] == ex_bytes
+
+
+def test_submit():
+    cache = AudioCache()
+    load = CountingLoad()
+    with ThreadPoolExecutor(1) as executor:
+        wave = cache.submit(executor, b"ab", load, 16000, 15).result()
+        future = cache.submit(executor, b"ab", load, 16000, 15)
+        assert future.done() and future.result() is wave
+
+        for _ in range(2):
+            with pytest.raises(ValueError):
+                cache.submit(executor, b"", load, 16000, 15).result()
+    # failures are not cached
+    assert load.calls == 3
@@ -0,0 +1,74 @@
+import io
+
+import librosa
+import numpy as np
+import pytest
+import soundfile as sf
+
+from quran_muaalem.audio_decode import decode_audio, read_wav
+
+
+def encode(wave, sampling_rate, format="WAV", subtype="PCM_16") -> bytes:
+    buffer = io.BytesIO()
+    sf.write(buffer, wave, sampling_rate, format=format, subtype=subtype)
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def wave():
+    rng = np.random.default_rng(0)
+    return (rng.standard_normal(16000 * 3) * 0.1).astype(np.float32)
+
+
+@pytest.mark.parametrize(
+    "sampling_rate, format, subtype, channels",
+    [
+        (16000, "WAV", "PCM_16", 1),
+        (16000, "WAV", "PCM_U8", 1),
+        (16000, "WAV", "PCM_32", 2),
+        (16000, "WAV", "FLOAT", 3),
+        (16000, "WAV", "PCM_24", 1),
+        (44100, "WAV", "PCM_16", 2),
+        (16000, "FLAC", "PCM_16", 1),
+        (8000, "FLAC", "PCM_24", 2),
+    ],
+)
+def test_same_as_librosa(wave, sampling_rate, format, subtype, channels):
+    audio = np.stack([wave * (idx + 1) / 4 for idx in range(channels)], axis=1)
+    audio_bytes = encode(audio, sampling_rate, format, subtype)
+    for max_audio_seconds in [None, 1.5]:
+        ex_wave, _ = librosa.load(
+            io.BytesIO(audio_bytes), sr=16000, mono=True, duration=max_audio_seconds
+        )
+        decoded = decode_audio(audio_bytes, 16000, max_audio_seconds)
+        assert decoded.dtype == np.float32
+        assert decoded.shape == ex_wave.shape
+        np.testing.assert_allclose(decoded, ex_wave, atol=1e-5)
+
+
+def test_read_wav(wave):
+    audio_bytes = encode(wave, 16000)
+    decoded, sampling_rate = read_wav(audio_bytes, max_audio_seconds=1.0)
+    assert sampling_rate == 16000 and decoded.shape == (16000, 1)
+    assert decoded.flags.writeable
+
+    # a streamed recording with a wrong data size in the header
+    decoded, _ = read_wav(audio_bytes[:-100])
+    assert len(decoded) == len(wave) - 50
+
+    assert read_wav(encode(wave, 16000, subtype="PCM_24")) is None
+    assert read_wav(encode(wave, 16000, format="FLAC")) is None
+
+
+def test_fast_resampler():
+    tone = np.sin(2 * np.pi * 440 * np.arange(44100) / 44100).astype(np.float32)
+    audio_bytes = encode(tone * 0.5, 44100)
+    fast = decode_audio(audio_bytes, 16000, resampler="fast")
+    quality = decode_audio(audio_bytes, 16000, resampler="quality")
+    assert fast.shape == quality.shape
+    assert np.abs(fast - quality).mean() < 0.01
+
+
+def test_not_audio():
+    with pytest.raises(Exception):
+        decode_audio(b"not an audio file", 16000, 15)
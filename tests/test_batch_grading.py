@@ -0,0 +1,236 @@
+import json
+import wave
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from quran_muaalem import batch_grading
+from quran_muaalem.batch_grading import (
+    GradingItem,
+    JsonlResults,
+    ParquetResults,
+    grade,
+    read_manifest,
+    scan_directory,
+)
+from quran_muaalem.muaalem_typing import DEFAULT_MOSHAF, MuaalemOutput, Unit
+
+
+def write_wav(path, seconds: float = 0.5):
+    samples = (np.sin(np.arange(int(16000 * seconds)) / 10) * 3000).astype("<i2")
+    with wave.open(str(path), "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(16000)
+        f.writeframes(samples.tobytes())
+
+
+class FakeMuaalem:
+    """Predicts the reference phonemes without the last phoneme"""
+
+    def __init__(self):
+        self.batch_sizes = []
+
+    def __call__(self, waves, refs, sampling_rate, **kwargs):
+        self.batch_sizes.append(len(waves))
+        return [
+            MuaalemOutput(
+                phonemes=Unit(
+                    text=ref.phonemes[:-1],
+                    probs=[0.5] * (len(ref.phonemes) - 1),
+                    ids=[],
+                ),
+                sifat=[],
+            )
+            for ref in refs
+        ]
+
+
+def test_read_manifest(tmp_path):
+    (tmp_path / "manifest.csv").write_text(
+        "path,sura_idx,aya_idx,start_word,num_words,moshaf,id\n"
+        "a.wav,1,2,,,,\n"
+        "/abs/b.wav,2,255,1,3,mujawad,b-1\n"
+    )
+    assert read_manifest(tmp_path / "manifest.csv") == [
+        GradingItem(str(tmp_path / "a.wav"), 1, 2),
+        GradingItem("/abs/b.wav", 2, 255, 1, 3, "mujawad", "b-1"),
+    ]
+
+    (tmp_path / "manifest.jsonl").write_text(
+        json.dumps({"path": "a.wav", "sura_idx": 1, "aya_idx": 2}) + "\n\n"
+    )
+    assert read_manifest(tmp_path / "manifest.jsonl") == [
+        GradingItem(str(tmp_path / "a.wav"), 1, 2)
+    ]
+
+
+def test_scan_directory(tmp_path):
+    for name in ["001002.wav", "sub/002255_3.mp3", "notes.txt", "intro.wav"]:
+        (tmp_path / name).parent.mkdir(exist_ok=True)
+        (tmp_path / name).write_bytes(b"")
+    items = scan_directory(tmp_path)
+    assert [(i.sura_idx, i.aya_idx) for i in items] == [(1, 2), (2, 255)]
+
+
+def test_jsonl_results_resume(tmp_path):
+    results = JsonlResults(tmp_path / "out.jsonl")
+    assert results.done_keys() == set()
+    results.write([{"key": "a"}, {"key": "b"}])
+    # a crash in the middle of a line
+    with open(results.path, "a") as f:
+        f.write('{"key": "c"}')
+    assert results.done_keys() == {"a", "b"}
+    results.write([{"key": "c"}])
+    assert results.done_keys() == {"a", "b", "c"}
+
+
+@pytest.fixture
+def items(tmp_path):
+    items = []
+    for idx, (sura_idx, aya_idx) in enumerate([(1, 2), (1, 3), (112, 1)]):
+        path = tmp_path / f"{idx}.wav"
+        write_wav(path)
+        items.append(GradingItem(str(path), sura_idx, aya_idx))
+    items.append(GradingItem(str(tmp_path / "missing.wav"), 1, 1))
+    # the same recording graded against another reference
+    items.append(GradingItem(str(tmp_path / "0.wav"), 2, 255, 0, 3, id="0-words"))
+    return items
+
+
+def test_grade(tmp_path, items):
+    results = JsonlResults(tmp_path / "out.jsonl")
+    model = FakeMuaalem()
+    with ProcessPoolExecutor(2) as executor:
+        num_graded = grade(items[:2], results, model, executor, chunk_size=2)
+        assert num_graded == 2
+        # resumes after the written items
+        num_graded = grade(items, results, model, executor, chunk_size=2)
+        assert num_graded == 3
+    assert model.batch_sizes == [2, 1, 1]
+
+    rows = [json.loads(line) for line in results.path.read_text().splitlines()]
+    assert [row["key"] for row in rows] == [item.key for item in items]
+    for row in rows[:3] + rows[4:]:
+        assert row["error"] is None
+        assert row["predicted_phonemes"] == row["reference_phonemes"][:-1]
+        assert row["num_errors"] == len(row["errors"]) >= 1
+        assert row["phonemes_mean_prob"] == pytest.approx(0.5)
+    assert rows[3]["error"] is not None and rows[3]["predicted_phonemes"] is None
+    assert rows[4]["uthmani_text"].count(" ") == 2
+
+
+def test_parquet_results_roundtrip(tmp_path, items):
+    pq = pytest.importorskip("pyarrow.parquet")
+    results = ParquetResults(tmp_path / "parts")
+    # the first part has only the missing recording so all its columns but the
+    # item fields are empty
+    items = [items[3], items[0], items[4]]
+    with ProcessPoolExecutor(2) as executor:
+        assert grade(items, results, FakeMuaalem(), executor, chunk_size=1) == 3
+        assert grade(items, results, FakeMuaalem(), executor, chunk_size=1) == 0
+
+    table = pq.read_table(results.directory)
+    assert table.schema == ParquetResults.schema()
+    key_to_row = {row["key"]: row for row in table.to_pylist()}
+    rows = [key_to_row[item.key] for item in items]
+    assert len(key_to_row) == 3
+    assert rows[0]["error"] is not None and rows[0]["predicted_phonemes"] is None
+    for row in rows[1:]:
+        assert row["error"] is None
+        assert row["phonemes_mean_prob"] == pytest.approx(0.5)
+        assert row["num_errors"] == len(json.loads(row["errors"])) >= 1
+
+
+def test_grade_item_failures(tmp_path, items, monkeypatch):
+    explain_item = batch_grading.explain_item
+
+    def failing_explain_item(uthmani, ref, predicted_phonemes):
+        if uthmani == items_uthmani[1]:
+            raise RuntimeError("explain failed")
+        return explain_item(uthmani, ref, predicted_phonemes)
+
+    class FailingMuaalem(FakeMuaalem):
+        # fails on any batch with the third item
+        def __call__(self, waves, refs, sampling_rate, **kwargs):
+            if any(ref.phonemes == failing_ref for ref in refs):
+                raise RuntimeError("model failed")
+            return super().__call__(waves, refs, sampling_rate, **kwargs)
+
+    items = items[:3]
+    prepared = [
+        batch_grading.prepare_item(item, DEFAULT_MOSHAF.model_dump())
+        for item in items
+    ]
+    items_uthmani = [p["uthmani"] for p in prepared]
+    failing_ref = prepared[2]["ref"].phonemes
+    monkeypatch.setattr(batch_grading, "explain_item", failing_explain_item)
+
+    results = JsonlResults(tmp_path / "out.jsonl")
+    with ThreadPoolExecutor(2) as executor:
+        assert grade(items, results, FailingMuaalem(), executor, chunk_size=3) == 3
+        # the failed items are not graded again on resume
+        assert grade(items, results, FailingMuaalem(), executor) == 0
+
+    rows = [json.loads(line) for line in results.path.read_text().splitlines()]
+    assert [row["key"] for row in rows] == [item.key for item in items]
+    assert rows[0]["error"] is None and rows[0]["num_errors"] >= 1
+    assert "explain failed" in rows[1]["error"] and rows[1]["errors"] is None
+    assert "model failed" in rows[2]["error"] and rows[2]["predicted_phonemes"] is None
+
+
+def test_moshaf_profiles(tmp_path, items):
+    results = JsonlResults(tmp_path / "out.jsonl")
+    items = [
+        GradingItem(items[0].path, 2, 4),
+        GradingItem(items[0].path, 2, 4, moshaf="short_madd", id="short_madd"),
+    ]
+    with ProcessPoolExecutor(1) as executor:
+        grade(
+            items,
+            results,
+            FakeMuaalem(),
+            executor,
+            moshaf_profiles={"short_madd": {"madd_monfasel_len": 2}},
+        )
+    rows = [json.loads(line) for line in results.path.read_text().splitlines()]
+    assert rows[0]["reference_phonemes"] != rows[1]["reference_phonemes"]
+
+
+def test_main_rejects_unknown_profiles(tmp_path, monkeypatch):
+    (tmp_path / "manifest.csv").write_text("path,sura_idx,aya_idx,moshaf\na,1,1,x\n")
+    monkeypatch.setattr(
+        "sys.argv",
+        ["quran-muaalem-batch", str(tmp_path / "manifest.csv"), str(tmp_path / "o")],
+    )
+    monkeypatch.setattr(batch_grading, "Muaalem", None)
+    with pytest.raises(SystemExit):
+        batch_grading.main()
+
+
+@pytest.mark.parametrize(
+    "args, ex_threads, ex_workers",
+    [([], 4, 4), (["--torch-threads", "2"], 2, 6), (["--num-workers", "3"], 4, 3)],
+)
+def test_main_splits_the_cores(tmp_path, monkeypatch, args, ex_threads, ex_workers):
+    (tmp_path / "manifest.csv").write_text("path,sura_idx,aya_idx\na,1,1\n")
+    monkeypatch.setattr(
+        "sys.argv",
+        ["quran-muaalem-batch", str(tmp_path / "manifest.csv"), str(tmp_path / "o")]
+        + args,
+    )
+    used = {}
+    monkeypatch.setattr(batch_grading.os, "cpu_count", lambda: 8)
+    monkeypatch.setattr(
+        batch_grading.torch, "set_num_threads", lambda n: used.update(threads=n)
+    )
+    monkeypatch.setattr(batch_grading, "Muaalem", lambda *args, **kwargs: None)
+    monkeypatch.setattr(
+        batch_grading,
+        "ProcessPoolExecutor",
+        lambda n: used.update(workers=n) or ThreadPoolExecutor(1),
+    )
+    monkeypatch.setattr(batch_grading, "grade", lambda *args, **kwargs: 0)
+    batch_grading.main()
+    assert used == {"threads": ex_threads, "workers": ex_workers}
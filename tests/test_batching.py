@@ -0,0 +1,76 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from quran_muaalem.batching import bucket_by_length
+
+
+@pytest.mark.parametrize(
+    "lengths, max_padding_ratio, max_batch_samples, ex_buckets",
+    [
+        ([], 0.2, None, []),
+        ([10], 0.2, None, [[0]]),
+        # similar lengths share a bucket
+        ([16, 480, 17, 15], 0.2, None, [[3, 0, 2], [1]]),
+        # no padding allowed
+        ([5, 5, 6], 0.0, None, [[0, 1], [2]]),
+        # padding ratio of 1.0 is a single batch
+        ([16, 480, 17, 15], 1.0, None, [[3, 0, 2, 1]]),
+        # max batch samples
+        ([10, 10, 10, 10], 1.0, 20, [[0, 1], [2, 3]]),
+        # an input longer than max batch samples is placed alone
+        ([10, 50, 10], 1.0, 20, [[0, 2], [1]]),
+    ],
+)
+def test_bucket_by_length(lengths, max_padding_ratio, max_batch_samples, ex_buckets):
+    buckets, stats = bucket_by_length(
+        lengths,
+        max_padding_ratio=max_padding_ratio,
+        max_batch_samples=max_batch_samples,
+    )
+    assert buckets == ex_buckets
+    assert sorted(idx for bucket in buckets for idx in bucket) == list(
+        range(len(lengths))
+    )
+    assert stats.num_buckets == len(ex_buckets)
+    assert stats.bucket_sizes == [len(b) for b in ex_buckets]
+    assert stats.real_samples == sum(lengths)
+    for bucket in buckets:
+        padded = max(lengths[idx] for idx in bucket) * len(bucket)
+        real = sum(lengths[idx] for idx in bucket)
+        assert 1 - real / padded <= max_padding_ratio or len(bucket) == 1
+
+
+def test_bucket_stats():
+    _, stats = bucket_by_length([16, 480, 17, 15], max_padding_ratio=0.2)
+    assert stats.bucket_max_lens == [17, 480]
+    assert stats.padded_samples == 17 * 3 + 480
+    assert stats.unbucketed_padded_samples == 480 * 4
+    assert stats.padding_ratio == pytest.approx(1 - 528 / 531)
+    assert stats.unbucketed_padding_ratio == pytest.approx(1 - 528 / 1920)
+
+
+def test_bucket_by_length_invalid_ratio():
+    with pytest.raises(ValueError):
+        bucket_by_length([1, 2], max_padding_ratio=1.5)
+
+
+def test_muaalem_buckets_are_opt_in(monkeypatch):
+    from quran_muaalem.inference import Muaalem
+
+    model = Muaalem.__new__(Muaalem)
+    batches = []
+
+    def infer_batch(waves, refs, sampling_rate, return_level_to_probs):
+        batches.append([len(wave) for wave in waves])
+        return [SimpleNamespace() for _ in waves]
+
+    monkeypatch.setattr(model, "_infer_batch", infer_batch, raising=False)
+    waves = [np.zeros(n) for n in [16000, 160000, 17000]]
+    model(waves, [None] * 3, sampling_rate=16000)
+    assert [sorted(batch) for batch in batches] == [[16000, 17000, 160000]]
+
+    batches.clear()
+    model(waves, [None] * 3, sampling_rate=16000, max_padding_ratio=0.2)
+    assert [sorted(batch) for batch in batches] == [[16000, 17000], [160000]]
@@ -0,0 +1,174 @@
+from time import perf_counter
+
+import torch
+import pytest
+
+from quran_muaalem.decode import ctc_decode, CTCDecodeOut
+
+
+def loop_ctc_decode(
+    batch_ids: torch.LongTensor,
+    batch_probs: torch.FloatTensor,
+    blank_id=0,
+) -> list[CTCDecodeOut]:
+    """The original frame by frame `ctc_decode` used as a reference"""
+    outs = []
+    for seq_idx, seq in enumerate(batch_ids):
+        tokens = []
+        probs = []
+        start = 0
+        end = 0
+        if len(seq) == 1 and seq[0] != blank_id:
+            tokens.append(seq[0])
+            probs.append(batch_probs[seq_idx][0])
+
+        for idx in range(len(seq) - 1):
+            curr = seq[idx]
+            next = seq[idx + 1]
+            # Last Item
+            if idx == len(seq) - 2 and curr != blank_id:
+                if curr == next:
+                    end = idx + 2
+                    tokens.append(curr)
+                    probs.append(batch_probs[seq_idx][start:end].sum() / (end - start))
+                elif curr != next:
+                    end = idx + 1
+                    tokens.append(curr)
+                    probs.append(batch_probs[seq_idx][start:end].sum() / (end - start))
+                    tokens.append(next)
+                    probs.append(batch_probs[seq_idx][idx + 1])
+            # Normal Case
+            elif curr != next and curr != blank_id:
+                end = idx + 1
+                tokens.append(curr)
+                probs.append(batch_probs[seq_idx][start:end].sum() / (end - start))
+                start = end
+            elif curr == blank_id:
+                start = idx + 1
+
+        outs.append(
+            CTCDecodeOut(
+                ids=torch.LongTensor(tokens),
+                p=torch.FloatTensor(probs),
+            )
+        )
+    return outs
+
+
+def random_ctc_batch(
+    batch_size: int, seq_len: int, vocab_size: int = 8, seed: int = 0
+) -> tuple[torch.LongTensor, torch.FloatTensor]:
+    """Random CTC like batch with long runs of blanks and repeated ids"""
+    gen = torch.Generator().manual_seed(seed)
+    run_ids = torch.randint(0, vocab_size, (batch_size, seq_len), generator=gen)
+    # half of the runs are blanks as in real model outputs
+    run_ids[torch.rand(batch_size, seq_len, generator=gen) < 0.5] = 0
+    repeats = torch.randint(1, 4, (batch_size, seq_len), generator=gen)
+    batch_ids = torch.stack(
+        [
+            torch.repeat_interleave(ids, reps)[:seq_len]
+            for ids, reps in zip(run_ids, repeats)
+        ]
+    )
+    batch_probs = torch.rand(batch_size, seq_len, generator=gen)
+    return batch_ids, batch_probs
+
+
+@pytest.mark.parametrize("seq_len", [2, 3, 10, 57, 300])
+@pytest.mark.parametrize("seed", range(5))
+def test_ctc_decode_parity(seq_len, seed):
+    batch_ids, batch_probs = random_ctc_batch(4, seq_len, seed=seed)
+    # The reference is only valid when the last two frames belong to the same run
+    batch_ids[:, -1] = batch_ids[:, -2]
+
+    outs = ctc_decode(batch_ids, batch_probs)
+    ex_outs = loop_ctc_decode(batch_ids, batch_probs)
+
+    assert len(outs) == len(ex_outs)
+    for out, ex_out in zip(outs, ex_outs):
+        torch.testing.assert_close(out.ids, ex_out.ids)
+        torch.testing.assert_close(out.p, ex_out.p)
+
+
+@pytest.mark.parametrize(
+    "batch_ids, batch_probs, ex_batch_ids, ex_batch_probs",
+    [
+        # trailing blank must not be decoded as a zero id
+        (
+            [[1, 1, 2, 0]],
+            [[0.2, 0.4, 0.5, 0.9]],
+            [[1, 2]],
+            [[0.3, 0.5]],
+        ),
+        # token after a trailing blank must not be dropped
+        (
+            [[1, 0, 2]],
+            [[0.2, 0.9, 0.5]],
+            [[1, 2]],
+            [[0.2, 0.5]],
+        ),
+        # all blanks
+        (
+            [[0, 0, 0], [0, 0, 0]],
+            [[0.2, 0.9, 0.5], [0.2, 0.9, 0.5]],
+            [[], []],
+            [[], []],
+        ),
+        # repeated ids separated by a blank are kept
+        (
+            [[3, 3, 0, 3], [0, 0, 0, 4]],
+            [[0.2, 0.6, 0.9, 0.5], [0.1, 0.1, 0.1, 0.7]],
+            [[3, 3], [4]],
+            [[0.4, 0.5], [0.7]],
+        ),
+    ],
+)
+def test_ctc_decode_trailing_frames(
+    batch_ids, batch_probs, ex_batch_ids, ex_batch_probs
+):
+    outs = ctc_decode(torch.LongTensor(batch_ids), torch.FloatTensor(batch_probs))
+    for idx in range(len(batch_ids)):
+        torch.testing.assert_close(outs[idx].ids, torch.LongTensor(ex_batch_ids[idx]))
+        torch.testing.assert_close(outs[idx].p, torch.FloatTensor(ex_batch_probs[idx]))
+
+
+@pytest.mark.parametrize("batch_size, seq_len", [(0, 5), (0, 0), (2, 0)])
+def test_ctc_decode_empty(batch_size, seq_len):
+    batch_ids = torch.zeros(batch_size, seq_len, dtype=torch.long)
+    outs = ctc_decode(batch_ids, torch.rand(batch_size, seq_len))
+    assert len(outs) == len(loop_ctc_decode(batch_ids, batch_ids.float())) == batch_size
+    assert all(len(out.ids) == len(out.p) == 0 for out in outs)
+
+
+def test_ctc_decode_no_collapse():
+    outs = ctc_decode(
+        torch.LongTensor([[1, 1, 0, 2]]),
+        torch.FloatTensor([[0.2, 0.4, 0.5, 0.9]]),
+        collapse_consecutive=False,
+    )
+    torch.testing.assert_close(outs[0].ids, torch.LongTensor([1, 1, 2]))
+    torch.testing.assert_close(outs[0].p, torch.FloatTensor([0.2, 0.4, 0.9]))
+
+
+if __name__ == "__main__":
+    # The model outputs 50 frames per second of audio
+    frames_per_second = 50
+    batch_size = 16
+    for seconds in [1, 5, 15, 30, 60]:
+        batch_ids, batch_probs = random_ctc_batch(
+            batch_size, seconds * frames_per_second
+        )
+
+        start = perf_counter()
+        loop_ctc_decode(batch_ids, batch_probs)
+        loop_time = perf_counter() - start
+
+        start = perf_counter()
+        ctc_decode(batch_ids, batch_probs)
+        vectorized_time = perf_counter() - start
+
+        print(
+            f"{seconds:>3}s x {batch_size}: loop: {loop_time * 1000:9.2f} ms, "
+            f"vectorized: {vectorized_time * 1000:7.2f} ms, "
+            f"speedup: {loop_time / vectorized_time:7.1f}x"
+        )
@@ -0,0 +1,93 @@
+import random
+
+import pytest
+
+from quran_muaalem.app.balancer import EngineBalancer, engine_health_url
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+URLS = [f"http://engine-{idx}:8000/predict" for idx in range(4)]
+
+
+def test_health_url():
+    assert engine_health_url(URLS[0]) == "http://engine-0:8000/health"
+
+
+def test_no_urls():
+    with pytest.raises(ValueError):
+        EngineBalancer([])
+
+
+def test_least_outstanding():
+    balancer = EngineBalancer(URLS[:3])
+    engines = [balancer.acquire() for _ in range(6)]
+    assert [e.outstanding for e in balancer.engines] == [2, 2, 2]
+
+    balancer.release(engines[1])
+    assert balancer.acquire() is engines[1]
+
+    for engine in engines:
+        balancer.release(engine)
+    assert [e.outstanding for e in balancer.engines] == [0, 0, 0]
+
+
+def test_ties_go_to_the_faster_engine():
+    balancer = EngineBalancer(URLS[:2])
+    balancer.record_success(balancer.engines[0], 0.5)
+    balancer.record_success(balancer.engines[1], 0.1)
+    assert balancer.acquire() is balancer.engines[1]
+    # moving average
+    balancer.record_success(balancer.engines[0], 1.5)
+    assert balancer.engines[0].latency == pytest.approx(0.8)
+
+
+def test_power_of_two_avoids_the_busiest():
+    balancer = EngineBalancer(URLS, routing="power_of_two", rng=random.Random(0))
+    busy = balancer.engines[0]
+    busy.outstanding = 100
+    for _ in range(50):
+        engine = balancer.acquire()
+        assert engine is not busy
+        balancer.release(engine)
+
+
+def test_failures_mark_engine_down():
+    clock = Clock()
+    balancer = EngineBalancer(
+        URLS[:2], failure_threshold=2, cooldown=5.0, clock=clock
+    )
+    bad, good = balancer.engines
+    good.outstanding = 10
+
+    balancer.record_failure(bad)
+    assert balancer.acquire() is bad
+    balancer.release(bad)
+
+    balancer.record_failure(bad)
+    assert balancer.healthy_engines() == [good]
+    assert balancer.acquire() is good
+
+    # tried again after the cooldown
+    clock.now = 5.0
+    assert balancer.acquire() is bad
+    balancer.record_success(bad, 0.1)
+    assert bad.failures == 0 and bad.down_until == 0.0
+
+
+def test_all_down_still_routes():
+    clock = Clock()
+    balancer = EngineBalancer(URLS[:2], clock=clock)
+    for engine in balancer.engines:
+        balancer.record_health(engine, False)
+    assert balancer.healthy_engines() == []
+    assert balancer.acquire() in balancer.engines
+
+    balancer.record_health(balancer.engines[1], True)
+    assert balancer.healthy_engines() == [balancer.engines[1]]
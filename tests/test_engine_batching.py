@@ -0,0 +1,215 @@
+import io
+import queue
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import fields
+from types import SimpleNamespace
+
+import litserve as ls
+import numpy as np
+import pytest
+import soundfile as sf
+import torch
+from litserve.callbacks.base import CallbackRunner
+from litserve.loops.base import _SENTINEL_VALUE
+from litserve.loops.simple_loops import BatchedLoop
+from litserve.utils import LitAPIStatus
+from transformers import SeamlessM4TFeatureExtractor
+
+from quran_muaalem.audio_cache import AudioCache
+from quran_muaalem.muaalem_typing import Sifa
+from quran_muaalem.engine.serve import QuranMuaalemAPI, decode_batch, padded_length
+from quran_muaalem.engine.wire import MSGPACK_MEDIA_TYPE, unpack_prediction
+
+
+@pytest.mark.parametrize(
+    "length, bucket_lengths, ex_length",
+    [
+        (10, [], 10),
+        (10, [5, 20, 40], 20),
+        (20, [5, 20, 40], 20),
+        (41, [5, 20, 40], 41),
+        (1, [5, 20, 40], 5),
+    ],
+)
+def test_padded_length(length, bucket_lengths, ex_length):
+    assert padded_length(length, bucket_lengths) == ex_length
+
+
+def make_api(padding_buckets: list[int]) -> QuranMuaalemAPI:
+    # No model is needed for batching
+    api = QuranMuaalemAPI.__new__(QuranMuaalemAPI)
+    api.device = "cpu"
+    api.sampling_rate = 16000
+    api.features_device = "cpu"
+    api.dtype = torch.float32
+    api.padding_buckets = padding_buckets
+    api.processor = SeamlessM4TFeatureExtractor()
+    return api
+
+
+def done_future(result=None, exception=None) -> Future:
+    future = Future()
+    if exception is not None:
+        future.set_exception(exception)
+    else:
+        future.set_result(result)
+    return future
+
+
+@pytest.mark.parametrize("padding_buckets, ex_len", [([], 74), ([40, 100], 100)])
+def test_batch_pads_to_longest(padding_buckets, ex_len):
+    api = make_api(padding_buckets)
+    waves = [
+        np.random.default_rng(idx).standard_normal(num_samples).astype(np.float32)
+        for idx, num_samples in enumerate([8000, 24000, 4000])
+    ]
+    input_features, attention_mask, lengths, errors = api.batch(
+        [done_future(wave) for wave in waves]
+    )
+
+    features = api.processor(waves, sampling_rate=16000, return_tensors="pt")
+    assert input_features.shape == (3, ex_len, 160)
+    assert attention_mask.shape == (3, ex_len)
+    assert errors == [None, None, None]
+    assert lengths.tolist() == features["attention_mask"].sum(-1).tolist()
+    assert attention_mask.sum(-1).tolist() == lengths.tolist()
+    torch.testing.assert_close(
+        input_features[:, :74], features["input_features"], atol=1e-3, rtol=1e-3
+    )
+    # padding is zeros
+    assert float(input_features[:, 74:].abs().sum()) == 0.0
+
+
+def test_batch_decode_error():
+    api = make_api([])
+    error = ValueError("not an audio file")
+    wave = np.ones(8000, dtype=np.float32)
+    input_features, _, lengths, errors = api.batch(
+        [done_future(exception=error), done_future(wave)]
+    )
+    assert input_features.shape[0] == 1
+    assert errors == [error, None]
+
+    outs = api.unbatch(([{"phonemes": "a"}], errors))
+    assert outs == [error, {"phonemes": "a"}]
+
+
+SIFAT_LEVELS = [f.name for f in fields(Sifa) if f.name != "phonemes_group"]
+TOKENIZER = SimpleNamespace(
+    id_to_vocab={
+        "phonemes": {0: "[PAD]", 1: "ب", 2: "ا"},
+        **{level: {0: "[PAD]", 1: "1", 2: "2"} for level in SIFAT_LEVELS},
+    },
+    sifat_to_en_vocab={
+        level: {0: "[PAD]", 1: "first", 2: "second"} for level in SIFAT_LEVELS
+    },
+)
+
+
+def test_decode_batch_ignores_padded_frames():
+    sifa_ids = torch.LongTensor([[2, 2, 0, 1, 1], [1, 0, 1, 1, 2]])
+    level_to_ids = {
+        "phonemes": torch.LongTensor([[1, 1, 0, 2, 2], [2, 0, 1, 1, 1]]),
+        **{level: sifa_ids for level in SIFAT_LEVELS},
+    }
+    level_to_max_probs = {
+        level: torch.full(ids.shape, 0.5) for level, ids in level_to_ids.items()
+    }
+    # the second input has only 2 frames and the rest is padding
+    outs = decode_batch(
+        level_to_ids, level_to_max_probs, torch.LongTensor([5, 2]), TOKENIZER
+    )
+
+    assert outs[0]["phonemes"] == "با"
+    assert outs[0]["phonemes_probs"] == [0.5, 0.5]
+    assert [sifa["phonemes_group"] for sifa in outs[0]["sifat"]] == ["ب", "ا"]
+    assert outs[0]["sifat"][0]["ghonna"] == {"text": "second", "prob": 0.5, "idx": 2}
+    assert outs[0]["sifat"][1]["ghonna"]["text"] == "first"
+
+    assert outs[1]["phonemes"] == "ا"
+    assert len(outs[1]["sifat"]) == 1
+    assert outs[1]["sifat"][0]["hams_or_jahr"]["text"] == "first"
+
+
+def test_batch_rejects_too_short_waves():
+    api = make_api([])
+    error = ValueError("not an audio file")
+    input_features, _, lengths, errors = api.batch(
+        [done_future(np.ones(399, dtype=np.float32)), done_future(exception=error)]
+    )
+    assert input_features.shape[0] == 0 and len(lengths) == 0
+    assert "too short" in str(errors[0]) and errors[1] is error
+
+    outs = api.unbatch(api.predict((input_features, None, lengths, errors)))
+    assert api.encode_response(outs[0]).status_code == 400
+
+    # a short wave does not fail the other requests of its batch
+    input_features, _, lengths, errors = api.batch(
+        [done_future(np.ones(100, dtype=np.float32)), done_future(np.ones(8000))]
+    )
+    assert input_features.shape[0] == 1 and errors[1] is None
+
+
+class ListTransport:
+    """Keeps the responses LitServe sends to the server"""
+
+    def __init__(self):
+        self.responses = {}
+
+    def send(self, item, consumer_id):
+        uid, (response, status, *_) = item
+        self.responses[uid] = (response, status)
+
+
+def wav_bytes(num_samples: int) -> bytes:
+    buffer = io.BytesIO()
+    wave = np.random.default_rng(0).uniform(-0.5, 0.5, num_samples)
+    sf.write(buffer, wave, 16000, format="WAV", subtype="PCM_16")
+    return buffer.getvalue()
+
+
+def test_batched_loop_fails_only_the_bad_request():
+    api = make_api([])
+    ls.LitAPI.__init__(api, max_batch_size=4, batch_timeout=0.0)
+    api.request_timeout = -1
+    api.max_audio_seconds = 15
+    api.resampler = "quality"
+    api.vad = None
+    api.decode_pool = ThreadPoolExecutor(max_workers=2)
+    api.audio_cache = AudioCache(max_size=0)
+
+    def predict(x):
+        _, _, lengths, errors = x
+        outs = [{"phonemes": "ب", "phonemes_probs": [0.9], "sifat": []}]
+        return outs * len(lengths), errors
+
+    api.predict = predict
+
+    def upload(audio_bytes: bytes):
+        return SimpleNamespace(file=io.BytesIO(audio_bytes))
+
+    requests = queue.Queue()
+    for uid, audio_bytes in [
+        ("good", wav_bytes(8000)),
+        ("too-short", wav_bytes(100)),
+        ("corrupt", b"not an audio file"),
+        ("good-2", wav_bytes(16000)),
+    ]:
+        requests.put((0, uid, 0.0, upload(audio_bytes)))
+    requests.put(_SENTINEL_VALUE)
+
+    transport = ListTransport()
+    BatchedLoop().run_batched_loop(api, requests, transport, CallbackRunner())
+    api.decode_pool.shutdown()
+
+    for uid in ["good", "good-2"]:
+        response, status = transport.responses[uid]
+        assert status == LitAPIStatus.OK
+        assert response.status_code == 200
+        assert response.media_type == MSGPACK_MEDIA_TYPE
+        assert unpack_prediction(response.body)["phonemes"] == "ب"
+    for uid in ["too-short", "corrupt"]:
+        response, status = transport.responses[uid]
+        assert status == LitAPIStatus.OK
+        assert response.status_code == 400
+    assert b"too short" in transport.responses["too-short"][0].body
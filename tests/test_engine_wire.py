@@ -0,0 +1,138 @@
+import json
+
+import numpy as np
+import pytest
+from fastapi import FastAPI, Response
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+from quran_muaalem.engine.wire import (
+    MSGPACK_MEDIA_TYPE,
+    MsgpackNegotiationMiddleware,
+    accepts_msgpack,
+    pack_prediction,
+    prediction_to_dict,
+    unpack_prediction,
+)
+
+
+def make_unit(text, prob, idx):
+    return {"text": text, "prob": prob, "idx": idx}
+
+
+PREDICTION = {
+    "phonemes": "بِسمِ",
+    "phonemes_probs": [0.5, 0.25, 1.0, 0.75, 0.125],
+    "sifat": [
+        {
+            "phonemes_group": "بِ",
+            "hams_or_jahr": make_unit("jahr", 0.5, 2),
+            "ghonna": make_unit("not_moghonna", 0.25, 1),
+        },
+        {
+            "phonemes_group": "س",
+            "hams_or_jahr": make_unit("hams", 0.75, 1),
+            "ghonna": None,
+        },
+        {
+            "phonemes_group": "مِ",
+            "hams_or_jahr": make_unit("jahr", 1.0, 2),
+            "ghonna": make_unit("moghonna", 0.5, 2),
+        },
+    ],
+}
+
+
+@pytest.mark.parametrize(
+    "prediction",
+    [PREDICTION, {"phonemes": "", "phonemes_probs": [], "sifat": []}],
+)
+def test_pack_roundtrip(prediction):
+    data = unpack_prediction(pack_prediction(prediction))
+    assert data["phonemes_probs"].dtype == np.float32
+    assert prediction_to_dict(data) == prediction
+
+
+def test_unpack_columns():
+    data = unpack_prediction(pack_prediction(PREDICTION))
+    np.testing.assert_array_equal(data["sifat"]["ghonna"]["ids"], [1, -1, 2])
+    assert np.isnan(data["sifat"]["ghonna"]["probs"][1])
+    assert data["sifat"]["ghonna"]["vocab"] == {1: "not_moghonna", 2: "moghonna"}
+    assert data["sifat"]["phonemes_groups"] == ["بِ", "س", "مِ"]
+    # zero-copy views over the msgpack bytes
+    assert not data["phonemes_probs"].flags.writeable
+
+
+@pytest.mark.parametrize(
+    "accept, ex_accepts",
+    [
+        ("", False),
+        ("*/*", False),
+        ("application/json", False),
+        (MSGPACK_MEDIA_TYPE, True),
+        (f"{MSGPACK_MEDIA_TYPE}; q=1, application/json;q=0.5", True),
+        (f"application/json, {MSGPACK_MEDIA_TYPE}", True),
+    ],
+)
+def test_accepts_msgpack(accept, ex_accepts):
+    assert accepts_msgpack(accept) == ex_accepts
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.add_middleware(MsgpackNegotiationMiddleware)
+
+    @app.post("/predict")
+    def predict():
+        return Response(
+            content=pack_prediction(PREDICTION), media_type=MSGPACK_MEDIA_TYPE
+        )
+
+    @app.get("/health")
+    def health():
+        return "ok"
+
+    @app.get("/stream")
+    def stream():
+        return StreamingResponse(iter([b"first ", b"second"]), media_type="text/plain")
+
+    @app.post("/predict-chunked")
+    def predict_chunked():
+        content = pack_prediction(PREDICTION)
+        middle = len(content) // 2
+        return StreamingResponse(
+            iter([content[:middle], content[middle:]]), media_type=MSGPACK_MEDIA_TYPE
+        )
+
+    return TestClient(app)
+
+
+def test_middleware_msgpack(client):
+    response = client.post("/predict", headers={"Accept": MSGPACK_MEDIA_TYPE})
+    assert response.headers["content-type"] == MSGPACK_MEDIA_TYPE
+    assert prediction_to_dict(unpack_prediction(response.content)) == PREDICTION
+
+
+def test_middleware_json(client):
+    response = client.post("/predict")
+    assert response.headers["content-type"] == "application/json"
+    assert int(response.headers["content-length"]) == len(response.content)
+    assert json.loads(response.content) == PREDICTION
+
+
+def test_middleware_passes_other_responses(client):
+    response = client.get("/health")
+    assert response.status_code == 200
+    assert response.json() == "ok"
+
+
+def test_middleware_multi_chunk_responses(client):
+    response = client.get("/stream")
+    assert response.status_code == 200
+    assert response.text == "first second"
+    assert response.headers["content-type"].startswith("text/plain")
+
+    response = client.post("/predict-chunked")
+    assert response.headers["content-type"] == "application/json"
+    assert json.loads(response.content) == PREDICTION
@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+import torch
+from transformers import SeamlessM4TFeatureExtractor
+
+from quran_muaalem.features import batch_fbank_features
+
+
+@pytest.mark.parametrize(
+    "lengths",
+    [
+        [16000],
+        [16000, 48000, 24321],
+        # odd number of fbank frames is padded by the processor
+        [32400, 32240],
+        [560, 800, 16000],
+    ],
+)
+def test_batch_fbank_features(lengths):
+    processor = SeamlessM4TFeatureExtractor()
+    rng = np.random.default_rng(0)
+    waves = [rng.standard_normal(length).astype(np.float32) * 0.1 for length in lengths]
+
+    ex_features = processor(waves, sampling_rate=16000, return_tensors="pt")
+    features = batch_fbank_features(waves, processor)
+
+    torch.testing.assert_close(features["attention_mask"], ex_features["attention_mask"])
+    torch.testing.assert_close(
+        features["input_features"],
+        ex_features["input_features"],
+        atol=1e-3,
+        rtol=1e-3,
+    )
+
+
+def test_batch_fbank_features_empty():
+    processor = SeamlessM4TFeatureExtractor()
+    features = batch_fbank_features([], processor)
+    assert features["input_features"].shape == (0, 0, 160)
+    assert features["attention_mask"].shape == (0, 0)
@@ -1,9 +1,42 @@
+import random
+from time import perf_counter
+
 import pytest
 
-from test_sliding_window import merge_lists_with_overlap
+from quran_muaalem.streaming import merge_lists_with_overlap
 from display_lists_diff import print_colored_diff_summary
 
 
+def loop_merge_lists_with_overlap(A, B, max_B_offset=2):
+    """The original quadratic merge used as a reference"""
+    a_orig_offset = max(len(A) - len(B) - max_B_offset, 0)
+    b_span = min(len(A), len(B))
+    best_match = None
+    for a_offset in range(a_orig_offset, len(A)):
+        curr_match = None
+        for ptr in range(b_span):
+            if A[a_offset + ptr] == B[ptr]:
+                if curr_match is None:
+                    curr_match = [1, a_offset + ptr, ptr]
+                else:
+                    curr_match[0] += 1
+            elif curr_match is not None:
+                if best_match is None or curr_match[0] > best_match[0]:
+                    best_match = curr_match
+                curr_match = None
+
+        # Last check
+        if curr_match is not None:
+            if best_match is None or curr_match[0] > best_match[0]:
+                best_match = curr_match
+        if (a_offset + len(B)) >= len(A):
+            b_span -= 1
+
+    if best_match is None:
+        return A + B
+    return A[: best_match[1]] + B[best_match[2] :]
+
+
 @pytest.mark.parametrize(
     "A, B, num_ignore, exp",
     [
@@ -611,3 +644,57 @@ def test_merge_lists_with_overlap(A, B, num_ignore, exp):
     print(f"A: {A}\nB: {B}\nout: {out}\n exp: {exp}")
     print_colored_diff_summary(exp, out)
     assert out == exp
+
+
+@pytest.mark.parametrize("seed", range(300))
+def test_merge_lists_with_overlap_parity(seed):
+    rng = random.Random(seed)
+    vocab = list(range(rng.randint(1, 6)))
+    A = [rng.choice(vocab) for _ in range(rng.randint(0, 40))]
+    B = [rng.choice(vocab) for _ in range(rng.randint(0, 30))]
+    if A and B and rng.random() < 0.5:
+        # B starts with the tail of A as consecutive windows
+        B = A[-rng.randint(1, len(A)) :] + B
+    max_B_offset = rng.randint(0, 4)
+
+    ex_out = loop_merge_lists_with_overlap(A, B, max_B_offset)
+    assert merge_lists_with_overlap(A, B, max_B_offset) == ex_out
+
+    A_copy = list(A)
+    out = merge_lists_with_overlap(A_copy, B, max_B_offset, inplace=True)
+    assert out is A_copy
+    assert out == ex_out
+
+
+if __name__ == "__main__":
+    # Stitching consecutive windows of a long recording
+    rng = random.Random(0)
+    vocab = list(range(1, 44))
+    for window_len in [100, 300, 1000]:
+        hop_len = window_len // 4
+        num_windows = 100
+        seq = [rng.choice(vocab) for _ in range(hop_len * num_windows + window_len)]
+        windows = [
+            seq[start : start + window_len]
+            for start in range(0, hop_len * num_windows, hop_len)
+        ]
+
+        start = perf_counter()
+        merged = []
+        for window in windows:
+            merged = merge_lists_with_overlap(merged, window, inplace=True)
+        fast_time = perf_counter() - start
+
+        start = perf_counter()
+        loop_merged = []
+        for window in windows:
+            loop_merged = loop_merge_lists_with_overlap(loop_merged, window)
+        loop_time = perf_counter() - start
+        assert merged == loop_merged
+
+        print(
+            f"{num_windows} windows of {window_len:>4} items: "
+            f"loop: {loop_time * 1000:9.2f} ms, "
+            f"rolling hash: {fast_time * 1000:8.2f} ms, "
+            f"speedup: {loop_time / fast_time:6.1f}x"
+        )
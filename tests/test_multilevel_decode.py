@@ -0,0 +1,246 @@
+from time import perf_counter
+
+import torch
+import pytest
+
+from quran_muaalem.decode import (
+    ctc_decode,
+    align_chunked_phonemes_sequence,
+    align_predicted_sequence,
+    multilevel_ctc_decode,
+    multilevel_greedy_decode,
+    greedy_ids_and_probs,
+    greedy_ids_and_probs_from_logits,
+    phonemes_level_greedy_decode,
+)
+from quran_muaalem.muaalem_typing import Unit
+
+
+LEVEL_TO_ID_TO_VOCAB = {
+    "phonemes": {0: "[PAD]", 1: "a", 2: "b", 3: "c", 4: "d", 5: "e"},
+    "hams_or_jahr": {0: "[PAD]", 1: "H", 2: "J"},
+    "shidda_or_rakhawa": {0: "[PAD]", 1: "S", 2: "B", 3: "R"},
+    "ghonna": {0: "[PAD]", 1: "G", 2: "N"},
+}
+
+
+def loop_multilevel_greedy_decode(
+    level_to_probs: dict[str, torch.FloatTensor],
+    level_to_id_to_vocab: dict[str, dict[int, str]],
+    level_to_ref_ids: dict[str, torch.LongTensor],
+    chunked_phonemes_batch: list[list[str]],
+    ref_chuncked_phonemes_batch: list[list[str]],
+    phonemes_units: list[Unit],
+    missing_placeholder=-100,
+    pad_idx=0,
+) -> dict[str, list[Unit]]:
+    """The original level by level `multilevel_greedy_decode` used as a reference"""
+    level_to_units = {}
+    for level in level_to_probs:
+        if level == "phonemes":
+            continue
+        batch_probs, batch_ids = level_to_probs[level].topk(1, dim=-1)
+        decode_outs = ctc_decode(
+            batch_ids.squeeze(-1), batch_probs.squeeze(-1), collapse_consecutive=True
+        )
+        level_to_units[level] = []
+        for seq_idx, decode_out in enumerate(decode_outs):
+            phonemes_mask = align_chunked_phonemes_sequence(
+                ref=ref_chuncked_phonemes_batch[seq_idx],
+                predicted=chunked_phonemes_batch[seq_idx],
+            )
+            phonemes_mask = torch.BoolTensor(phonemes_mask)
+            if len(decode_out.ids) != len(chunked_phonemes_batch[seq_idx]) and (
+                len(chunked_phonemes_batch[seq_idx])
+                <= len(ref_chuncked_phonemes_batch[seq_idx])
+            ):
+                ref_aligned_ids, mask = align_predicted_sequence(
+                    level_to_ref_ids[level][seq_idx],
+                    decode_out.ids,
+                    missing_placeholder=missing_placeholder,
+                )
+                probs = decode_out.p
+                ref_aligned_ids = torch.LongTensor(ref_aligned_ids)
+                mask = torch.BoolTensor(mask)
+                new_probs = torch.zeros(len(ref_aligned_ids), dtype=torch.float32)
+                new_probs[ref_aligned_ids != missing_placeholder] = probs[mask]
+                ref_aligned_ids[ref_aligned_ids == missing_placeholder] = pad_idx
+                aligned_ids = ref_aligned_ids[phonemes_mask]
+                new_probs = ref_aligned_ids[phonemes_mask]
+                probs = new_probs
+            else:
+                aligned_ids = decode_out.ids
+                probs = decode_out.p
+
+            text = ""
+            for idx in aligned_ids:
+                text += level_to_id_to_vocab[level][int(idx)]
+            level_to_units[level].append(Unit(text=text, probs=probs, ids=aligned_ids))
+    level_to_units["phonemes"] = phonemes_units
+    return level_to_units
+
+
+def random_decode_inputs(
+    batch_size: int, seq_len: int, seed: int = 0, mismatch: bool = True
+):
+    """Random model like outputs where the sifat levels follow the phonemes runs"""
+    gen = torch.Generator().manual_seed(seed)
+    repeats = torch.randint(1, 4, (batch_size, seq_len), generator=gen)
+
+    level_to_probs = {}
+    for level, id_to_vocab in LEVEL_TO_ID_TO_VOCAB.items():
+        run_ids = torch.randint(1, len(id_to_vocab), (batch_size, seq_len), generator=gen)
+        # every phonemes group is followed by a blank
+        run_ids[:, 1::2] = 0
+        if mismatch and level != "phonemes" and seq_len > 2:
+            # missing sifa for the first sequence to exercise the alignment
+            run_ids[0, 2] = 0
+        ids = torch.stack(
+            [
+                torch.repeat_interleave(seq_ids, seq_repeats)[:seq_len]
+                for seq_ids, seq_repeats in zip(run_ids, repeats)
+            ]
+        )
+        logits = torch.randn(batch_size, seq_len, len(id_to_vocab), generator=gen)
+        logits += 10 * torch.nn.functional.one_hot(ids, len(id_to_vocab))
+        level_to_probs[level] = torch.softmax(logits, dim=-1)
+
+    phonemes_units = phonemes_level_greedy_decode(
+        level_to_probs["phonemes"], LEVEL_TO_ID_TO_VOCAB["phonemes"]
+    )
+    chunked_phonemes_batch = [list(unit.text) for unit in phonemes_units]
+
+    # The reference is a randomly edited version of the prediction
+    ref_chuncked_phonemes_batch = []
+    for chunked_phonemes in chunked_phonemes_batch:
+        num_extra = int(torch.randint(0, 3, (1,), generator=gen))
+        ref_chuncked_phonemes_batch.append(chunked_phonemes + ["a"] * num_extra)
+    level_to_ref_ids = {
+        level: [
+            torch.randint(1, len(id_to_vocab), (len(ref),), generator=gen)
+            for ref in ref_chuncked_phonemes_batch
+        ]
+        for level, id_to_vocab in LEVEL_TO_ID_TO_VOCAB.items()
+    }
+    return (
+        level_to_probs,
+        level_to_ref_ids,
+        chunked_phonemes_batch,
+        ref_chuncked_phonemes_batch,
+        phonemes_units,
+    )
+
+
+@pytest.mark.parametrize("seq_len", [1, 7, 40, 200])
+@pytest.mark.parametrize("seed", range(4))
+def test_multilevel_greedy_decode_parity(seq_len, seed):
+    (
+        level_to_probs,
+        level_to_ref_ids,
+        chunked_phonemes_batch,
+        ref_chuncked_phonemes_batch,
+        phonemes_units,
+    ) = random_decode_inputs(3, seq_len, seed=seed)
+
+    kwargs = dict(
+        level_to_id_to_vocab=LEVEL_TO_ID_TO_VOCAB,
+        level_to_ref_ids=level_to_ref_ids,
+        chunked_phonemes_batch=chunked_phonemes_batch,
+        ref_chuncked_phonemes_batch=ref_chuncked_phonemes_batch,
+        phonemes_units=phonemes_units,
+    )
+    ex_level_to_units = loop_multilevel_greedy_decode(level_to_probs, **kwargs)
+    level_to_units = multilevel_greedy_decode(level_to_probs, **kwargs)
+
+    # Precomputed decoding of all levels in a single pass
+    level_to_decode_outs = multilevel_ctc_decode(*greedy_ids_and_probs(level_to_probs))
+    fused_level_to_units = multilevel_greedy_decode(
+        None, level_to_decode_outs=level_to_decode_outs, **kwargs
+    )
+
+    for out in [level_to_units, fused_level_to_units]:
+        assert list(out.keys()) == list(ex_level_to_units.keys())
+        for level in ex_level_to_units:
+            for unit, ex_unit in zip(out[level], ex_level_to_units[level]):
+                assert unit.text == ex_unit.text
+                torch.testing.assert_close(unit.ids, ex_unit.ids)
+                torch.testing.assert_close(unit.probs, ex_unit.probs)
+
+
+def test_multilevel_ctc_decode():
+    level_to_ids = {
+        "phonemes": torch.LongTensor([[1, 1, 0, 2], [0, 3, 3, 3]]),
+        "ghonna": torch.LongTensor([[0, 2, 2, 0], [1, 0, 1, 1]]),
+    }
+    level_to_probs = {
+        "phonemes": torch.FloatTensor([[0.2, 0.4, 1.0, 0.5], [1.0, 0.3, 0.6, 0.9]]),
+        "ghonna": torch.FloatTensor([[1.0, 0.2, 0.8, 1.0], [0.5, 1.0, 0.1, 0.3]]),
+    }
+    out = multilevel_ctc_decode(level_to_ids, level_to_probs)
+
+    torch.testing.assert_close(out["phonemes"][0].ids, torch.LongTensor([1, 2]))
+    torch.testing.assert_close(out["phonemes"][0].p, torch.FloatTensor([0.3, 0.5]))
+    torch.testing.assert_close(out["phonemes"][1].ids, torch.LongTensor([3]))
+    torch.testing.assert_close(out["phonemes"][1].p, torch.FloatTensor([0.6]))
+    torch.testing.assert_close(out["ghonna"][0].ids, torch.LongTensor([2]))
+    torch.testing.assert_close(out["ghonna"][0].p, torch.FloatTensor([0.5]))
+    torch.testing.assert_close(out["ghonna"][1].ids, torch.LongTensor([1, 1]))
+    torch.testing.assert_close(out["ghonna"][1].p, torch.FloatTensor([0.5, 0.2]))
+
+
+@pytest.mark.parametrize("dtype", [torch.float32, torch.bfloat16])
+def test_greedy_ids_and_probs_from_logits(dtype):
+    gen = torch.Generator().manual_seed(0)
+    level_to_logits = {
+        level: (torch.randn(2, 30, len(id_to_vocab), generator=gen) * 4).to(dtype)
+        for level, id_to_vocab in LEVEL_TO_ID_TO_VOCAB.items()
+    }
+    level_to_ids, level_to_probs = greedy_ids_and_probs_from_logits(level_to_logits)
+    ex_level_to_ids, ex_level_to_probs = greedy_ids_and_probs(
+        {
+            level: torch.softmax(logits.to(torch.float32), dim=-1)
+            for level, logits in level_to_logits.items()
+        }
+    )
+    for level in level_to_logits:
+        assert level_to_ids[level].dtype == torch.long
+        assert level_to_probs[level].dtype == torch.float32
+        torch.testing.assert_close(level_to_ids[level], ex_level_to_ids[level])
+        torch.testing.assert_close(level_to_probs[level], ex_level_to_probs[level])
+
+
+if __name__ == "__main__":
+    # The model outputs 50 frames per second of audio
+    frames_per_second = 50
+    batch_size = 16
+    for seconds in [1, 5, 15, 30, 60]:
+        (
+            level_to_probs,
+            level_to_ref_ids,
+            chunked_phonemes_batch,
+            ref_chuncked_phonemes_batch,
+            phonemes_units,
+        ) = random_decode_inputs(
+            batch_size, seconds * frames_per_second, mismatch=False
+        )
+        kwargs = dict(
+            level_to_id_to_vocab=LEVEL_TO_ID_TO_VOCAB,
+            level_to_ref_ids=level_to_ref_ids,
+            chunked_phonemes_batch=chunked_phonemes_batch,
+            ref_chuncked_phonemes_batch=ref_chuncked_phonemes_batch,
+            phonemes_units=phonemes_units,
+        )
+
+        start = perf_counter()
+        loop_multilevel_greedy_decode(level_to_probs, **kwargs)
+        loop_time = perf_counter() - start
+
+        start = perf_counter()
+        multilevel_greedy_decode(level_to_probs, **kwargs)
+        fused_time = perf_counter() - start
+
+        print(
+            f"{seconds:>3}s x {batch_size}: loop: {loop_time * 1000:9.2f} ms, "
+            f"fused: {fused_time * 1000:7.2f} ms, "
+            f"speedup: {loop_time / fused_time:7.1f}x"
+        )
@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+from quran_transcript import Aya, quran_phonetizer
+
+from quran_muaalem.app.phonetization_store import (
+    PhonetizationStore,
+    build_phonetization_store,
+    moshaf_key,
+)
+from quran_muaalem.app.types import DEFAULT_MOSHAF
+
+AYAT = [(1, 1), (1, 2), (112, 1), (112, 2)]
+
+
+@pytest.fixture(scope="module")
+def store(tmp_path_factory):
+    store_dir = tmp_path_factory.mktemp("store")
+    build_phonetization_store(store_dir, DEFAULT_MOSHAF, chunk_size=3, ayat=AYAT)
+    store = PhonetizationStore(store_dir)
+    yield store
+    store.close()
+
+
+def test_store_matches_phonetizer(store):
+    assert len(store) == len(AYAT)
+    assert isinstance(store.index, np.memmap)
+    assert moshaf_key(store.moshaf) == moshaf_key(DEFAULT_MOSHAF)
+    for sura_idx, aya_idx in AYAT:
+        uthmani = Aya(sura_idx, aya_idx).get().uthmani
+        ex_out = quran_phonetizer(uthmani, DEFAULT_MOSHAF, remove_spaces=True)
+        for out in [store.get(sura_idx, aya_idx), store.get_by_uthmani(uthmani)]:
+            assert out.phonemes == ex_out.phonemes
+            assert out.sifat == ex_out.sifat
+            assert out.mappings == ex_out.mappings
+
+
+def test_store_missing(store):
+    assert store.get(2, 1) is None
+    assert store.get_by_uthmani("not an aya") is None
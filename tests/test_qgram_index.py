@@ -0,0 +1,175 @@
+import random
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from quran_transcript.phonetics.search import NoPhonemesSearchResult, PhoneticSearch
+
+from quran_muaalem.app import qgram_index
+from quran_muaalem.app.qgram_index import (
+    IndexedPhoneticSearch,
+    QGramIndex,
+    has_search_internals,
+)
+
+
+def test_qgram_index_positions():
+    text = "abcabcxabc"
+    index = QGramIndex.build(text, q=3)
+    assert index.alphabet == "abcx"
+    char_to_id = index.char_to_id
+    gram = char_to_id["a"] * 16 + char_to_id["b"] * 4 + char_to_id["c"]
+    positions = index.positions[index.offsets[gram] : index.offsets[gram + 1]]
+    assert positions.tolist() == [0, 3, 7]
+    assert index.offsets[-1] == len(text) - 2
+
+
+def test_candidate_windows():
+    rng = random.Random(0)
+    text = "".join(rng.choice("abcdefgh") for _ in range(5000))
+    index = QGramIndex.build(text, q=3)
+    query = text[2000:2040]
+    # one substitution, one deletion, one insertion
+    noisy = query[:10] + "h" + query[11:20] + query[21:30] + "a" + query[30:]
+    windows = index.candidate_windows(noisy, max_edits=4, text_len=len(text))
+    assert any(start <= 2000 and 2040 <= end for start, end in windows)
+    assert sum(end - start for start, end in windows) < len(text) // 10
+
+    # the lemma can not filter
+    assert index.candidate_windows(noisy[:6], max_edits=2, text_len=len(text)) is None
+    # unknown characters have no hits
+    assert index.candidate_windows("zzzzzz", max_edits=0, text_len=len(text)) == []
+
+
+def test_save_load(tmp_path):
+    index = QGramIndex.build("abcabcxabc", q=2)
+    index.save(tmp_path)
+    loaded = QGramIndex.load(tmp_path)
+    assert (loaded.q, loaded.alphabet) == (2, "abcx")
+    assert isinstance(loaded.positions, np.memmap)
+    np.testing.assert_array_equal(loaded.positions, index.positions)
+    np.testing.assert_array_equal(loaded.offsets, index.offsets)
+
+
+@pytest.fixture(scope="module")
+def searches(tmp_path_factory):
+    index_dir = tmp_path_factory.mktemp("qgram")
+    IndexedPhoneticSearch(index_dir=index_dir)
+    # loaded from the saved index
+    return PhoneticSearch(), IndexedPhoneticSearch(index_dir=index_dir)
+
+
+def add_noise(text: str, num_edits: int, alphabet: str, rng: random.Random) -> str:
+    chars = list(text)
+    for _ in range(num_edits):
+        idx = rng.randrange(len(chars))
+        op = rng.randrange(3)
+        if op == 0:
+            chars[idx] = rng.choice(alphabet)
+        elif op == 1:
+            del chars[idx]
+        else:
+            chars.insert(idx, rng.choice(alphabet))
+    return "".join(chars)
+
+
+def test_indexed_search_matches_full_search(searches):
+    search, indexed_search = searches
+    assert isinstance(indexed_search.qgram_index.positions, np.memmap)
+    ref = search.ref_ph_norm
+    alphabet = "".join(sorted(set(ref)))
+    rng = random.Random(0)
+    for _ in range(40):
+        length = rng.choice([10, 20, 40, 60])
+        error_ratio = rng.choice([0.0, 0.1, 0.2])
+        start = rng.randrange(len(ref) - length)
+        query = add_noise(
+            ref[start : start + length], int(length * error_ratio / 2), alphabet, rng
+        )
+
+        try:
+            ex_results = search.search(query, error_ratio=error_ratio)
+        except NoPhonemesSearchResult:
+            with pytest.raises(NoPhonemesSearchResult):
+                indexed_search.search(query, error_ratio=error_ratio)
+            continue
+        assert indexed_search.search(query, error_ratio=error_ratio) == ex_results
+
+
+
+def test_search_near(searches):
+    search, indexed_search = searches
+    query = search.ref_ph_norm[
+        indexed_search._aya_starts[10] : indexed_search._aya_starts[11]
+    ]
+    # 2:4 is the 11th aya
+    results = indexed_search.search_near(query, 2, 2, num_ayat=3, error_ratio=0.1)
+    assert results == search.search(query, error_ratio=0.1)
+    assert (results[0].start.sura_idx, results[0].start.aya_idx) == (2, 4)
+
+    with pytest.raises(NoPhonemesSearchResult):
+        indexed_search.search_near(query, 2, 5, num_ayat=3, error_ratio=0.1)
+    with pytest.raises(ValueError):
+        indexed_search.search_near(query, 1, 8)
+    # the window is cut at the end of the Quran
+    last_aya = search.ref_ph_norm[indexed_search._aya_starts[-1] :]
+    results = indexed_search.search_near(last_aya, 114, 6, num_ayat=3)
+    assert (results[-1].end.sura_idx, results[-1].end.aya_idx) == (114, 6)
+
+
+def test_search_without_qgram_index():
+    search = IndexedPhoneticSearch(use_qgram_index=False)
+    assert search.qgram_index is None
+    query = search.ref_ph_norm[1000:1040]
+    assert search.search(query) == PhoneticSearch().search(query)
+
+
+def test_has_search_internals(searches):
+    search, _ = searches
+    assert has_search_internals(search)
+    other = SimpleNamespace(
+        ref_ph_norm=search.ref_ph_norm,
+        index=search.index[:, :5],
+        _normalize_query=search._normalize_query,
+        _ref_idx_to_span=search._ref_idx_to_span,
+    )
+    assert not has_search_internals(other)
+    other.index = search.index
+    assert has_search_internals(other)
+    del other._ref_idx_to_span
+    assert not has_search_internals(other)
+
+
+def test_search_without_internals(searches, monkeypatch):
+    search, _ = searches
+    monkeypatch.setattr(qgram_index, "has_search_internals", lambda search: False)
+    fallback_search = IndexedPhoneticSearch()
+    assert fallback_search.qgram_index is None
+    query = search.ref_ph_norm[1000:1040]
+    assert fallback_search.search(query) == search.search(query)
+    # searches the whole Quran
+    assert fallback_search.search_near(query, 1, 1) == search.search(query)
+
+
+if __name__ == "__main__":
+    import time
+
+    search = PhoneticSearch()
+    indexed_search = IndexedPhoneticSearch()
+    ref = search.ref_ph_norm
+    rng = random.Random(0)
+    for length in [30, 60, 150]:
+        for error_ratio in [0.1, 0.2]:
+            queries = [
+                ref[start : start + length]
+                for start in (rng.randrange(len(ref) - length) for _ in range(10))
+            ]
+            for name, s in [("full", search), ("indexed", indexed_search)]:
+                start = time.perf_counter()
+                for query in queries:
+                    s.search(query, error_ratio=error_ratio)
+                elapsed = (time.perf_counter() - start) / len(queries)
+                print(
+                    f"length={length:3} error_ratio={error_ratio}: "
+                    f"{name:8} {elapsed * 1000:8.2f} ms"
+                )
@@ -0,0 +1,144 @@
+import io
+import json
+import wave
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from quran_transcript import Aya, chunck_phonemes, quran_phonetizer
+
+from quran_muaalem.app import serve
+from quran_muaalem.app.cache import LRUCache
+from quran_muaalem.app.recitation_stream import RecitationStream, pcm_to_wav
+from quran_muaalem.app.types import DEFAULT_MOSHAF
+
+
+def test_windows():
+    stream = RecitationStream(
+        sampling_rate=10, window_seconds=4, hop_seconds=2, sample_format="s16le"
+    )
+    samples = np.arange(100, dtype=np.int16)
+    windows = []
+    # chunks cut in the middle of a sample
+    data = samples.tobytes()
+    for idx in range(0, len(data), 7):
+        windows += stream.add_chunk(data[idx : idx + 7])
+    assert [w.tolist() for w in windows[:2]] == [list(range(20)), list(range(40))]
+    for window, end in zip(windows[2:], range(60, 101, 20)):
+        assert window.tolist() == list(range(end - 40, end))
+    assert stream.flush() is None
+
+    stream.add_chunk(np.arange(100, 105, dtype=np.int16).tobytes())
+    assert stream.flush().tolist() == list(range(65, 105))
+    assert stream.flush() is None
+
+
+def test_float_samples_and_max_seconds():
+    stream = RecitationStream(
+        sampling_rate=10,
+        window_seconds=1,
+        hop_seconds=1,
+        sample_format="f32le",
+        max_seconds=2,
+    )
+    windows = stream.add_chunk(np.full(15, 0.5, dtype=np.float32).tobytes())
+    assert len(windows) == 1 and windows[0].dtype == np.float32
+    with pytest.raises(ValueError):
+        stream.add_chunk(np.zeros(6, dtype=np.float32).tobytes())
+
+    with pytest.raises(ValueError):
+        RecitationStream(sample_format="mp3")
+
+
+def test_pcm_to_wav():
+    samples = np.linspace(-1, 1, 160, dtype=np.float32)
+    with wave.open(io.BytesIO(pcm_to_wav(samples, 16000)), "rb") as f:
+        assert f.getframerate() == 16000
+        assert f.getnframes() == 160
+        out = np.frombuffer(f.readframes(160), dtype="<i2")
+    assert out[0] == -32767 and out[-1] == 32767
+
+
+def test_add_phonemes():
+    stream = RecitationStream(
+        sampling_rate=10, window_seconds=4, hop_seconds=2, right_context_seconds=1
+    )
+    groups = chunck_phonemes("بِسمِللَااهِررَحمَاانِررَحِۦۦم")
+    stream.add_phonemes("".join(groups[:8]), 40)
+    assert stream.phonemes_groups == groups[:8]
+    assert stream.stable_phonemes == "".join(groups[:6])
+
+    # the window overlaps the last 2 seconds (4 groups) and revises them
+    stream.add_phonemes("".join(groups[4:]), 40)
+    assert stream.phonemes_groups == groups
+    # the last second of the 11 groups of the window
+    assert stream.num_stable_groups == len(groups) - 3
+
+
+def wav_times(wav_bytes: bytes) -> tuple[float, float]:
+    with wave.open(io.BytesIO(wav_bytes), "rb") as f:
+        samples = np.frombuffer(f.readframes(f.getnframes()), dtype="<i2")
+    return samples[0] / 100, (samples[-1] + 1) / 100
+
+
+@pytest.fixture
+def fake_engine(monkeypatch):
+    """The recitation of 1:2 to 1:4 at a constant rate where every sample is its
+    time in 10 ms units so the fake engine knows which phonemes a window holds
+    """
+    uthmani = " ".join(Aya(1, idx).get().uthmani for idx in range(2, 5))
+    groups = chunck_phonemes(
+        quran_phonetizer(uthmani, DEFAULT_MOSHAF, remove_spaces=True).phonemes
+    )
+    seconds = 12.0
+    audio = (np.arange(int(seconds * 16000)) // 160).astype(np.int16)
+
+    async def predict_audio_bytes(audio_bytes):
+        start, end = wav_times(audio_bytes)
+        start_group = round(start / seconds * len(groups))
+        end_group = round(end / seconds * len(groups))
+        return {"phonemes": "".join(groups[start_group:end_group])}
+
+    monkeypatch.setattr(serve, "predict_audio_bytes", predict_audio_bytes)
+    monkeypatch.setattr(serve, "_search_cache", LRUCache(max_size=8))
+    monkeypatch.setattr(serve, "_search_cache_backend", None)
+    monkeypatch.setattr(serve.app_settings, "executor_backend", "thread")
+    monkeypatch.setattr(serve, "_search_executor", None)
+    monkeypatch.setattr(serve, "_phonetization_executor", None)
+    return audio, "".join(groups)
+
+
+def test_correct_recitation_stream(fake_engine):
+    audio, phonemes = fake_engine
+    client = TestClient(serve.app)
+    messages = []
+    with client.websocket_connect("/correct-recitation/stream") as ws:
+        ws.send_text(json.dumps({"sampling_rate": 16000}))
+        for idx in range(0, len(audio), 8000):
+            ws.send_bytes(audio[idx : idx + 8000].tobytes())
+        ws.send_text(json.dumps({"type": "end"}))
+        while True:
+            message = ws.receive_json()
+            messages.append(message)
+            if message["type"] != "partial":
+                break
+
+    partials, final = messages[:-1], messages[-1]
+    assert partials
+    assert all(p["start"]["sura_idx"] == 1 for p in partials)
+    finalized = [p["uthmani_text"][: p["finalized_uthmani_len"]] for p in partials]
+    assert all(b.startswith(a) for a, b in zip(finalized, finalized[1:]))
+    assert all(not p["errors"] for p in partials)
+
+    assert final["type"] == "final"
+    assert final["predicted_phonemes"] == phonemes
+    assert (final["start"]["aya_idx"], final["end"]["aya_idx"]) == (2, 4)
+    assert final["errors"] == []
+
+
+def test_correct_recitation_stream_bad_start(fake_engine):
+    client = TestClient(serve.app)
+    with client.websocket_connect("/correct-recitation/stream") as ws:
+        ws.send_text(json.dumps({"sample_format": "mp3"}))
+        message = ws.receive_json()
+    assert message["type"] == "error"
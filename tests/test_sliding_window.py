@@ -1,5 +1,4 @@
 from time import perf_counter
-from dataclasses import dataclass
 
 
 from quran_transcript import Aya, quran_phonetizer, MoshafAttributes
@@ -11,29 +10,11 @@ from transformers import AutoFeatureExtractor
 from quran_muaalem.modeling.multi_level_tokenizer import MultiLevelTokenizer
 from quran_muaalem.modeling.modeling_multi_level_ctc import Wav2Vec2BertForMultilevelCTC
 from quran_muaalem.decode import ctc_decode
+from quran_muaalem.streaming import fix_chunk_length, merge_lists_with_overlap
 
 from display_lists_diff import print_colored_diff_summary
 
 
-def count_frames(samples: int, window=400, hop_size=160, stride=2):
-    return (samples - window) / (stride * hop_size)
-
-
-def count_sampels_from_frames(
-    num_frames: int, window=400, hop_size=160, stride=2
-) -> int:
-    return int(num_frames * stride * hop_size + window)
-
-
-def fix_chunk_length(chunk_ms: float, sampling_rate=16000) -> float:
-    """fix chunk length so the input of each frame to the model
-    is complete not padded with zeros by the preprossor
-    """
-    num_frames = count_frames(int(chunk_ms * sampling_rate / 1000))
-    fixed_sampels = count_sampels_from_frames(np.ceil(num_frames))
-    return fixed_sampels / sampling_rate * 1000
-
-
 @torch.no_grad()
 def run_muaalem(
     wave,
@@ -54,99 +35,6 @@ def run_muaalem(
     return level_to_ids, level_to_probs
 
 
-@dataclass
-class MergeMatch:
-    longest_match: int | None = None
-    start_a_idx: int | None = None
-    start_b_idx: int | None = None
-
-    def update(self, match: "MergeMatch"):
-        self.longest_match = match.longest_match
-        self.start_a_idx = match.start_a_idx
-        self.start_b_idx = match.start_b_idx
-
-
-def merge_lists_with_overlap(A, B, max_B_offset=2):
-    """
-    Merge two lists by finding the maximum overlap between the end of A and beginning of B.
-
-    * If there is not common sub sequence:
-        delete last num_ignore of A and concatenate B
-
-    Args:
-        A: First list
-        B: Second list
-        max_B_offset: the starting point of comarison is shifted to the left by `max_B_offset`
-        EX: A = [0, 1, 2, 3, 4, 5, 6, 7, 8, 9], B = [5, 6, 7, 8]
-
-        if max_B_offset = 0 then start point:
-        A: [0, 1, 2, 3, 4, 5, 6, 7, 8, 9]
-        B:                   [5, 6, 7, 8]
-
-        if max_B_offset = 1 then start point:
-        A: [0, 1, 2, 3, 4, 5, 6, 7, 8, 9]
-        B:                [5, 6, 7, 8]
-
-        if max_B_offset = 2 then start point:
-        A: [0, 1, 2, 3, 4, 5, 6, 7, 8, 9]
-        B:             [5, 6, 7, 8]
-
-        Then shifting B to the right step by step unitl we find a match
-
-
-    Returns:
-        Merged list with overlap handled optimally
-    """
-
-    a_orig_offset = max(len(A) - len(B) - max_B_offset, 0)
-    b_span = min(len(A), len(B))
-    print(f"A({len(A)}):\n{A}\nB({len(B)}):\n{B}")
-    curr_match = MergeMatch()
-    best_match = MergeMatch()
-    for a_offset in range(a_orig_offset, len(A)):
-        for ptr in range(b_span):
-            a_idx = a_offset + ptr
-            b_idx = ptr
-
-            if A[a_idx] == B[b_idx]:
-                if curr_match.longest_match is None:
-                    curr_match.longest_match = 1
-                    curr_match.start_a_idx = a_idx
-                    curr_match.start_b_idx = b_idx
-                else:
-                    curr_match.longest_match += 1
-            elif curr_match.longest_match is not None:
-                if best_match.longest_match is None:
-                    best_match.update(curr_match)
-                elif curr_match.longest_match > best_match.longest_match:
-                    best_match.update(curr_match)
-                # reset longest_match
-                curr_match.longest_match = None
-
-        # Last check
-        if curr_match.longest_match is not None:
-            if best_match.longest_match is None:
-                best_match.update(curr_match)
-            elif curr_match.longest_match > best_match.longest_match:
-                best_match.update(curr_match)
-
-        # Reset step
-        curr_match.longest_match = None
-        if (a_offset + len(B)) >= len(A):
-            b_span -= 1
-
-    if best_match.longest_match is None:
-        return A + B
-    else:
-        # Making B overwriting A
-        # TODO: make this desicions with a margin min_distance
-        assert best_match.start_a_idx is not None and best_match.start_b_idx is not None
-        print(
-            f"Start of A: {best_match.start_a_idx}, Start of B IDX: {best_match.start_b_idx}, Longest Match: {best_match.longest_match}"
-        )
-        return A[: best_match.start_a_idx] + B[best_match.start_b_idx :]
-
-
 def sliding_window_inference(
     wave,
     model: Wav2Vec2BertForMultilevelCTC,
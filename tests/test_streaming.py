@@ -0,0 +1,123 @@
+import numpy as np
+import pytest
+import torch
+from transformers import SeamlessM4TFeatureExtractor
+
+from quran_muaalem.streaming import (
+    FrameStitcher,
+    count_frames,
+    fix_chunk_length,
+    iter_windows,
+)
+
+
+@pytest.mark.parametrize("chunk_ms", [30, 500, 1000, 8000, 20000, 20010])
+def test_fix_chunk_length_not_padded(chunk_ms):
+    processor = SeamlessM4TFeatureExtractor()
+    fixed_ms = fix_chunk_length(chunk_ms)
+    assert fixed_ms >= chunk_ms - 20
+    samples = round(fixed_ms * 16)
+    assert count_frames(samples) == int(count_frames(samples))
+
+    features = processor(
+        [np.ones(samples, dtype=np.float32)],
+        sampling_rate=16000,
+        return_tensors="pt",
+        return_attention_mask=True,
+    )
+    # no padded frames
+    assert bool(features["attention_mask"].all())
+
+
+@pytest.mark.parametrize("wave_len", [0, 399, 400, 1000, 1001, 5555])
+@pytest.mark.parametrize("chunk_len", [1, 77, 1000, 10000])
+@pytest.mark.parametrize("window_samples, hop_samples", [(1000, 600), (1000, 1000)])
+def test_iter_windows(wave_len, chunk_len, window_samples, hop_samples):
+    wave = np.arange(wave_len, dtype=np.float32)
+    chunks = [wave[i : i + chunk_len] for i in range(0, wave_len, chunk_len)]
+    windows = list(iter_windows(chunks, window_samples, hop_samples))
+
+    for idx, (window, is_last) in enumerate(windows):
+        start = idx * hop_samples
+        np.testing.assert_array_equal(window, wave[start : start + window_samples])
+        assert is_last == (len(window) < window_samples)
+        if is_last:
+            assert idx == len(windows) - 1
+
+    # the windows cover the whole wave except a tail shorter than `min_samples`
+    covered = (len(windows) - 1) * hop_samples + len(windows[-1][0]) if windows else 0
+    assert wave_len - covered < 400
+
+
+def test_iter_windows_invalid_hop():
+    with pytest.raises(ValueError):
+        list(iter_windows([np.zeros(10)], 10, 11))
+
+
+@pytest.mark.parametrize("num_frames", [5, 20, 21, 47, 100])
+@pytest.mark.parametrize("window_frames, hop_frames", [(20, 15), (20, 20), (20, 3)])
+def test_frame_stitcher(num_frames, window_frames, hop_frames):
+    frames = torch.arange(num_frames)
+    stitcher = FrameStitcher(hop_frames)
+    start = 0
+    while True:
+        window = frames[start : start + window_frames]
+        is_last = start + window_frames >= num_frames
+        stitcher.add({"phonemes": window}, window_frames, is_last=is_last)
+        if is_last:
+            break
+        start += hop_frames
+
+    torch.testing.assert_close(stitcher.get()["phonemes"], frames)
+
+
+def test_stream_close_to_single_pass():
+    """Every window is normalized by the processor on its own and the frames
+    near its borders see less context, so the stitched frames are close to a
+    single pass over the whole wave but not equal
+    """
+    from quran_muaalem.inference import Muaalem
+    from quran_muaalem.modeling.configuration_multi_level_ctc import (
+        Wav2Vec2BertForMultilevelCTCConfig,
+    )
+    from quran_muaalem.modeling.modeling_multi_level_ctc import (
+        Wav2Vec2BertForMultilevelCTC,
+    )
+
+    torch.manual_seed(0)
+    config = Wav2Vec2BertForMultilevelCTCConfig(
+        level_to_vocab_size={"phonemes": 8, "hams_or_jahr": 3},
+        hidden_size=32,
+        num_hidden_layers=2,
+        num_attention_heads=2,
+        intermediate_size=64,
+    )
+    model = Muaalem.__new__(Muaalem)
+    model.device = "cpu"
+    model.dtype = torch.float32
+    model.model = Wav2Vec2BertForMultilevelCTC(config).eval()
+    model.processor = SeamlessM4TFeatureExtractor()
+
+    stitched = {}
+
+    def decode(level_to_ids, level_to_max_probs, refs, level_to_probs=None):
+        stitched.update(level_to_ids)
+        return [None]
+
+    model._decode = decode
+
+    # a stationary signal so every window has about the statistics of the wave
+    rng = np.random.default_rng(0)
+    t = np.arange(16000 * 20) / 16000
+    tone_on = rng.random(len(t) // 1600).repeat(1600) > 0.5
+    wave = 0.1 * rng.standard_normal(len(t)) + 0.3 * np.sin(2 * np.pi * 440 * t)
+    wave = (wave * np.where(tone_on, 1.0, 0.5)).astype(np.float32)
+
+    model.transcribe_long(
+        wave, None, sampling_rate=16000, window_seconds=8, hop_seconds=6
+    )
+    single, _, _ = model._forward([wave], sampling_rate=16000)
+    for level, ids in single.items():
+        assert stitched[level].shape == ids.shape
+        # at least 90% of the greedy ids are the same
+        assert (stitched[level] == ids).float().mean() >= 0.9
@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+
+from quran_muaalem.vad import SpeechSegments, VadConfig, detect_speech, trim_silence
+
+SR = 16000
+
+
+def tone(seconds: float, amplitude: float = 0.5) -> np.ndarray:
+    return amplitude * np.sin(np.arange(int(seconds * SR)) / 5).astype(np.float32)
+
+
+def silence(seconds: float) -> np.ndarray:
+    rng = np.random.default_rng(0)
+    return (rng.standard_normal(int(seconds * SR)) * 1e-4).astype(np.float32)
+
+
+def test_trims_leading_and_trailing_silence():
+    wave = np.concatenate([silence(2), tone(1), silence(1), tone(1), silence(3)])
+    trimmed, segments = trim_silence(wave, SR, VadConfig(padding_seconds=0.1))
+
+    assert len(segments.spans) == 1
+    start, end = segments.spans[0]
+    assert start == pytest.approx(1.9 * SR, abs=0.02 * SR)
+    assert end == pytest.approx(5.1 * SR, abs=0.03 * SR)
+    np.testing.assert_array_equal(trimmed, wave[start:end])
+
+
+def test_shortens_long_pauses():
+    wave = np.concatenate([silence(1), tone(1), silence(2), tone(1), silence(0.3)])
+    config = VadConfig(padding_seconds=0.1, max_pause_seconds=0.5)
+    trimmed, segments = trim_silence(wave, SR, config)
+
+    assert len(segments.spans) == 2
+    assert len(trimmed) == segments.num_kept_samples
+    assert len(trimmed) == pytest.approx(2.4 * SR, abs=0.1 * SR)
+    # a short pause is kept
+    segments = detect_speech(
+        np.concatenate([tone(1), silence(0.4), tone(1)]), SR, config
+    )
+    assert len(segments.spans) == 1
+
+
+def test_to_original():
+    segments = SpeechSegments(spans=[(100, 200), (500, 550)], num_samples=600)
+    assert segments.to_original(0) == 100
+    assert segments.to_original(99) == 199
+    assert segments.to_original(100) == 500
+    np.testing.assert_array_equal(
+        segments.to_original(np.array([10, 120])), [110, 520]
+    )
+
+    wave = np.arange(600)
+    kept = segments.apply(wave)
+    idx = np.arange(len(kept))
+    np.testing.assert_array_equal(wave[segments.to_original(idx)], kept)
+
+
+@pytest.mark.parametrize("wave", [np.zeros(8000), tone(2), np.zeros(100)])
+def test_keeps_waves_without_silence(wave):
+    segments = detect_speech(wave, SR)
+    assert segments.spans == [(0, len(wave))]
+
+
+def test_muaalem_call_trims_waves(monkeypatch):
+    from quran_muaalem.inference import Muaalem
+    from quran_muaalem.muaalem_typing import MuaalemOutput, Unit
+
+    model = Muaalem.__new__(Muaalem)
+    lengths = []
+
+    def infer_batch(waves, refs, sampling_rate, return_level_to_probs):
+        lengths.extend(len(wave) for wave in waves)
+        return [MuaalemOutput(phonemes=Unit("", [], []), sifat=[]) for _ in waves]
+
+    monkeypatch.setattr(model, "_infer_batch", infer_batch, raising=False)
+    waves = [np.concatenate([silence(2), tone(1), silence(2)]), tone(1)]
+    outs = model(waves, [None, None], sampling_rate=SR, vad=VadConfig())
+
+    num_kept_samples = outs[0].speech_segments.num_kept_samples
+    assert sorted(lengths) == [SR, num_kept_samples]
+    assert num_kept_samples < 1.5 * SR
+    assert outs[1].speech_segments.spans == [(0, SR)]
+    assert model(waves, [None, None], sampling_rate=SR)[0].speech_segments is None